@@ -2,4 +2,5 @@
 set -e
 
 python manage.py migrate --noinput
+python manage.py createcachetable
 exec gunicorn wiki.wsgi:application --bind 0.0.0.0:8000 --workers 3 --timeout 60
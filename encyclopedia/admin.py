@@ -1,6 +1,15 @@
 from django.contrib import admin
 
-from .models import AuditLog, Dispute, Entry, EntryResource, EntryRevision
+from . import util
+from .models import (
+    AuditLog,
+    Dispute,
+    Entry,
+    EntryResource,
+    EntryRevision,
+    RestoreRun,
+    StatCounter,
+)
 
 
 @admin.register(Entry)
@@ -16,6 +25,10 @@ class EntryAdmin(admin.ModelAdmin):
     )
     search_fields = ("title", "content")
 
+    def save_model(self, request, obj, form, change):
+        util.refresh_rendered_content(obj)
+        super().save_model(request, obj, form, change)
+
 
 @admin.register(EntryRevision)
 class EntryRevisionAdmin(admin.ModelAdmin):
@@ -39,3 +52,15 @@ class DisputeAdmin(admin.ModelAdmin):
 class EntryResourceAdmin(admin.ModelAdmin):
     list_display = ("entry", "resource_type", "label", "added_by", "created_at")
     search_fields = ("entry__title", "label", "url")
+
+
+@admin.register(StatCounter)
+class StatCounterAdmin(admin.ModelAdmin):
+    list_display = ("name", "value", "updated_at")
+    search_fields = ("name",)
+
+
+@admin.register(RestoreRun)
+class RestoreRunAdmin(admin.ModelAdmin):
+    list_display = ("backup_id", "started_at", "completed_at")
+    readonly_fields = ("counts", "orphans")
@@ -0,0 +1,124 @@
+"""Cold storage for old audit log rows.
+
+Rows are written as gzip-compressed JSON lines, one file per day and chunk:
+<WIKI_AUDIT_ARCHIVE_DIR>/YYYY/MM/DD/audit-<first id>.jsonl.gz. A chunk is
+written and fsynced before its rows are deleted, and chunks are picked
+oldest first, so a run interrupted between the two steps rewrites the same
+files on the next run rather than duplicating records.
+"""
+
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import AuditLog, normalize_title
+
+ARCHIVE_FIELDS = (
+    "id",
+    "action",
+    "entry_id",
+    "entry_title",
+    "actor_id",
+    "actor__username",
+    "details",
+    "created_at",
+)
+
+# Archived days are files whose rows cannot be counted up front, so the web
+# download is bounded by its date range; export_records has no limit.
+DOWNLOAD_MAX_DAYS = 31
+
+
+def archive_dir() -> Path:
+    default = os.path.join(settings.BASE_DIR, "audit_archive")
+    return Path(getattr(settings, "WIKI_AUDIT_ARCHIVE_DIR", default))
+
+
+def _day_dir(root: Path, day: date) -> Path:
+    return root / f"{day:%Y}" / f"{day:%m}" / f"{day:%d}"
+
+
+def _record(row: Dict) -> Dict:
+    record = {name.replace("actor__username", "actor"): value for name, value in row.items()}
+    record["created_at"] = row["created_at"].isoformat()
+    return record
+
+
+def _write_chunk(path: Path, records: List[Dict]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as compressed:
+            for record in records:
+                compressed.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+
+
+def archive_before(cutoff: datetime, chunk_size: int = 5000, root: Optional[Path] = None) -> int:
+    """Moves audit rows created before cutoff to cold storage. Returns rows moved.
+
+    Each chunk is deleted in its own short transaction so the table is never
+    locked for the whole run.
+    """
+    root = root or archive_dir()
+    moved = 0
+    while True:
+        rows = list(
+            AuditLog.objects.filter(created_at__lt=cutoff)
+            .order_by("created_at", "id")
+            .values(*ARCHIVE_FIELDS)[:chunk_size]
+        )
+        if not rows:
+            return moved
+
+        by_day = defaultdict(list)
+        for row in rows:
+            by_day[row["created_at"].astimezone(timezone.utc).date()].append(_record(row))
+        for day, records in by_day.items():
+            _write_chunk(_day_dir(root, day) / f"audit-{records[0]['id']}.jsonl.gz", records)
+
+        with transaction.atomic():
+            AuditLog.objects.filter(id__in=[row["id"] for row in rows]).delete()
+        moved += len(rows)
+
+
+def iter_archived(
+    start: date,
+    end: date,
+    action: Optional[str] = None,
+    actor: Optional[str] = None,
+    entry_title: Optional[str] = None,
+    root: Optional[Path] = None,
+) -> Iterator[Dict]:
+    """Yields archived records from start to end (inclusive, UTC days), oldest
+    first, optionally filtered by action, actor username or entry title
+    (case-insensitive)."""
+    root = root or archive_dir()
+    wanted_title = normalize_title(entry_title) if entry_title else None
+    day = start
+    while day <= end:
+        chunks = sorted(
+            _day_dir(root, day).glob("audit-*.jsonl.gz"),
+            key=lambda path: int(path.name.split("-")[1].split(".")[0]),
+        )
+        for path in chunks:
+            with gzip.open(path, "rt", encoding="utf-8") as lines:
+                for line in lines:
+                    record = json.loads(line)
+                    if action and record["action"] != action:
+                        continue
+                    if actor and record["actor"] != actor:
+                        continue
+                    if wanted_title and normalize_title(record["entry_title"]) != wanted_title:
+                        continue
+                    yield record
+        day += timedelta(days=1)
@@ -0,0 +1,230 @@
+"""Audit log writer with an optional write-behind buffer.
+
+In "sync" mode every record is inserted immediately. In "batched" mode
+records are queued in-process and written with one INSERT when the queue
+reaches WIKI_AUDIT_BATCH_SIZE, or by a background timer once the oldest
+record is WIKI_AUDIT_FLUSH_INTERVAL seconds old, so records from many
+requests share a statement. Whatever is left is written at process exit.
+
+A flush that fails appends its records to an append-only JSON-lines spool
+file. The first flush of each process and every flush that succeeds after
+that replay the spool, so records survive a database outage or a worker
+restart.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AuditLog, Entry
+
+logger = logging.getLogger(__name__)
+
+SYNC = "sync"
+BATCHED = "batched"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _spool_path() -> str:
+    return _setting("WIKI_AUDIT_SPOOL_PATH", os.path.join(settings.BASE_DIR, "audit_spool.jsonl"))
+
+
+def _insert(records: List[Dict]):
+    """Inserts records with one statement per batch of rows.
+
+    Entries deleted (or actors removed) before the flush become NULL, as
+    SET_NULL would have done for a row written at the time of the action.
+    Each id is resolved by a scalar subquery in the INSERT itself, which
+    yields NULL for a missing row, so no separate lookups are needed.
+    """
+    quote = connection.ops.quote_name
+    fields = {field.name: field for field in AuditLog._meta.concrete_fields}
+    columns = ", ".join(
+        quote(fields[name].column)
+        for name in ("action", "entry_title", "entry", "actor", "details", "created_at")
+    )
+    lookups = [
+        f"(SELECT {quote(model._meta.pk.column)} FROM {quote(model._meta.db_table)} "
+        f"WHERE {quote(model._meta.pk.column)} = %s)"
+        for model in (Entry, get_user_model())
+    ]
+    row = f"(%s, %s, {lookups[0]}, {lookups[1]}, %s, %s)"
+    batch_size = min(connection.ops.bulk_batch_size(["x"] * 6, records) or 1, 1000)
+    with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+        for start in range(0, len(records), batch_size):
+            batch = records[start : start + batch_size]
+            params = []
+            for record in batch:
+                params += [
+                    record["action"],
+                    record["entry_title"],
+                    record["entry_id"],
+                    record["actor_id"],
+                    record["details"],
+                    connection.ops.adapt_datetimefield_value(
+                        parse_datetime(record["created_at"])
+                    ),
+                ]
+            cursor.execute(
+                f"INSERT INTO {quote(AuditLog._meta.db_table)} ({columns}) "
+                f"VALUES {', '.join([row] * len(batch))}",
+                params,
+            )
+
+
+class AuditWriter:
+    def __init__(self, flush_timer: bool = True):
+        self._lock = threading.Lock()
+        self._buffer: List[Dict] = []
+        self._oldest: Optional[float] = None
+        self._replayed = False
+        self._flush_timer = flush_timer
+        self._timer: Optional[threading.Thread] = None
+
+    def record(self, action, entry, actor=None, details=""):
+        if _setting("WIKI_AUDIT_MODE", SYNC) != BATCHED:
+            AuditLog.objects.create(
+                action=action,
+                entry=entry,
+                entry_title=entry.title,
+                actor=actor if actor and actor.is_authenticated else None,
+                details=details,
+            )
+            return
+
+        record = {
+            "action": action,
+            "entry_id": entry.pk,
+            "entry_title": entry.title,
+            "actor_id": actor.pk if actor and actor.is_authenticated else None,
+            "details": details,
+            "created_at": timezone.now().isoformat(),
+        }
+        with self._lock:
+            self._buffer.append(record)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._buffer) >= _setting("WIKI_AUDIT_BATCH_SIZE", 50)
+            if self._flush_timer and self._timer is None:
+                self._timer = threading.Thread(
+                    target=self._run_timer, name="audit-flush", daemon=True
+                )
+                self._timer.start()
+        if full:
+            # After the caller's transaction, so a rollback there cannot
+            # take other requests' records with it.
+            transaction.on_commit(self.flush)
+
+    def _run_timer(self):
+        while True:
+            time.sleep(_setting("WIKI_AUDIT_FLUSH_INTERVAL", 2.0))
+            self.tick()
+
+    def tick(self):
+        """Flushes the queue once its oldest record is old enough."""
+        if not self._due():
+            return
+        # The timer thread keeps its own connection; drop it if it broke or
+        # outlived CONN_MAX_AGE.
+        close_old_connections()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Audit flush failed")
+
+    def _due(self) -> bool:
+        with self._lock:
+            if not self._buffer:
+                return not self._replayed
+            return time.monotonic() - self._oldest >= _setting("WIKI_AUDIT_FLUSH_INTERVAL", 2.0)
+
+    def needs_flush(self) -> bool:
+        """True while records are queued or the spool has not been replayed."""
+        with self._lock:
+            return bool(self._buffer) or not self._replayed
+
+    def flush(self) -> int:
+        """Writes queued records, then retries the spool if that worked.
+        Returns how many records reached the database."""
+        with self._lock:
+            records, self._buffer, self._oldest = self._buffer, [], None
+            replay = not self._replayed
+            self._replayed = True
+
+        if records:
+            try:
+                _insert(records)
+            except Exception:
+                logger.exception("Audit flush failed; spooling %d records", len(records))
+                self._spool(records)
+                return 0
+            replay = True
+        # The database just took a write, so records spooled while it was
+        # unavailable are retried now rather than at the next restart.
+        return len(records) + (self.replay_spool() if replay else 0)
+
+    def _spool(self, records: List[Dict]):
+        with self._lock, open(_spool_path(), "a", encoding="utf-8") as spool:
+            for record in records:
+                spool.write(json.dumps(record) + "\n")
+            spool.flush()
+            os.fsync(spool.fileno())
+
+    def replay_spool(self) -> int:
+        """Writes records left in the spool by failed flushes."""
+        path = _spool_path()
+        claimed = f"{path}.{os.getpid()}.replay"
+        try:
+            # Renaming claims the file so concurrent workers do not replay it twice.
+            os.replace(path, claimed)
+        except FileNotFoundError:
+            return 0
+
+        records = []
+        with open(claimed, encoding="utf-8") as spool:
+            for line in spool:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A torn final line from a crash mid-write.
+                    logger.warning("Skipping unreadable audit spool line: %r", line)
+        try:
+            if records:
+                _insert(records)
+        except Exception:
+            logger.exception("Audit spool replay failed; keeping %d records", len(records))
+            self._spool(records)
+            return 0
+        finally:
+            os.remove(claimed)
+        return len(records)
+
+
+writer = AuditWriter()
+
+
+def record(action, entry, actor=None, details=""):
+    """Records an audit log entry in the configured mode."""
+    writer.record(action, entry, actor=actor, details=details)
+
+
+def flush_pending():
+    """Flushes queued records; runs at process exit."""
+    if writer.needs_flush():
+        writer.flush()
+
+
+atexit.register(flush_pending)
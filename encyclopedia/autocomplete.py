@@ -0,0 +1,86 @@
+"""Process-local prefix index for search-box autocomplete.
+
+Casefolded titles are kept in one sorted list and a prefix resolves to a
+contiguous slice found with bisect. Results are cached per prefix; adding or
+removing a title only evicts the cached prefixes of that title. Rebuilds are
+handled by titleindex.RefreshingIndex.
+"""
+
+import bisect
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from .titleindex import RefreshingIndex
+
+MAX_RESULTS = 20
+
+
+class PrefixIndex(RefreshingIndex):
+    state_fields = ("_keys", "_titles", "_cache")
+
+    def __init__(
+        self,
+        loader: Callable[[], Iterable[str]],
+        ttl: Optional[float] = None,
+        cache_size: int = 4096,
+    ):
+        self._cache_size = cache_size
+        super().__init__(loader, ttl=ttl)
+
+    def _reset(self):
+        self._keys: List[str] = []
+        self._titles: List[str] = []
+        self._cache: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+
+    def _fill(self, titles):
+        pairs = sorted((title.casefold(), title) for title in titles)
+        self._keys = [key for key, _ in pairs]
+        self._titles = [title for _, title in pairs]
+
+    def _evict_prefixes(self, key):
+        for end in range(1, len(key) + 1):
+            self._cache.pop(key[:end], None)
+
+    def _add(self, title):
+        key = title.casefold()
+        position = bisect.bisect_left(self._keys, key)
+        while position < len(self._keys) and self._keys[position] == key:
+            if self._titles[position] == title:
+                return
+            position += 1
+        self._keys.insert(position, key)
+        self._titles.insert(position, title)
+        self._evict_prefixes(key)
+
+    def _remove(self, title):
+        key = title.casefold()
+        position = bisect.bisect_left(self._keys, key)
+        while position < len(self._keys) and self._keys[position] == key:
+            if self._titles[position] == title:
+                del self._keys[position]
+                del self._titles[position]
+                self._evict_prefixes(key)
+                return
+            position += 1
+
+    def complete(self, prefix: str, limit: int = 8) -> List[str]:
+        """Returns up to limit titles starting with prefix, in case-insensitive order."""
+        key = prefix.casefold()
+        if not key:
+            return []
+        limit = max(1, min(limit, MAX_RESULTS))
+        with self._lock:
+            self._ensure_built()
+            cached = self._cache.get(key)
+            if cached is None:
+                start = bisect.bisect_left(self._keys, key)
+                # Every key starting with `key` sorts below key + U+10FFFF.
+                stop = min(len(self._keys), start + MAX_RESULTS)
+                end = bisect.bisect_left(self._keys, key + "\U0010ffff", start, stop)
+                cached = tuple(self._titles[start:end])
+                self._cache[key] = cached
+                if len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+            else:
+                self._cache.move_to_end(key)
+        return list(cached[:limit])
@@ -0,0 +1,372 @@
+"""Portable backups of all encyclopedia data.
+
+A backup is a directory holding manifest.json plus gzip-compressed JSON-lines
+chunks of at most chunk_size rows or chunk_bytes bytes per model
+(<model>-<n>.jsonl.gz) and a users.jsonl.gz file mapping the user ids
+referenced by those rows to usernames. Rows are streamed from one
+primary-key ordered query per model straight into the chunk files, so
+memory use does not grow with table or chunk size on either side. The
+whole dump reads from one transaction (REPEATABLE READ on PostgreSQL), so
+rows written while it runs cannot leave children without their entry.
+
+Restores insert rows under new primary keys, so they can go into a database
+that already has content. Entries are matched to existing ones by
+normalized title: an existing entry wins and the backup's entry, revisions,
+resources and disputes for it are skipped, while its audit rows are
+re-pointed at the existing entry. User references are matched by username
+and become NULL when the user does not exist. Rows whose entry is not in the
+backup at all are skipped and reported. Only the old-to-new entry id map is
+held in memory; it is also stored as RestoredEntry rows, committed with each
+batch alongside the RestoreRun position, so an interrupted restore resumes
+without duplicating rows or mistaking its own entries for existing ones.
+"""
+
+import contextlib
+import gzip
+import json
+import os
+import uuid
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import pagecache, search, stats, util
+from .models import (
+    AuditLog,
+    Dispute,
+    Entry,
+    EntryResource,
+    EntryRevision,
+    RestoredEntry,
+    RestoreRun,
+)
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+USERS_FILE = "users.jsonl.gz"
+# Rows fetched per database round trip while dumping; chunk files are cut
+# by row count and by uncompressed size, independently of this.
+READ_CHUNK_SIZE = 2000
+DEFAULT_CHUNK_BYTES = 256 * 1024 * 1024
+
+# Parents before children; revisions keep their id order so delta chains
+# stay valid under the new ids.
+MODELS = [Entry, EntryRevision, EntryResource, Dispute, AuditLog]
+
+
+def _label(model) -> str:
+    return model._meta.model_name
+
+
+def _user_fields(model) -> List[str]:
+    user_model = get_user_model()
+    return [
+        field.attname
+        for field in model._meta.concrete_fields
+        if field.is_relation and field.related_model is user_model
+    ]
+
+
+def _json_default(value):
+    # Full isoformat keeps microseconds, which keyset cursors order by.
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _encode(row: Dict) -> str:
+    return json.dumps(row, default=_json_default, ensure_ascii=False) + "\n"
+
+
+def _write_lines(path: Path, rows: Iterable[Dict]):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as chunk:
+        for row in rows:
+            chunk.write(_encode(row))
+    os.replace(tmp_path, path)
+
+
+class _ChunkWriter:
+    """Streams one model's rows into numbered chunk files, starting a new
+    file after max_rows rows or max_bytes bytes of uncompressed JSON."""
+
+    def __init__(self, output: Path, label: str, max_rows: int, max_bytes: int):
+        self.output, self.label = output, label
+        self.max_rows, self.max_bytes = max_rows, max_bytes
+        self.files: List[Dict] = []
+        self._chunk = None
+        self._path: Optional[Path] = None
+        self._rows = self._bytes = 0
+
+    def write(self, row: Dict):
+        if self._chunk is None:
+            name = f"{self.label}-{len(self.files) + 1:05d}.jsonl.gz"
+            self._path = self.output / name
+            self._chunk = gzip.open(self.output / (name + ".tmp"), "wt", encoding="utf-8")
+        line = _encode(row)
+        self._chunk.write(line)
+        self._rows += 1
+        self._bytes += len(line)
+        if self._rows >= self.max_rows or self._bytes >= self.max_bytes:
+            self.close()
+
+    def close(self):
+        if self._chunk is None:
+            return
+        self._chunk.close()
+        os.replace(self._path.with_name(self._path.name + ".tmp"), self._path)
+        self.files.append({"name": self._path.name, "rows": self._rows})
+        self._chunk, self._rows, self._bytes = None, 0, 0
+
+
+def _read_lines(path: Path) -> Iterator[Dict]:
+    with gzip.open(path, "rt", encoding="utf-8") as chunk:
+        for line in chunk:
+            yield json.loads(line)
+
+
+@contextlib.contextmanager
+def _snapshot():
+    """Runs the enclosed reads in one transaction that sees a single
+    snapshot of the database."""
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        # Must be the first statement of the transaction. PostgreSQL's
+        # default READ COMMITTED takes a new snapshot per statement; SQLite
+        # and MySQL's default already keep the first read's snapshot.
+        if outermost and connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        yield
+
+
+def dump(
+    output: Path, chunk_size: int = 50000, chunk_bytes: int = DEFAULT_CHUNK_BYTES
+) -> Dict[str, int]:
+    """Writes a backup of every encyclopedia model to output. Returns rows
+    written per model."""
+    output.mkdir(parents=True, exist_ok=True)
+    with _snapshot():
+        return _dump(output, chunk_size, chunk_bytes)
+
+
+def _dump(output: Path, chunk_size: int, chunk_bytes: int) -> Dict[str, int]:
+    manifest = {
+        "format": FORMAT_VERSION,
+        "backup_id": uuid.uuid4().hex,
+        "created_at": timezone.now().isoformat(),
+        "models": {},
+    }
+    user_ids: Set[int] = set()
+    counts = {}
+    for model in MODELS:
+        label = _label(model)
+        user_fields = _user_fields(model)
+        columns = [field.attname for field in model._meta.concrete_fields]
+        writer = _ChunkWriter(output, label, chunk_size, chunk_bytes)
+        total = 0
+        rows = model.objects.order_by("pk").values(*columns)
+        for row in rows.iterator(chunk_size=READ_CHUNK_SIZE):
+            writer.write(row)
+            user_ids.update(row[attname] for attname in user_fields if row[attname])
+            total += 1
+        writer.close()
+        manifest["models"][label] = {"files": writer.files, "rows": total}
+        counts[label] = total
+
+    users = get_user_model().objects.filter(pk__in=user_ids).values("id", "username")
+    _write_lines(output / USERS_FILE, users.iterator(chunk_size=READ_CHUNK_SIZE))
+    # The manifest is written last, so a partial backup is never mistaken
+    # for a complete one.
+    (output / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return counts
+
+
+@contextlib.contextmanager
+def _keep_timestamps(model):
+    """Stops auto_now/auto_now_add fields from overwriting restored values."""
+    fields = [
+        field
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _user_map(source: Path) -> Dict[int, int]:
+    """Maps backup user ids to ids of users with the same username here."""
+    usernames = {row["id"]: row["username"] for row in _read_lines(source / USERS_FILE)}
+    existing = dict(
+        get_user_model().objects.filter(username__in=set(usernames.values())).values_list(
+            "username", "id"
+        )
+    )
+    return {
+        old_id: existing[username]
+        for old_id, username in usernames.items()
+        if username in existing
+    }
+
+
+def _build(model, row: Dict, user_fields: List[str], user_ids: Dict[int, int]):
+    values = {}
+    for field in model._meta.concrete_fields:
+        if field.primary_key:
+            continue
+        value = row[field.attname]
+        if value is not None and field.attname in user_fields:
+            value = user_ids.get(value)
+        elif value is not None and not field.is_relation:
+            value = field.to_python(value)
+        values[field.attname] = value
+    return model(**values)
+
+
+def restore(
+    source: Path, batch_size: int = 5000, log=None
+) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Loads a backup written by dump. Returns rows inserted per model and
+    rows skipped because their entry is missing from the backup.
+
+    Each batch commits together with the run's position, so calling it again
+    after an interruption carries on from the last batch; a backup that was
+    restored completely is refused. auto_now fields are switched off around
+    every insert, so run it in a process of its own (restore_wiki), never
+    in one that also saves entries."""
+    manifest = json.loads((source / MANIFEST_NAME).read_text(encoding="utf-8"))
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported backup format {manifest.get('format')!r}.")
+    run = _start_run(manifest)
+    resumed_at = (run.model_index, run.chunk_index)
+    if log and (resumed_at, run.rows_read) != ((0, 0), 0):
+        log(f"Resuming the restore of {run.backup_id}")
+
+    user_ids = _user_map(source)
+    # Old entry id -> new id, and old ids of entries that already existed.
+    entry_ids: Dict[int, int] = {}
+    kept_entries: Set[int] = set()
+    for old_id, new_id, kept in run.entries.values_list("old_id", "new_id", "kept").iterator():
+        entry_ids[old_id] = new_id
+        if kept:
+            kept_entries.add(old_id)
+    # As loaddata does: foreign keys are checked once at the end instead of
+    # on every insert.
+    with connection.constraint_checks_disabled():
+        for model_index, model in enumerate(MODELS):
+            label = _label(model)
+            user_fields = _user_fields(model)
+            for chunk_index, chunk in enumerate(manifest["models"][label]["files"]):
+                if (model_index, chunk_index) < resumed_at:
+                    continue
+                done = run.rows_read if (model_index, chunk_index) == resumed_at else 0
+                batch = []
+                for line, row in enumerate(_read_lines(source / chunk["name"]), 1):
+                    if line <= done:
+                        continue
+                    if model is not Entry:
+                        row = _remap_entry(model, row, entry_ids, kept_entries)
+                        if row is None:
+                            continue
+                        if row is _ORPHAN:
+                            run.orphans[label] = run.orphans.get(label, 0) + 1
+                            continue
+                    batch.append((row["id"], _build(model, row, user_fields, user_ids)))
+                    if len(batch) >= batch_size:
+                        position = (model_index, chunk_index, line)
+                        _insert(run, model, batch, position, entry_ids, kept_entries)
+                        batch = []
+                position = (model_index, chunk_index + 1, 0)
+                _insert(run, model, batch, position, entry_ids, kept_entries)
+                if log:
+                    log(f"Restored {chunk['name']} ({label}: {run.counts.get(label, 0)} rows)")
+    connection.check_constraints(table_names=[model._meta.db_table for model in MODELS])
+    _refresh_derived_data()
+    run.completed_at = timezone.now()
+    run.save(update_fields=["completed_at"])
+    counts = {_label(model): run.counts.get(_label(model), 0) for model in MODELS}
+    return counts, run.orphans
+
+
+def _start_run(manifest: Dict) -> RestoreRun:
+    # Backups written before backup_id existed are told apart by their time.
+    backup_id = manifest.get("backup_id") or manifest["created_at"]
+    run, _ = RestoreRun.objects.get_or_create(backup_id=backup_id)
+    if run.completed_at:
+        raise ValueError(
+            f"Backup {backup_id} was already restored on {run.completed_at:%Y-%m-%d %H:%M}."
+        )
+    return run
+
+
+# Returned by _remap_entry for a row whose entry is not in the backup.
+_ORPHAN: Dict = {}
+
+
+def _remap_entry(model, row, entry_ids, kept_entries) -> Optional[Dict]:
+    """Points row at the restored entry. Returns None to skip a row of an
+    entry that already existed, or _ORPHAN for one whose entry is missing."""
+    old_entry = row["entry_id"]
+    if old_entry is None:
+        return row
+    if old_entry in kept_entries and model is not AuditLog:
+        return None
+    new_entry = entry_ids.get(old_entry)
+    if new_entry is None and not model._meta.get_field("entry").null:
+        return _ORPHAN
+    return {**row, "entry_id": new_entry}
+
+
+def _insert(run, model, batch, position, entry_ids, kept_entries) -> int:
+    """Inserts batch and moves run to position in the same transaction."""
+    restored: List[RestoredEntry] = []
+    if model is Entry and batch:
+        existing = dict(
+            Entry.objects.filter(
+                title_normalized__in=[entry.title_normalized for _, entry in batch]
+            ).values_list("title_normalized", "id")
+        )
+        for old_id, entry in batch:
+            if entry.title_normalized in existing:
+                new_id = existing[entry.title_normalized]
+                restored.append(RestoredEntry(run=run, old_id=old_id, new_id=new_id, kept=True))
+        batch = [
+            (old_id, entry) for old_id, entry in batch if entry.title_normalized not in existing
+        ]
+    label = _label(model)
+    with transaction.atomic():
+        with _keep_timestamps(model):
+            created = model.objects.bulk_create([obj for _, obj in batch])
+        if model is Entry:
+            restored += [
+                RestoredEntry(run=run, old_id=old_id, new_id=obj.pk)
+                for (old_id, _), obj in zip(batch, created)
+            ]
+            RestoredEntry.objects.bulk_create(restored)
+        run.counts[label] = run.counts.get(label, 0) + len(batch)
+        run.model_index, run.chunk_index, run.rows_read = position
+        run.save(update_fields=["model_index", "chunk_index", "rows_read", "counts", "orphans"])
+    for row in restored:
+        entry_ids[row.old_id] = row.new_id
+        if row.kept:
+            kept_entries.add(row.old_id)
+    return len(batch)
+
+
+def _refresh_derived_data():
+    """Rebuilds what the model signals would have maintained."""
+    search.get_backend().rebuild()
+    stats.reconcile()
+    util.title_trigrams.clear()
+    util.title_prefixes.clear()
+    pagecache.purge(pagecache.CATALOG_SCOPE)
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Warns when the page cache runs on a per-process cache, where purges
+    only reach the worker that made the edit."""
+    if not getattr(settings, "WIKI_PAGE_CACHE_TIMEOUT", 300):
+        return []
+    if not isinstance(caches["default"], LocMemCache):
+        return []
+    return [
+        Warning(
+            "The page cache is enabled on a local-memory cache, so other workers keep "
+            "serving pages an edit has purged.",
+            hint="Set CACHE_BACKEND=database (and run createcachetable) or set "
+            "WIKI_PAGE_CACHE_TIMEOUT=0.",
+            id="encyclopedia.W001",
+        )
+    ]
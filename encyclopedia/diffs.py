@@ -0,0 +1,211 @@
+"""Line and word level diffs for the revision compare view.
+
+Common leading and trailing lines are stripped before matching, so a large
+document with a small edit only runs SequenceMatcher over the changed
+middle. Changed regions larger than WIKI_DIFF_MAX_LINES are not matched
+line by line or word diffed, only unchanged lines near a change become rows,
+and no rows are built once that many have been emitted.
+
+Results are cached per (revision_a, revision_b) pair. Stored revisions never
+change, and the current content is keyed by its content hash, so entries
+never need purging.
+"""
+
+import difflib
+import re
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.html import escape
+
+from . import history, util
+
+CONTEXT_LINES = 3
+# Longer line pairs are shown as whole-line changes without word highlights.
+MAX_WORD_DIFF_CHARS = 2000
+
+_TOKEN = re.compile(r"\s+|\w+|[^\w\s]")
+
+
+def max_lines() -> int:
+    return getattr(settings, "WIKI_DIFF_MAX_LINES", 2000)
+
+
+def cache_timeout() -> int:
+    return getattr(settings, "WIKI_DIFF_CACHE_TIMEOUT", 86400)
+
+
+def _word_diff(old: str, new: str):
+    if len(old) > MAX_WORD_DIFF_CHARS or len(new) > MAX_WORD_DIFF_CHARS:
+        return escape(old), escape(new)
+    old_tokens, new_tokens = _TOKEN.findall(old), _TOKEN.findall(new)
+    matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    old_html, new_html = [], []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        removed = escape("".join(old_tokens[i1:i2]))
+        added = escape("".join(new_tokens[j1:j2]))
+        if tag == "equal":
+            old_html.append(removed)
+            new_html.append(added)
+            continue
+        if removed:
+            old_html.append(f"<del>{removed}</del>")
+        if added:
+            new_html.append(f"<ins>{added}</ins>")
+    return "".join(old_html), "".join(new_html)
+
+
+def _opcodes(old_lines: List[str], new_lines: List[str]):
+    """Yields difflib-style opcodes, matching only the region between the
+    common prefix and suffix."""
+    prefix = 0
+    limit = min(len(old_lines), len(new_lines))
+    while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < limit - prefix
+        and old_lines[len(old_lines) - 1 - suffix] == new_lines[len(new_lines) - 1 - suffix]
+    ):
+        suffix += 1
+    old_end, new_end = len(old_lines) - suffix, len(new_lines) - suffix
+
+    if prefix:
+        yield "equal", 0, prefix, 0, prefix
+    middle_old, middle_new = old_lines[prefix:old_end], new_lines[prefix:new_end]
+    if len(middle_old) + len(middle_new) > max_lines():
+        if middle_old or middle_new:
+            yield "replace", prefix, old_end, prefix, new_end
+    else:
+        matcher = difflib.SequenceMatcher(None, middle_old, middle_new, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            yield tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix
+    if suffix:
+        yield "equal", old_end, len(old_lines), new_end, len(new_lines)
+
+
+class _HunkBuilder:
+    """Collects rows into hunks with CONTEXT_LINES of context around each
+    change, building no rows once limit rows have been emitted."""
+
+    def __init__(self, old_lines: List[str], new_lines: List[str], limit: int):
+        self.old_lines, self.new_lines = old_lines, new_lines
+        self.limit = self.budget = limit
+        self.hunks: List[List[Dict]] = []
+        self.current: Optional[List[Dict]] = None
+        self.truncated = False
+
+    def _open(self) -> bool:
+        if self.budget <= 0:
+            self.truncated = True
+            return False
+        self.current = []
+        self.hunks.append(self.current)
+        return True
+
+    def _context(self, i1: int, j1: int, count: int):
+        shown = min(count, max(self.budget, 0))
+        for offset in range(shown):
+            self.current.append(
+                {
+                    "kind": "context",
+                    "old_no": i1 + offset + 1,
+                    "new_no": j1 + offset + 1,
+                    "html": escape(self.old_lines[i1 + offset]),
+                }
+            )
+        self.budget -= shown
+        self.truncated = self.truncated or shown < count
+
+    def unchanged(self, i1: int, j1: int, size: int, before_change: bool):
+        """Adds the context rows an unchanged run contributes."""
+        if self.current is not None:
+            if before_change and size <= 2 * CONTEXT_LINES:
+                self._context(i1, j1, size)
+                return
+            self._context(i1, j1, min(size, CONTEXT_LINES))
+            self.current = None
+        if before_change and self._open():
+            keep = min(size, CONTEXT_LINES)
+            self._context(i1 + size - keep, j1 + size - keep, keep)
+
+    def change(self, tag: str, i1: int, i2: int, j1: int, j2: int):
+        if self.current is None and not self._open():
+            return
+        shown_old = min(i2 - i1, max(self.budget, 0))
+        shown_new = min(j2 - j1, self.budget - shown_old)
+        old_html = [escape(line) for line in self.old_lines[i1 : i1 + shown_old]]
+        new_html = [escape(line) for line in self.new_lines[j1 : j1 + shown_new]]
+        # Oversized regions are shown as whole-line changes.
+        if tag == "replace" and (i2 - i1) + (j2 - j1) <= self.limit:
+            for index in range(min(i2 - i1, j2 - j1, max(shown_old, shown_new))):
+                old_word, new_word = _word_diff(
+                    self.old_lines[i1 + index], self.new_lines[j1 + index]
+                )
+                if index < shown_old:
+                    old_html[index] = old_word
+                if index < shown_new:
+                    new_html[index] = new_word
+        for index, html in enumerate(old_html):
+            self.current.append(
+                {"kind": "delete", "old_no": i1 + index + 1, "new_no": None, "html": html}
+            )
+        for index, html in enumerate(new_html):
+            self.current.append(
+                {"kind": "insert", "old_no": None, "new_no": j1 + index + 1, "html": html}
+            )
+        self.budget -= shown_old + shown_new
+        self.truncated = self.truncated or shown_old + shown_new < (i2 - i1) + (j2 - j1)
+
+
+def compute_diff(old: str, new: str) -> Dict:
+    """Returns hunks of rows, added/removed line counts and whether the
+    output was truncated.
+
+    Each row is a dict with kind ("context", "delete" or "insert"), 1-based
+    old_no/new_no line numbers and escaped html.
+    """
+    old_lines, new_lines = old.splitlines(), new.splitlines()
+    builder = _HunkBuilder(old_lines, new_lines, max_lines())
+    added = removed = 0
+    # An unchanged run is held back until it is known whether a change
+    # follows it, which decides how much of it is context.
+    pending: Optional[Tuple[int, int, int]] = None
+    for tag, i1, i2, j1, j2 in _opcodes(old_lines, new_lines):
+        if tag == "equal":
+            pending = (i1, j1, i2 - i1)
+            continue
+        removed += i2 - i1
+        added += j2 - j1
+        if pending is not None:
+            builder.unchanged(*pending, before_change=True)
+            pending = None
+        builder.change(tag, i1, i2, j1, j2)
+    if pending is not None:
+        builder.unchanged(*pending, before_change=False)
+    return {
+        "hunks": builder.hunks,
+        "added": added,
+        "removed": removed,
+        "truncated": builder.truncated,
+    }
+
+
+def revision_diff(entry, from_id: int, to_id: Optional[int]) -> Dict:
+    """Returns the cached diff between two revisions of entry, or between a
+    revision and the current content when to_id is None."""
+    to_key = to_id if to_id is not None else f"current-{util.hash_content(entry.content)}"
+    key = f"wiki:diff:{entry.pk}:{from_id}:{to_key}:{max_lines()}"
+    diff = cache.get(key)
+    if diff is None:
+        # Each side is rebuilt from its own keyframe span rather than
+        # loading every revision between two distant ids.
+        old = history.revision_contents(entry.pk, [from_id])[from_id]
+        if to_id is None:
+            new = entry.content
+        else:
+            new = history.revision_contents(entry.pk, [to_id])[to_id]
+        diff = compute_diff(old, new)
+        cache.set(key, diff, cache_timeout())
+    return diff
@@ -0,0 +1,148 @@
+"""Streaming readers for bulk content dumps.
+
+Each reader yields (position, title, content) one record at a time, so memory
+stays bounded by a single record whatever the dump size. position identifies
+the point just after the record and can be passed back as start to resume:
+a byte offset into the (decompressed) stream for JSONL, and a member or page
+count for archives and MediaWiki XML. Records that cannot be imported are
+yielded with title None so callers can count them and still advance.
+"""
+
+import bz2
+import gzip
+import json
+import tarfile
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import Iterator, Optional, Tuple
+from xml.etree import ElementTree
+
+from .models import Entry
+
+Record = Tuple[int, Optional[str], Optional[str]]
+
+TITLE_MAX_LENGTH = Entry._meta.get_field("title").max_length
+FORMATS = ("jsonl", "tar", "zip", "mediawiki")
+
+
+def detect_format(path: Path) -> Optional[str]:
+    suffixes = [suffix.lower() for suffix in path.suffixes]
+    if ".tar" in suffixes or suffixes[-1:] == [".tgz"]:
+        return "tar"
+    if suffixes[-1:] == [".zip"]:
+        return "zip"
+    if ".jsonl" in suffixes or ".ndjson" in suffixes:
+        return "jsonl"
+    if ".xml" in suffixes:
+        return "mediawiki"
+    return None
+
+
+def _open(path: Path):
+    """Opens path for binary reading, decompressing .gz and .bz2 files."""
+    suffix = path.suffix.lower()
+    if suffix == ".gz":
+        return gzip.open(path, "rb")
+    if suffix == ".bz2":
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def _record(position: int, title, content) -> Record:
+    if not isinstance(title, str) or not isinstance(content, str):
+        return position, None, None
+    title = title.strip()
+    if not title or len(title) > TITLE_MAX_LENGTH:
+        return position, None, None
+    return position, title, content
+
+
+def read_jsonl(path: Path, start: int = 0) -> Iterator[Record]:
+    """Reads one {"title": ..., "content": ...} object per line."""
+    with _open(path) as dump:
+        dump.seek(start)
+        position = start
+        for line in dump:
+            position += len(line)
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                yield _record(position, record["title"], record["content"])
+            except (ValueError, KeyError, TypeError):
+                yield position, None, None
+
+
+def _markdown_member(name: str, data: bytes, position: int) -> Record:
+    if not name.lower().endswith(".md"):
+        return position, None, None
+    try:
+        content = data.decode("utf-8")
+    except UnicodeDecodeError:
+        return position, None, None
+    return _record(position, PurePosixPath(name).stem, content)
+
+
+def read_tar(path: Path, start: int = 0) -> Iterator[Record]:
+    """Reads the .md files of a (compressed) tar archive, titled by file name."""
+    with tarfile.open(path, "r|*") as archive:
+        for position, member in enumerate(archive, start=1):
+            # Streaming mode still appends every member to archive.members.
+            archive.members = []
+            if position <= start or not member.isfile():
+                continue
+            if not member.name.lower().endswith(".md"):
+                yield position, None, None
+                continue
+            data = archive.extractfile(member).read()
+            yield _markdown_member(member.name, data, position)
+
+
+def read_zip(path: Path, start: int = 0) -> Iterator[Record]:
+    """Reads the .md files of a zip archive, titled by file name."""
+    with zipfile.ZipFile(path) as archive:
+        for position, info in enumerate(archive.infolist(), start=1):
+            if position <= start or info.is_dir():
+                continue
+            if not info.filename.lower().endswith(".md"):
+                yield position, None, None
+                continue
+            yield _markdown_member(info.filename, archive.read(info), position)
+
+
+def read_mediawiki(path: Path, start: int = 0) -> Iterator[Record]:
+    """Reads the latest revision of each main-namespace page of a MediaWiki
+    XML export. Redirects are skipped and wikitext is stored unconverted."""
+    with _open(path) as dump:
+        events = ElementTree.iterparse(dump, events=("start", "end"))
+        _, root = next(events)
+        ns = root.tag[: root.tag.index("}") + 1] if root.tag.startswith("{") else ""
+        position = 0
+        for event, element in events:
+            if event != "end" or element.tag != f"{ns}page":
+                continue
+            position += 1
+            if position > start:
+                revisions = element.findall(f"{ns}revision")
+                if (
+                    element.findtext(f"{ns}ns", "0") != "0"
+                    or element.find(f"{ns}redirect") is not None
+                    or not revisions
+                ):
+                    yield position, None, None
+                else:
+                    yield _record(
+                        position,
+                        element.findtext(f"{ns}title"),
+                        revisions[-1].findtext(f"{ns}text"),
+                    )
+            # Drop finished pages so the tree never holds more than one.
+            root.clear()
+
+
+READERS = {
+    "jsonl": read_jsonl,
+    "tar": read_tar,
+    "zip": read_zip,
+    "mediawiki": read_mediawiki,
+}
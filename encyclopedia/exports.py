@@ -0,0 +1,157 @@
+"""Constant-memory bulk exports.
+
+Rows come from querysets read with .iterator(chunk_size=...) and are encoded
+one line at a time, so a StreamingHttpResponse over them holds one chunk of
+rows in memory no matter how large the table is. Web workers are killed
+after a fixed timeout, though, so exports over max_http_rows() rows are
+refused over HTTP and written to a file by the export_records command.
+"""
+
+import csv
+import gzip
+import json
+import os
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Sequence
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .models import AuditLog, Entry
+
+CHUNK_SIZE = 2000
+
+AUDIT_LOG_COLUMNS = (
+    "id",
+    "action",
+    "entry_id",
+    "entry_title",
+    "actor_id",
+    "actor",
+    "details",
+    "created_at",
+)
+ENTRY_COLUMNS = (
+    "id",
+    "title",
+    "content",
+    "lead_image_url",
+    "created_by",
+    "is_locked",
+    "lock_reason",
+    "verification_status",
+    "verification_note",
+    "created_at",
+    "updated_at",
+    "resources",
+)
+
+
+def _start_of(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def max_http_rows() -> int:
+    return getattr(settings, "WIKI_EXPORT_MAX_HTTP_ROWS", 50000)
+
+
+def has_more_than(queryset: QuerySet, limit: int) -> bool:
+    """Counts at most limit + 1 rows, so the check stays cheap on big tables."""
+    return queryset[: limit + 1].count() > limit
+
+
+def audit_logs(
+    start: Optional[date] = None, end: Optional[date] = None, action: Optional[str] = None
+) -> QuerySet:
+    """Audit logs oldest first, limited to days start..end inclusive."""
+    logs = AuditLog.objects.order_by("created_at", "id")
+    if start:
+        logs = logs.filter(created_at__gte=_start_of(start))
+    if end:
+        logs = logs.filter(created_at__lt=_start_of(end + timedelta(days=1)))
+    if action:
+        logs = logs.filter(action=action)
+    return logs
+
+
+def audit_log_rows(
+    start: Optional[date] = None, end: Optional[date] = None, action: Optional[str] = None
+) -> Iterator[Dict]:
+    """Yields audit log rows oldest first, limited to days start..end inclusive."""
+    logs = audit_logs(start, end, action)
+    fields = [name if name != "actor" else "actor__username" for name in AUDIT_LOG_COLUMNS]
+    for row in logs.values(*fields).iterator(chunk_size=CHUNK_SIZE):
+        row["actor"] = row.pop("actor__username")
+        row["created_at"] = row["created_at"].isoformat()
+        yield row
+
+
+def entry_rows() -> Iterator[Dict]:
+    """Yields every entry with its resources, in id order."""
+    entries = (
+        Entry.objects.select_related("created_by")
+        .prefetch_related("resources")
+        .order_by("id")
+        .iterator(chunk_size=CHUNK_SIZE // 4)
+    )
+    for entry in entries:
+        yield {
+            "id": entry.pk,
+            "title": entry.title,
+            "content": entry.content,
+            "lead_image_url": entry.lead_image_url,
+            "created_by": entry.created_by.username if entry.created_by else None,
+            "is_locked": entry.is_locked,
+            "lock_reason": entry.lock_reason,
+            "verification_status": entry.verification_status,
+            "verification_note": entry.verification_note,
+            "created_at": entry.created_at.isoformat(),
+            "updated_at": entry.updated_at.isoformat(),
+            "resources": [
+                {"type": resource.resource_type, "label": resource.label, "url": resource.url}
+                for resource in entry.resources.all()
+            ],
+        }
+
+
+def jsonl_lines(rows: Iterable[Dict]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+class _Echo:
+    """File-like object whose write returns the line csv.writer produced."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows: Iterable[Dict], columns: Sequence[str]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(
+            [
+                json.dumps(value, ensure_ascii=False) if isinstance(value, (list, dict)) else value
+                for value in (row[column] for column in columns)
+            ]
+        )
+
+
+def write_file(lines: Iterable[str], path: Path) -> None:
+    """Writes lines to path, gzip-compressed when it ends in .gz. The file is
+    written under a temporary name and renamed once complete, so a failed run
+    never leaves a truncated export behind."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    opener = gzip.open if path.suffix == ".gz" else open
+    try:
+        with opener(tmp_path, "wt", encoding="utf-8", newline="") as output:
+            for line in lines:
+                output.write(line)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
@@ -0,0 +1,183 @@
+"""Delta-compressed revision history.
+
+The newest revision of an entry is stored in full. When a newer one is
+recorded, the previous head is re-encoded as a reverse delta against it, so
+each older revision is a delta against its next-newer revision. Every
+WIKI_REVISION_KEYFRAME_INTERVAL-th revision (by per-entry sequence number)
+stays a full keyframe, which bounds reconstruction to fewer than that many
+delta applications. A revision whose delta would not be smaller than its
+text also stays full; full rows are valid anywhere in the chain.
+
+Deltas are JSON lists of line operations against the newer text:
+["c", start, end] copies lines start:end and ["i", text] inserts text.
+"""
+
+import difflib
+import json
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, QuerySet, Subquery
+
+from .models import Entry, EntryRevision
+
+
+def keyframe_interval() -> int:
+    return max(1, getattr(settings, "WIKI_REVISION_KEYFRAME_INTERVAL", 16))
+
+
+def make_delta(base: str, target: str) -> str:
+    """Returns a delta that rebuilds target from base."""
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    ops: List[list] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(["c", i1, i2])
+        elif tag in ("replace", "insert"):
+            ops.append(["i", "".join(target_lines[j1:j2])])
+    return json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+
+
+def apply_delta(base: str, delta: str) -> str:
+    """Rebuilds the text a delta from make_delta was taken against base."""
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(delta):
+        if op[0] == "c":
+            parts.extend(base_lines[op[1] : op[2]])
+        else:
+            parts.append(op[1])
+    return "".join(parts)
+
+
+def is_keyframe(seq: int) -> bool:
+    return seq % keyframe_interval() == 0
+
+
+def encode(revision: EntryRevision, newer_content: str, content: str):
+    """Stores content on revision as a delta against newer_content, unless it
+    is a keyframe or the delta would not save space."""
+    delta = make_delta(newer_content, content) if not is_keyframe(revision.seq) else None
+    if delta is not None and len(delta) < len(content):
+        revision.is_delta, revision.delta, revision.content = True, delta, ""
+    else:
+        revision.is_delta, revision.delta, revision.content = False, "", content
+
+
+HEAD_FIELDS = ("id", "seq", "is_delta", "content")
+
+
+def with_head(entries: QuerySet) -> QuerySet:
+    """Annotates entries with their newest revision, so a caller that locks
+    the entry row reads the revision head in the same statement and
+    record_revision skips its own query."""
+    newest = EntryRevision.objects.filter(entry=OuterRef("pk")).order_by("-id")
+    return entries.annotate(
+        **{f"revision_head_{name}": Subquery(newest.values(name)[:1]) for name in HEAD_FIELDS}
+    )
+
+
+def _head(entry: Entry) -> Optional[EntryRevision]:
+    if not hasattr(entry, "revision_head_id"):
+        return (
+            EntryRevision.objects.select_for_update()
+            .filter(entry=entry)
+            .order_by("-id")
+            .only(*HEAD_FIELDS)
+            .first()
+        )
+    if entry.revision_head_id is None:
+        return None
+    return EntryRevision(
+        entry_id=entry.pk, **{name: getattr(entry, f"revision_head_{name}") for name in HEAD_FIELDS}
+    )
+
+
+def record_revision(entry: Entry, content: str, edited_by=None, edit_summary="") -> EntryRevision:
+    """Saves content as the entry's newest revision and delta-encodes the
+    previous newest revision against it. The head comes from with_head()
+    when the entry was loaded through it."""
+    with transaction.atomic(savepoint=False):
+        head = _head(entry)
+        revision = EntryRevision.objects.create(
+            entry=entry,
+            content=content,
+            edited_by=edited_by,
+            edit_summary=edit_summary,
+            seq=head.seq + 1 if head else 1,
+        )
+        if head is not None and not head.is_delta:
+            encode(head, content, head.content)
+            if head.is_delta:
+                head.save(update_fields=["is_delta", "delta", "content"])
+    if hasattr(entry, "revision_head_id"):
+        for name in HEAD_FIELDS:
+            setattr(entry, f"revision_head_{name}", getattr(revision, name))
+    return revision
+
+
+def revision_content(revision: EntryRevision) -> str:
+    """Returns the full text of a revision."""
+    return revision_contents(revision.entry_id, [revision.id])[revision.id]
+
+
+def revision_contents(entry_id: int, revision_ids: List[int]) -> Dict[int, str]:
+    """Returns the full text of several revisions of one entry, by id.
+
+    Loads the revisions from the oldest requested one up to the first full
+    row at or after the newest requested one and replays deltas newest first.
+    """
+    if not revision_ids:
+        return {}
+    wanted = set(revision_ids)
+    chain = EntryRevision.objects.filter(entry_id=entry_id, id__gte=min(wanted)).order_by("id")
+    rows = []
+    for row in chain.only("id", "is_delta", "content", "delta").iterator(
+        chunk_size=keyframe_interval()
+    ):
+        rows.append(row)
+        if row.id >= max(wanted) and not row.is_delta:
+            break
+
+    contents: Dict[int, str] = {}
+    text: Optional[str] = None
+    for row in reversed(rows):
+        if not row.is_delta:
+            text = row.content
+        elif text is not None:
+            text = apply_delta(text, row.delta)
+        else:
+            raise ValueError(f"Revision {row.id} has no full revision to rebuild from.")
+        if row.id in wanted:
+            contents[row.id] = text
+    return contents
+
+
+def reencode_entry(entry_id: int) -> int:
+    """Renumbers and re-encodes every revision of an entry. Returns rows saved."""
+    with transaction.atomic():
+        rows = list(
+            EntryRevision.objects.select_for_update().filter(entry_id=entry_id).order_by("id")
+        )
+        if not rows:
+            return 0
+        contents = revision_contents(entry_id, [row.id for row in rows])
+        return store_chain(rows, contents)
+
+
+def store_chain(rows: List[EntryRevision], contents: Dict[int, str]) -> int:
+    """Renumbers rows (all revisions of one entry, oldest first) and saves
+    them re-encoded from their full texts. Returns rows saved."""
+    newer_content = None
+    for seq, row in reversed(list(enumerate(rows, start=1))):
+        row.seq = seq
+        if newer_content is None:
+            row.is_delta, row.delta, row.content = False, "", contents[row.id]
+        else:
+            encode(row, newer_content, contents[row.id])
+        newer_content = contents[row.id]
+    EntryRevision.objects.bulk_update(rows, ["seq", "is_delta", "delta", "content"])
+    return len(rows)
@@ -0,0 +1,126 @@
+"""Batched entry upserts for the import commands.
+
+A batch costs one lookup, one bulk insert and one bulk update inside a
+transaction. Entries whose title, content hash and renderer version are
+unchanged are not written. Bulk writes send no model signals, so the search
+index, counters and caches the Entry signals maintain are updated here once
+per batch.
+"""
+
+from dataclasses import dataclass
+from typing import Iterable, List, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import pagecache, search, stats, util
+from .models import Entry, normalize_title
+
+WRITTEN_FIELDS = [
+    "title",
+    "content",
+    "content_html",
+    "content_hash",
+    "renderer_version",
+    "updated_at",
+    "version",
+]
+
+
+@dataclass
+class ImportStats:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.created + self.updated + self.unchanged
+
+    def add(self, other: "ImportStats"):
+        self.created += other.created
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+
+
+def upsert_batch(records: Iterable[Tuple[str, str]], dry_run: bool = False) -> ImportStats:
+    """Creates or updates entries from (title, content) pairs, matching
+    titles case-insensitively; a later duplicate title wins."""
+    latest = {}
+    for title, content in records:
+        latest[normalize_title(title)] = (title, content)
+    result = ImportStats()
+    if not latest:
+        return result
+
+    existing = {
+        row[0]: row[1:]
+        for row in Entry.objects.filter(title_normalized__in=list(latest)).values_list(
+            "title_normalized", "id", "title", "content_hash", "renderer_version", "version"
+        )
+    }
+    now = timezone.now()
+    created: List[Entry] = []
+    updated: List[Entry] = []
+    renamed: List[Tuple[str, str]] = []
+    for key, (title, content) in latest.items():
+        content_hash = util.hash_content(content)
+        if key in existing:
+            pk, old_title, old_hash, old_renderer, version = existing[key]
+            if (old_title, old_hash, old_renderer) == (title, content_hash, util.RENDERER_VERSION):
+                result.unchanged += 1
+                continue
+            if old_title != title:
+                renamed.append((old_title, title))
+            updated.append(
+                Entry(
+                    pk=pk,
+                    title=title,
+                    title_normalized=key,
+                    content=content,
+                    updated_at=now,
+                    version=version + 1,
+                    **util.rendered_fields(content),
+                )
+            )
+        else:
+            created.append(
+                Entry(
+                    title=title,
+                    title_normalized=key,
+                    content=content,
+                    **util.rendered_fields(content),
+                )
+            )
+    result.created, result.updated = len(created), len(updated)
+    if dry_run or not (created or updated):
+        return result
+
+    with transaction.atomic():
+        Entry.objects.bulk_create(created)
+        Entry.objects.bulk_update(updated, WRITTEN_FIELDS)
+        if any(entry.pk is None for entry in created):
+            ids = dict(
+                Entry.objects.filter(
+                    title_normalized__in=[entry.title_normalized for entry in created]
+                ).values_list("title_normalized", "id")
+            )
+            for entry in created:
+                entry.pk = ids[entry.title_normalized]
+        search.get_backend().index_entries(created + updated)
+        if created:
+            stats.apply({stats.TOTAL_ENTRIES: len(created)})
+
+    for entry in created:
+        util.title_trigrams.add(entry.title)
+        util.title_prefixes.add(entry.title)
+    # bulk_update skips the save signals that keep the title indexes current.
+    for old_title, title in renamed:
+        for index in (util.title_trigrams, util.title_prefixes):
+            index.remove(old_title)
+            index.add(title)
+    pagecache.purge(
+        *[pagecache.entry_scope(entry.title) for entry in created + updated],
+        pagecache.CATALOG_SCOPE,
+    )
+    return result
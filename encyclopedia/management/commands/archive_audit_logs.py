@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from encyclopedia import archive
+
+
+class Command(BaseCommand):
+    help = "Move audit log rows older than the retention window to compressed cold storage."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=180,
+            help="Keep rows newer than this many days in the audit table.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Rows written and deleted per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=max(0, options["days"]))
+        moved = archive.archive_before(cutoff, chunk_size=max(1, options["chunk_size"]))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archive complete. Moved: {moved}, Before: {cutoff:%Y-%m-%d %H:%M}, "
+                f"Location: {archive.archive_dir()}"
+            )
+        )
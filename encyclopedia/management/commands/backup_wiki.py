@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from encyclopedia import backup
+
+
+class Command(BaseCommand):
+    help = "Write entries, revisions, resources, disputes and audit logs to a backup directory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Directory to write the backup into.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=50000,
+            help="Rows per compressed chunk file.",
+        )
+        parser.add_argument(
+            "--chunk-bytes",
+            type=int,
+            default=backup.DEFAULT_CHUNK_BYTES,
+            help="Uncompressed bytes after which a chunk file is closed early.",
+        )
+
+    def handle(self, *args, **options):
+        output = Path(options["output"])
+        counts = backup.dump(
+            output,
+            chunk_size=max(1, options["chunk_size"]),
+            chunk_bytes=max(1, options["chunk_bytes"]),
+        )
+        summary = ", ".join(f"{label}: {rows}" for label, rows in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Backup complete. {summary}. Location: {output}"))
@@ -0,0 +1,75 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from encyclopedia import history
+
+
+def _edit(rng, lines):
+    lines = list(lines)
+    for _ in range(rng.randint(1, 3)):
+        position = rng.randrange(len(lines) + 1)
+        roll = rng.random()
+        if roll < 0.4 and lines:
+            lines[min(position, len(lines) - 1)] = f"Rewritten line {rng.random()}\n"
+        elif roll < 0.7 or not lines:
+            lines.insert(position, f"Added paragraph {rng.random()} " * 4 + "\n")
+        else:
+            del lines[min(position, len(lines) - 1)]
+    return lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure revision storage and reconstruction latency on a synthetic "
+        "edit history, without touching the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--revisions", type=int, default=500)
+        parser.add_argument("--lines", type=int, default=400, help="Lines in the first version.")
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        lines = [f"Line {i} of a long encyclopedia article body.\n" for i in range(options["lines"])]
+        versions = []
+        for _ in range(options["revisions"]):
+            versions.append("".join(lines))
+            lines = _edit(rng, lines)
+        interval = history.keyframe_interval()
+
+        # Versions are oldest first; the last one is the stored-full head.
+        stored = []
+        for seq, text in enumerate(versions, start=1):
+            if seq == len(versions) or seq % interval == 0:
+                stored.append((False, text))
+            else:
+                delta = history.make_delta(versions[seq], text)
+                stored.append((True, delta) if len(delta) < len(text) else (False, text))
+
+        full_size = sum(len(text) for text in versions)
+        delta_size = sum(len(value) for _, value in stored)
+
+        timings = []
+        for index in range(len(stored)):
+            started = time.perf_counter()
+            newer = index
+            while stored[newer][0]:
+                newer += 1
+            text = stored[newer][1]
+            for position in range(newer - 1, index - 1, -1):
+                text = history.apply_delta(text, stored[position][1])
+            timings.append((time.perf_counter() - started) * 1000)
+            assert text == versions[index]
+
+        timings.sort()
+        self.stdout.write(
+            f"Revisions: {len(versions)}, keyframe interval: {interval}\n"
+            f"Stored chars: {full_size} full -> {delta_size} delta "
+            f"({100 * delta_size / full_size:.1f}%)\n"
+            f"Reconstruction ms: median {statistics.median(timings):.3f}, "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:.3f}, max {timings[-1]:.3f}"
+        )
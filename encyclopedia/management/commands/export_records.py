@@ -0,0 +1,73 @@
+from argparse import ArgumentTypeError
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from encyclopedia import archive, exports
+
+
+def _date(value):
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ArgumentTypeError(f"invalid date: {value}")
+    return day
+
+
+class Command(BaseCommand):
+    help = (
+        "Write entries, audit logs or archived audit logs to a CSV or JSON-lines file. "
+        "Use this for exports too large to stream from a web worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=["entries", "audit-logs", "audit-archive"])
+        parser.add_argument("output", help="File to write; a .gz suffix compresses it.")
+        parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+        parser.add_argument("--from", dest="start", type=_date, help="First day, YYYY-MM-DD.")
+        parser.add_argument("--to", dest="end", type=_date, help="Last day, YYYY-MM-DD.")
+        parser.add_argument("--action", help="Only audit records with this action.")
+
+    def handle(self, *args, **options):
+        kind, start, end, action = (
+            options["kind"],
+            options["start"],
+            options["end"],
+            options["action"],
+        )
+        if kind == "entries":
+            rows, columns = exports.entry_rows(), exports.ENTRY_COLUMNS
+        elif kind == "audit-logs":
+            rows, columns = exports.audit_log_rows(start, end, action), exports.AUDIT_LOG_COLUMNS
+        else:
+            if start is None:
+                raise CommandError("audit-archive exports need --from.")
+            rows = archive.iter_archived(start, end or start, action=action)
+            columns = exports.AUDIT_LOG_COLUMNS
+
+        counter = _Counter(rows)
+        if options["format"] == "csv":
+            lines = exports.csv_lines(counter, columns)
+        else:
+            lines = exports.jsonl_lines(counter)
+        output = Path(options["output"])
+        exports.write_file(lines, output)
+        self.stdout.write(
+            self.style.SUCCESS(f"Export complete. Rows: {counter.count}, Location: {output}")
+        )
+
+
+class _Counter:
+    """Passes rows through and counts them."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = 0
+
+    def __iter__(self):
+        for row in self.rows:
+            self.count += 1
+            yield row
@@ -0,0 +1,157 @@
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import unquote
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.urls import reverse
+
+from encyclopedia import util, views
+from encyclopedia.models import Entry
+
+MANIFEST_NAME = "manifest.json"
+CHUNK_SIZE = 200
+
+
+def _anonymous_request(path):
+    request = RequestFactory().get(path)
+    request.user = AnonymousUser()
+    return request
+
+
+def _page_path(output_dir, url):
+    """Maps a site URL to the index.html file that serves it."""
+    return Path(output_dir, *[part for part in unquote(url).split("/") if part], "index.html")
+
+
+def _write_page(output_dir, url, html):
+    path = _page_path(output_dir, url)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(html, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _exportable(title):
+    # Titles become directory names; these cannot be routed or would escape.
+    return title not in {".", ".."} and not any(char in title for char in "/\\\0")
+
+
+def _init_worker():
+    django.setup()
+
+
+def _render_entries(output_dir, titles):
+    """Writes the anonymous entry page for each title. Returns titles written."""
+    written = []
+    for title in titles:
+        entry = util.get_entry_page(title)
+        if entry is None:
+            continue
+        url = reverse("entry", kwargs={"title": entry.title})
+        request = _anonymous_request(url)
+        html = render_to_string(
+            "encyclopedia/entry.html", views._entry_context(request, entry), request=request
+        )
+        _write_page(output_dir, url, html)
+        written.append(entry.title)
+    return written
+
+
+class Command(BaseCommand):
+    help = "Export anonymous entry and library pages as static HTML for CDN or nginx serving."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=os.path.join(settings.BASE_DIR, "static_site"),
+            help="Directory to write the site into.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processes used to render entry pages; 1 renders in this process.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Re-render every entry instead of only those changed since the last export.",
+        )
+
+    def handle(self, *args, **options):
+        output_dir = Path(options["output"])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path = output_dir / MANIFEST_NAME
+
+        previous = {}
+        if manifest_path.exists() and not options["full"]:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            if manifest.get("renderer_version") == util.RENDERER_VERSION:
+                previous = manifest.get("entries", {})
+
+        current = {
+            title: updated_at.isoformat()
+            for title, updated_at in Entry.objects.values_list("title", "updated_at").iterator()
+            if _exportable(title)
+        }
+        stale = [title for title, stamp in current.items() if previous.get(title) != stamp]
+        removed = [title for title in previous if title not in current]
+
+        rendered = self._render_entries(output_dir, stale, max(1, options["workers"]))
+        for title in removed:
+            page = _page_path(output_dir, reverse("entry", kwargs={"title": title}))
+            shutil.rmtree(page.parent, ignore_errors=True)
+        self._render_library(output_dir)
+
+        manifest_path.write_text(
+            json.dumps(
+                {"renderer_version": util.RENDERER_VERSION, "entries": current},
+                ensure_ascii=False,
+                sort_keys=True,
+            ),
+            encoding="utf-8",
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Export complete. Entries: {len(current)}, Rendered: {rendered}, "
+                f"Removed: {len(removed)}"
+            )
+        )
+
+    def _render_entries(self, output_dir, titles, workers):
+        chunks = [titles[i : i + CHUNK_SIZE] for i in range(0, len(titles), CHUNK_SIZE)]
+        if workers == 1 or len(chunks) <= 1:
+            return sum(len(_render_entries(output_dir, chunk)) for chunk in chunks)
+
+        # Forked workers must open their own database connections.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            results = pool.map(_render_entries, [output_dir] * len(chunks), chunks)
+            return sum(len(written) for written in results)
+
+    def _render_library(self, output_dir):
+        # Static hosting cannot follow ?after= cursors, so the front page keeps
+        # its first page and each letter section is written out in full.
+        pages = [(reverse("index"), None, 60)]
+        bucket_size = max(1, util.count_entries())
+        for letter in [*util.LIBRARY_LETTERS, util.LIBRARY_OTHER]:
+            pages.append((reverse("index_letter", kwargs={"letter": letter}), letter, bucket_size))
+
+        for url, letter, per_page in pages:
+            request = _anonymous_request(url)
+            context = views._library_context(letter=letter, per_page=per_page)
+            context["next_cursor"] = None
+            _write_page(
+                output_dir,
+                url,
+                render_to_string("encyclopedia/index.html", context, request=request),
+            )
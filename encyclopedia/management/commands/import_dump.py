@@ -0,0 +1,123 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from encyclopedia import dumps, importer
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream entries from a JSONL file, a tar or zip archive of markdown files or a "
+        "MediaWiki XML export, resuming from a checkpoint after an interruption."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Dump file; .gz and .bz2 JSONL or XML are accepted.")
+        parser.add_argument(
+            "--format",
+            choices=dumps.FORMATS,
+            help="Dump format; detected from the file name by default.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Records upserted per transaction.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Checkpoint file; defaults to <path>.checkpoint next to the dump.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore an existing checkpoint and start from the beginning.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would change without writing entries or checkpoints.",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"]).resolve()
+        if not path.is_file():
+            raise CommandError(f"{path} is not a file.")
+        dump_format = options["format"] or dumps.detect_format(path)
+        if dump_format is None:
+            raise CommandError("Cannot tell the dump format from the file name; use --format.")
+
+        checkpoint_path = Path(options["checkpoint"] or f"{path}.checkpoint")
+        start = 0
+        totals = importer.ImportStats()
+        skipped = 0
+        if checkpoint_path.exists() and not options["restart"]:
+            checkpoint = json.loads(checkpoint_path.read_text(encoding="utf-8"))
+            if checkpoint.get("source") == str(path) and checkpoint.get("format") == dump_format:
+                start = checkpoint["position"]
+                totals = importer.ImportStats(**checkpoint["stats"])
+                skipped = checkpoint["skipped"]
+                self.stdout.write(f"Resuming {dump_format} import at position {start}.")
+
+        batch_size = max(1, options["batch_size"])
+        started = time.monotonic()
+        processed = 0
+        batch = []
+        position = start
+        for position, title, content in dumps.READERS[dump_format](path, start=start):
+            if title is None:
+                skipped += 1
+                continue
+            batch.append((title, content))
+            if len(batch) >= batch_size:
+                processed += len(batch)
+                self._write_batch(batch, totals, options["dry_run"])
+                batch = []
+                if not options["dry_run"]:
+                    self._save_checkpoint(
+                        checkpoint_path, path, dump_format, position, totals, skipped
+                    )
+                rate = processed / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(
+                    f"Imported {processed} records, position {position} ({rate:.0f} records/s)"
+                )
+        processed += len(batch)
+        self._write_batch(batch, totals, options["dry_run"])
+        if not options["dry_run"]:
+            checkpoint_path.unlink(missing_ok=True)
+
+        elapsed = time.monotonic() - started
+        prefix = "Dry run" if options["dry_run"] else "Import complete"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}. Created: {totals.created}, Updated: {totals.updated}, "
+                f"Unchanged: {totals.unchanged}, Skipped: {skipped}, "
+                f"Rate: {processed / max(elapsed, 1e-6):.0f} records/s"
+            )
+        )
+
+    def _write_batch(self, batch, totals, dry_run):
+        totals.add(importer.upsert_batch(batch, dry_run=dry_run))
+
+    def _save_checkpoint(self, checkpoint_path, path, dump_format, position, totals, skipped):
+        tmp_path = checkpoint_path.with_name(checkpoint_path.name + ".tmp")
+        tmp_path.write_text(
+            json.dumps(
+                {
+                    "source": str(path),
+                    "format": dump_format,
+                    "position": position,
+                    "stats": {
+                        "created": totals.created,
+                        "updated": totals.updated,
+                        "unchanged": totals.unchanged,
+                    },
+                    "skipped": skipped,
+                }
+            ),
+            encoding="utf-8",
+        )
+        os.replace(tmp_path, checkpoint_path)
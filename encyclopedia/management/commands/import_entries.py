@@ -1,10 +1,24 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from encyclopedia import importer, util
 from encyclopedia.models import Entry
 
+MANIFEST_NAME = ".import-manifest.json"
+
+
+def _read(path):
+    """Returns (path, stat key, content, content hash) for a markdown file."""
+    stat = path.stat()
+    content = path.read_text(encoding="utf-8")
+    return path, [stat.st_size, stat.st_mtime_ns], content, util.hash_content(content)
+
 
 class Command(BaseCommand):
     help = "Import markdown files from entries/ directory into the database."
@@ -15,6 +29,28 @@ class Command(BaseCommand):
             action="store_true",
             help="Delete all existing DB entries before import.",
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Files read and upserted per transaction.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Threads reading files.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Ignore the manifest and check every file against the database.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would change without writing entries or the manifest.",
+        )
 
     def handle(self, *args, **options):
         entries_dir = Path(settings.BASE_DIR) / "entries"
@@ -22,28 +58,62 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR("entries/ directory not found."))
             return
 
-        if options["clear"]:
+        if options["clear"] and not options["dry_run"]:
             deleted, _ = Entry.objects.all().delete()
             self.stdout.write(self.style.WARNING(f"Deleted {deleted} existing rows."))
 
-        imported = 0
-        updated = 0
+        # The manifest records each imported file's size, mtime and content
+        # hash, so later runs skip unchanged files without reading them.
+        manifest_path = entries_dir / MANIFEST_NAME
+        manifest = {}
+        if manifest_path.exists() and not (options["full"] or options["clear"]):
+            saved = json.loads(manifest_path.read_text(encoding="utf-8"))
+            if saved.get("renderer_version") == util.RENDERER_VERSION:
+                manifest = saved.get("files", {})
+
+        paths = sorted(entries_dir.glob("*.md"))
+        batch_size = max(1, options["batch_size"])
+        totals = importer.ImportStats()
+        files = {}
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, options["workers"])) as pool:
+            for start in range(0, len(paths), batch_size):
+                batch = []
+                for path in paths[start : start + batch_size]:
+                    known = manifest.get(path.name)
+                    stat = path.stat()
+                    if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+                        files[path.name] = known
+                        totals.unchanged += 1
+                    else:
+                        batch.append(path)
+
+                records = []
+                for path, stat_key, content, content_hash in pool.map(_read, batch):
+                    files[path.name] = [*stat_key, content_hash]
+                    known = manifest.get(path.name)
+                    if known and known[2] == content_hash:
+                        totals.unchanged += 1
+                    else:
+                        records.append((path.stem, content))
+                totals.add(importer.upsert_batch(records, dry_run=options["dry_run"]))
 
-        for md_file in sorted(entries_dir.glob("*.md")):
-            title = md_file.stem
-            content = md_file.read_text(encoding="utf-8")
+                done = min(start + batch_size, len(paths))
+                rate = done / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(f"Processed {done}/{len(paths)} files ({rate:.0f} files/s)")
 
-            obj, created = Entry.objects.update_or_create(
-                title=title,
-                defaults={"content": content},
+        if not options["dry_run"]:
+            tmp_path = manifest_path.with_name(MANIFEST_NAME + ".tmp")
+            tmp_path.write_text(
+                json.dumps({"renderer_version": util.RENDERER_VERSION, "files": files}),
+                encoding="utf-8",
             )
-            if created:
-                imported += 1
-            else:
-                updated += 1
+            os.replace(tmp_path, manifest_path)
 
+        prefix = "Dry run" if options["dry_run"] else "Import complete"
         self.stdout.write(
             self.style.SUCCESS(
-                f"Import complete. Created: {imported}, Updated: {updated}, Total: {imported + updated}"
+                f"{prefix}. Created: {totals.created}, Updated: {totals.updated}, "
+                f"Unchanged: {totals.unchanged}, Total: {totals.total}"
             )
         )
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from encyclopedia import retention
+from encyclopedia.models import EntryRevision
+
+
+class Command(BaseCommand):
+    help = "Delete revisions outside the retention policy and re-encode the ones kept."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Revisions deleted or rewritten per transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be pruned without deleting anything.",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        # Entries with no more than keep_last revisions keep all of them. The
+        # ids are read up front because the loop deletes from the same table.
+        entry_ids = list(
+            EntryRevision.objects.values("entry_id")
+            .annotate(revision_count=Count("id"))
+            .filter(revision_count__gt=retention.keep_last())
+            .order_by("entry_id")
+            .values_list("entry_id", flat=True)
+        )
+        entries = deleted = reclaimed = 0
+        for entry_id in entry_ids:
+            pruned, freed = retention.prune_entry(
+                entry_id,
+                now=now,
+                batch_size=max(1, options["batch_size"]),
+                dry_run=options["dry_run"],
+            )
+            if pruned:
+                entries += 1
+                deleted += pruned
+                reclaimed += freed
+
+        prefix = "Dry run" if options["dry_run"] else "Prune complete"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}. Entries: {entries}, Revisions deleted: {deleted}, "
+                f"Bytes reclaimed: {reclaimed}"
+            )
+        )
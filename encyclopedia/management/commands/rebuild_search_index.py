@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from encyclopedia import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from the entries table."
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        indexed = backend.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Search index rebuilt ({backend.name}). Entries: {indexed}")
+        )
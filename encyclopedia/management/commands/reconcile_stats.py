@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from encyclopedia import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized dashboard counters from the source tables."
+
+    def handle(self, *args, **options):
+        counts = stats.reconcile()
+        summary = ", ".join(
+            f"{name}: {counts[name]}"
+            for name in [
+                stats.TOTAL_ENTRIES,
+                stats.LOCKED_ENTRIES,
+                stats.VERIFIED_ENTRIES,
+                stats.REVISIONS,
+                stats.OPEN_DISPUTES,
+            ]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Stats reconciled. {summary}"))
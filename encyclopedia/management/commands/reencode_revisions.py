@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.db.models.functions import Length
+
+from encyclopedia import history
+from encyclopedia.models import EntryRevision
+
+
+def _stored_chars():
+    totals = EntryRevision.objects.aggregate(
+        content=Sum(Length("content")), delta=Sum(Length("delta"))
+    )
+    return (totals["content"] or 0) + (totals["delta"] or 0)
+
+
+class Command(BaseCommand):
+    help = "Renumber revisions and store them as deltas with periodic keyframes."
+
+    def handle(self, *args, **options):
+        before = _stored_chars()
+        entry_ids = (
+            EntryRevision.objects.order_by("entry_id").values_list("entry_id", flat=True).distinct()
+        )
+        entries = 0
+        rows = 0
+        for entry_id in entry_ids.iterator():
+            rows += history.reencode_entry(entry_id)
+            entries += 1
+        after = _stored_chars()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Re-encode complete. Entries: {entries}, Revisions: {rows}, "
+                f"Stored chars: {before} -> {after}"
+            )
+        )
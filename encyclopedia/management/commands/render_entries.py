@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+
+from encyclopedia import util
+from encyclopedia.models import Entry
+
+
+class Command(BaseCommand):
+    help = "Backfill stored HTML for entries whose rendering is missing or stale."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-render every entry, even if its stored HTML looks current.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of entries written per bulk update.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        fields = ["content_html", "content_hash", "renderer_version"]
+        entries = Entry.objects.only("id", "content", "content_hash", "renderer_version").order_by(
+            "id"
+        )
+
+        scanned = 0
+        rendered = 0
+        pending = []
+        for entry in entries.iterator(chunk_size=batch_size):
+            scanned += 1
+            is_current = (
+                entry.renderer_version == util.RENDERER_VERSION
+                and entry.content_hash == util.hash_content(entry.content)
+            )
+            if is_current and not options["all"]:
+                continue
+
+            util.refresh_rendered_content(entry)
+            pending.append(entry)
+            if len(pending) >= batch_size:
+                Entry.objects.bulk_update(pending, fields)
+                rendered += len(pending)
+                pending = []
+
+        if pending:
+            Entry.objects.bulk_update(pending, fields)
+            rendered += len(pending)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Render complete. Scanned: {scanned}, Rendered: {rendered}")
+        )
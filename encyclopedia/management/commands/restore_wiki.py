@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from encyclopedia import backup
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a backup_wiki directory into this database, alongside any existing content. "
+        "Running it again after an interruption resumes the restore."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Backup directory written by backup_wiki.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Rows inserted per bulk_create and transaction.",
+        )
+
+    def handle(self, *args, **options):
+        source = Path(options["source"])
+        if not (source / backup.MANIFEST_NAME).exists():
+            raise CommandError(f"{source} has no {backup.MANIFEST_NAME}; is the backup complete?")
+        try:
+            counts, orphans = backup.restore(
+                source,
+                batch_size=max(1, options["batch_size"]),
+                log=self.stdout.write if options["verbosity"] > 1 else None,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+        if orphans:
+            skipped = ", ".join(f"{label}: {rows}" for label, rows in orphans.items())
+            self.stdout.write(
+                self.style.WARNING(f"Skipped rows whose entry is not in the backup. {skipped}")
+            )
+        summary = ", ".join(f"{label}: {rows}" for label, rows in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Restore complete. {summary}"))
@@ -0,0 +1,70 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+# Collision groups listed in the error; the rest are only counted.
+MAX_REPORTED_COLLISIONS = 50
+
+
+def populate_title_normalized(apps, schema_editor):
+    Entry = apps.get_model("encyclopedia", "Entry")
+    batch = []
+    for entry in Entry.objects.only("id", "title").iterator(chunk_size=2000):
+        entry.title_normalized = entry.title.casefold()
+        batch.append(entry)
+        if len(batch) >= 2000:
+            Entry.objects.bulk_update(batch, ["title_normalized"])
+            batch = []
+    if batch:
+        Entry.objects.bulk_update(batch, ["title_normalized"])
+    check_title_collisions(Entry)
+
+
+def check_title_collisions(Entry):
+    """Aborts with the conflicting titles when two entries casefold to the
+    same title, which the old case-sensitive constraint allowed ("Python"
+    and "python", or "Straße" and "STRASSE")."""
+    colliding = (
+        Entry.objects.values("title_normalized")
+        .annotate(entries=Count("id"))
+        .filter(entries__gt=1)
+        .order_by("title_normalized")
+        .values_list("title_normalized", flat=True)
+    )
+    total = colliding.count()
+    if not total:
+        return
+    groups = {}
+    rows = Entry.objects.filter(
+        title_normalized__in=list(colliding[:MAX_REPORTED_COLLISIONS])
+    ).order_by("title_normalized", "id")
+    for pk, title, normalized in rows.values_list("id", "title", "title_normalized"):
+        groups.setdefault(normalized, []).append(f"{title!r} (id {pk})")
+    lines = [" / ".join(titles) for titles in groups.values()]
+    if total > len(groups):
+        lines.append(f"... and {total - len(groups)} more")
+    raise RuntimeError(
+        f"{total} group(s) of entries have titles that differ only in case, so titles "
+        "cannot be made case-insensitively unique. Rename or merge these entries and run "
+        "migrate again:\n" + "\n".join(lines)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("encyclopedia", "0006_entry_rendered_content"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="entry",
+            name="title_normalized",
+            field=models.CharField(editable=False, max_length=600, null=True),
+        ),
+        migrations.RunPython(populate_title_normalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="entry",
+            name="title_normalized",
+            field=models.CharField(editable=False, max_length=600, unique=True),
+        ),
+    ]
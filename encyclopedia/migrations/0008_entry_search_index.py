@@ -0,0 +1,61 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS encyclopedia_entry_fts "
+    "USING fts5(title, content, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO encyclopedia_entry_fts (rowid, title, content) "
+    "SELECT id, title, content FROM encyclopedia_entry",
+]
+SQLITE_REVERSE = ["DROP TABLE IF EXISTS encyclopedia_entry_fts"]
+
+POSTGRES_FORWARD = [
+    "ALTER TABLE encyclopedia_entry ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'B')"
+    ") STORED",
+    "CREATE INDEX encyclopedia_entry_search_vector_idx "
+    "ON encyclopedia_entry USING GIN (search_vector)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS encyclopedia_entry_search_vector_idx",
+    "ALTER TABLE encyclopedia_entry DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        try:
+            _run(schema_editor, SQLITE_FORWARD[:1])
+        except OperationalError:
+            # SQLite built without FTS5; search falls back to the Python index.
+            return
+        _run(schema_editor, SQLITE_FORWARD[1:])
+    elif vendor == "postgresql":
+        _run(schema_editor, POSTGRES_FORWARD)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        _run(schema_editor, SQLITE_REVERSE)
+    elif vendor == "postgresql":
+        _run(schema_editor, POSTGRES_REVERSE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("encyclopedia", "0007_entry_title_normalized"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0012_audit_dispute_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entryrevision',
+            name='delta',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='entryrevision',
+            name='is_delta',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='entryrevision',
+            name='seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='entryrevision',
+            name='content',
+            field=models.TextField(blank=True),
+        ),
+    ]
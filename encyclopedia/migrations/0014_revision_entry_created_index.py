@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0013_revision_deltas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entryrevision',
+            index=models.Index(fields=['entry', 'created_at', 'id'], name='revision_entry_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0014_revision_entry_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entry',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
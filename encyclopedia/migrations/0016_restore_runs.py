@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0015_entry_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RestoreRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('backup_id', models.CharField(max_length=64, unique=True)),
+                ('model_index', models.PositiveIntegerField(default=0)),
+                ('chunk_index', models.PositiveIntegerField(default=0)),
+                ('rows_read', models.PositiveIntegerField(default=0)),
+                ('counts', models.JSONField(default=dict)),
+                ('orphans', models.JSONField(default=dict)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RestoredEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_id', models.BigIntegerField()),
+                ('new_id', models.BigIntegerField()),
+                ('kept', models.BooleanField(default=False)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='encyclopedia.restorerun')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='restoredentry',
+            constraint=models.UniqueConstraint(fields=('run', 'old_id'), name='restored_entry_run_old_id'),
+        ),
+    ]
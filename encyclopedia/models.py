@@ -1,5 +1,11 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+
+
+def normalize_title(title):
+    """Returns the casefolded form used for case-insensitive title lookups."""
+    return title.casefold()
 
 
 class Entry(models.Model):
@@ -11,7 +17,13 @@ class Entry(models.Model):
     ]
 
     title = models.CharField(max_length=200, unique=True)
+    # Casefolding can expand a character to up to three code points.
+    title_normalized = models.CharField(max_length=600, unique=True, editable=False)
     content = models.TextField()
+    # Markdown rendered at write time so the read path never re-renders.
+    content_html = models.TextField(blank=True, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+    renderer_version = models.PositiveSmallIntegerField(default=0, editable=False)
     lead_image_url = models.URLField(max_length=500, blank=True)
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -44,17 +56,37 @@ class Entry(models.Model):
     verified_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bumped on every content save; edit forms send it back so a save based
+    # on stale content is refused instead of overwriting a newer edit.
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     class Meta:
         ordering = ["title"]
+        indexes = [models.Index(fields=["updated_at"], name="entry_updated_at_idx")]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.title_normalized = normalize_title(self.title)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "title" in update_fields:
+            kwargs["update_fields"] = update_fields = {*update_fields, "title_normalized"}
+        if not self._state.adding and (update_fields is None or "content" in update_fields):
+            self.version += 1
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "version"}
+        super().save(*args, **kwargs)
+
 
 class EntryRevision(models.Model):
     entry = models.ForeignKey(Entry, on_delete=models.CASCADE, related_name="revisions")
-    content = models.TextField()
+    # Full text, or empty when the revision is stored as a delta against its
+    # next-newer revision; read it through history.revision_content.
+    content = models.TextField(blank=True)
+    delta = models.TextField(blank=True)
+    is_delta = models.BooleanField(default=False)
+    seq = models.PositiveIntegerField(default=0)
     edited_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -67,6 +99,9 @@ class EntryRevision(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["entry", "created_at", "id"], name="revision_entry_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.entry.title} revision at {self.created_at}"
@@ -102,10 +137,19 @@ class AuditLog(models.Model):
         related_name="wiki_audit_logs",
     )
     details = models.TextField(blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set from the action time rather than auto_now_add so batched and
+    # replayed writes keep when the action happened.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
+        # Keyset pages walk (created_at, id) within each filter.
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="auditlog_created_idx"),
+            models.Index(fields=["action", "created_at", "id"], name="auditlog_action_created_idx"),
+            models.Index(fields=["actor", "created_at", "id"], name="auditlog_actor_created_idx"),
+            models.Index(fields=["entry", "created_at", "id"], name="auditlog_entry_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.action} - {self.entry_title}"
@@ -141,6 +185,11 @@ class Dispute(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="dispute_created_idx"),
+            models.Index(fields=["status", "created_at", "id"], name="dispute_status_created_idx"),
+            models.Index(fields=["entry", "created_at", "id"], name="dispute_entry_created_idx"),
+        ]
 
     def __str__(self):
         return f"Dispute on {self.entry.title} ({self.status})"
@@ -171,3 +220,48 @@ class EntryResource(models.Model):
 
     def __str__(self):
         return f"{self.entry.title} - {self.resource_type} - {self.label}"
+
+
+class StatCounter(models.Model):
+    """One materialized count for the dashboard, maintained by signals."""
+
+    name = models.CharField(max_length=64, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class RestoreRun(models.Model):
+    """Progress of restoring one backup, committed with every inserted batch
+    so an interrupted restore_wiki carries on where it stopped."""
+
+    backup_id = models.CharField(max_length=64, unique=True)
+    # Position in the backup: index into backup.MODELS, chunk file of that
+    # model, and lines of that file already consumed.
+    model_index = models.PositiveIntegerField(default=0)
+    chunk_index = models.PositiveIntegerField(default=0)
+    rows_read = models.PositiveIntegerField(default=0)
+    counts = models.JSONField(default=dict)
+    orphans = models.JSONField(default=dict)
+    started_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Restore of {self.backup_id}"
+
+
+class RestoredEntry(models.Model):
+    """Maps an entry id in a backup to the id it has here."""
+
+    run = models.ForeignKey(RestoreRun, on_delete=models.CASCADE, related_name="entries")
+    old_id = models.BigIntegerField()
+    new_id = models.BigIntegerField()
+    # The entry already existed, so its children were not restored.
+    kept = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["run", "old_id"], name="restored_entry_run_old_id")
+        ]
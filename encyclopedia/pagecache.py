@@ -0,0 +1,177 @@
+"""Shared page cache for anonymous GETs.
+
+Pages are stored under the request path plus a version token for the data
+they render: one token per entry for entry pages and a catalog token for
+listings (index, search). Purging an entry deletes its token and the catalog
+token, so the next request picks a fresh one and old pages simply age out;
+nothing else is flushed.
+
+Purges only reach other workers and replicas through a shared cache backend
+(see CACHE_BACKEND in settings); the encyclopedia.W001 deploy check warns
+when the page cache is enabled on a per-process local-memory cache.
+
+Only anonymous 200 responses that did not use a CSRF token or set cookies
+are stored, so per-user markup is never served to someone else.
+
+Hit and miss counts are kept per process and added to the shared counters
+at most once per WIKI_PAGE_CACHE_STATS_INTERVAL seconds, so serving a hit
+reads the cache without writing to it.
+"""
+
+import atexit
+import functools
+import hashlib
+import threading
+import time
+import uuid
+from typing import Dict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .models import normalize_title
+
+CATALOG_SCOPE = "catalog"
+HITS_KEY = "wiki:pagecache:hits"
+MISSES_KEY = "wiki:pagecache:misses"
+
+
+def entry_scope(title: str) -> str:
+    return f"entry:{normalize_title(title)}"
+
+
+def _timeout() -> int:
+    return getattr(settings, "WIKI_PAGE_CACHE_TIMEOUT", 300)
+
+
+def _version_key(scope: str) -> str:
+    return "wiki:pagecache:version:" + hashlib.md5(scope.encode("utf-8")).hexdigest()
+
+
+def _version(scope: str) -> str:
+    return cache.get_or_set(_version_key(scope), lambda: uuid.uuid4().hex, None)
+
+
+def _page_key(request, version: str) -> str:
+    path = hashlib.md5(request.get_full_path().encode("utf-8")).hexdigest()
+    return f"wiki:pagecache:page:{version}:{path}"
+
+
+# This process's counts not yet added to the shared keys.
+_pending: Dict[str, int] = {HITS_KEY: 0, MISSES_KEY: 0}
+_pending_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def _stats_interval() -> float:
+    return getattr(settings, "WIKI_PAGE_CACHE_STATS_INTERVAL", 60)
+
+
+def _count(key: str):
+    with _pending_lock:
+        _pending[key] += 1
+        if time.monotonic() - _flushed_at < _stats_interval():
+            return
+    flush_stats()
+
+
+def flush_stats():
+    """Adds this process's pending hit and miss counts to the shared ones."""
+    global _flushed_at
+    with _pending_lock:
+        _flushed_at = time.monotonic()
+        counts = {key: value for key, value in _pending.items() if value}
+        for key in counts:
+            _pending[key] = 0
+    for key, value in counts.items():
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            # Evicted between add and incr; these counts are lost.
+            pass
+
+
+def purge(*scopes: str):
+    """Invalidates every cached page rendered from the given scopes.
+
+    Inside a transaction the purge is repeated on commit, so a page rendered
+    from the old rows before the commit is not kept.
+    """
+    keys = [_version_key(scope) for scope in scopes]
+    cache.delete_many(keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def purge_entry(title: str):
+    """Invalidates an entry's page and the listings that may show it."""
+    purge(entry_scope(title), CATALOG_SCOPE)
+
+
+def stats() -> Dict[str, int]:
+    """Returns page cache hit and miss counts: the shared totals plus this
+    process's counts that are not flushed yet."""
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    with _pending_lock:
+        hits, misses = _pending[HITS_KEY], _pending[MISSES_KEY]
+    return {
+        "hits": counts.get(HITS_KEY, 0) + hits,
+        "misses": counts.get(MISSES_KEY, 0) + misses,
+    }
+
+
+def _cacheable(request, response) -> bool:
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+        and not request.user.is_authenticated
+    )
+
+
+def cache_anonymous(scope_func):
+    """Caches a view for anonymous GETs under the scope scope_func returns.
+
+    scope_func receives the view's URL kwargs.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            timeout = _timeout()
+            if not timeout or request.method != "GET" or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            # Read the version before rendering so a purge during the render
+            # orphans the stored page instead of serving it.
+            key = _page_key(request, _version(scope_func(**kwargs)))
+            response = cache.get(key)
+            if response is not None:
+                _count(HITS_KEY)
+                response = get_conditional_response(
+                    request,
+                    etag=response.get("ETag"),
+                    last_modified=parse_http_date_safe(response.get("Last-Modified", "")),
+                    response=response,
+                )
+                response["X-Page-Cache"] = "hit"
+                return response
+
+            _count(MISSES_KEY)
+            response = view(request, *args, **kwargs)
+            if _cacheable(request, response):
+                cache.set(key, response, timeout)
+            response["X-Page-Cache"] = "miss"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+atexit.register(flush_stats)
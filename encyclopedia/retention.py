@@ -0,0 +1,185 @@
+"""Revision retention policy.
+
+An entry keeps its WIKI_REVISION_KEEP_LAST newest revisions, the newest
+revision of each day for the last WIKI_REVISION_KEEP_DAYS days and the newest
+revision of every month, forever. Days and months are UTC.
+
+Pruning works through the history one span at a time, a span being the
+delta rows up to and including the next full row: it rebuilds the span's
+surviving texts, deletes the rest and re-encodes the survivors, because a
+delta stored against a deleted revision could no longer be read. Spans only
+depend on themselves, so every batch of spans commits on its own and the
+history stays readable between batches.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Sequence, Set, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Func, IntegerField, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone as django_timezone
+
+from . import history, stats, util
+from .models import EntryRevision
+
+
+def keep_last() -> int:
+    return max(1, getattr(settings, "WIKI_REVISION_KEEP_LAST", 50))
+
+
+def keep_days() -> int:
+    return max(0, getattr(settings, "WIKI_REVISION_KEEP_DAYS", 30))
+
+
+def revisions_to_keep(stamps: Sequence[Tuple[int, datetime]], now: datetime) -> Set[int]:
+    """Returns the ids the policy keeps from (id, created_at) pairs ordered
+    newest first."""
+    keep = {pk for pk, _ in stamps[: keep_last()]}
+    daily_since = now - timedelta(days=keep_days())
+    days, months = set(), set()
+    for pk, created_at in stamps:
+        created_at = created_at.astimezone(timezone.utc)
+        day = created_at.date()
+        if created_at >= daily_since and day not in days:
+            days.add(day)
+            keep.add(pk)
+        if (day.year, day.month) not in months:
+            months.add((day.year, day.month))
+            keep.add(pk)
+    return keep
+
+
+class _ByteLength(Func):
+    """Encoded size of a text column in bytes."""
+
+    function = "OCTET_LENGTH"
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template="LENGTH(CAST(%(expressions)s AS BLOB))", **extra_context
+        )
+
+
+def stored_bytes(revisions) -> int:
+    """Returns the bytes of revision text and delta columns in a queryset."""
+    totals = revisions.aggregate(
+        content=Coalesce(Sum(_ByteLength("content")), 0),
+        delta=Coalesce(Sum(_ByteLength("delta")), 0),
+    )
+    return totals["content"] + totals["delta"]
+
+
+def prune_entry(
+    entry_id: int,
+    now: Optional[datetime] = None,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+) -> Tuple[int, int]:
+    """Deletes the revisions of one entry the policy does not keep. Returns
+    (revisions deleted, bytes reclaimed); a dry run estimates the bytes.
+
+    Each transaction rewrites whole spans until about batch_size rows have
+    been touched, so locks and write volume per commit stay bounded however
+    long the history is.
+    """
+    now = now or django_timezone.now()
+    revisions = EntryRevision.objects.filter(entry_id=entry_id)
+    stamps = list(revisions.order_by("-created_at", "-id").values_list("id", "created_at"))
+    keep = revisions_to_keep(stamps, now)
+    pruned = {pk for pk, _ in stamps if pk not in keep}
+    if not pruned:
+        return 0, 0
+
+    before = stored_bytes(revisions)
+    if dry_run:
+        return len(pruned), before - stored_bytes(revisions.filter(id__in=keep))
+
+    # Spans older than the one holding the oldest pruned row are untouched.
+    start = (
+        revisions.filter(is_delta=False, id__lt=min(pruned))
+        .order_by("-id")
+        .values_list("id", "seq")
+        .first()
+    )
+    after_id, seq = start or (0, 0)
+    deleted = 0
+    while after_id is not None:
+        with transaction.atomic():
+            after_id, seq, removed = _prune_spans(
+                entry_id, pruned, after_id, seq, max(1, batch_size)
+            )
+        if removed:
+            stats.apply({stats.REVISIONS: -removed})
+            cache.delete(util.revision_count_key(entry_id))
+            deleted += removed
+    return deleted, before - stored_bytes(revisions)
+
+
+def _lock_span(entry_id: int, after_id: int) -> List[EntryRevision]:
+    """Locks and returns the revisions after after_id up to and including the
+    next full row. Deltas only reach the next full row, so such a span can be
+    rebuilt and rewritten without reading anything outside it."""
+    chain = (
+        EntryRevision.objects.select_for_update()
+        .filter(entry_id=entry_id, id__gt=after_id)
+        .order_by("id")
+        .only("id", "seq", "is_delta", "content", "delta")
+    )
+    rows = []
+    for row in chain.iterator(chunk_size=history.keyframe_interval()):
+        rows.append(row)
+        if not row.is_delta:
+            break
+    return rows
+
+
+def _prune_spans(
+    entry_id: int, pruned: Set[int], after_id: int, seq: int, budget: int
+) -> Tuple[Optional[int], int, int]:
+    """Deletes the pruned rows of the spans after after_id, re-encodes and
+    renumbers the survivors, and stops once budget rows have been touched.
+    Returns (id to continue after or None when done, last seq, rows deleted)."""
+    touched = removed = 0
+    while touched < budget:
+        rows = _lock_span(entry_id, after_id)
+        if not rows:
+            return None, seq, removed
+        after_id = rows[-1].id
+        touched += len(rows)
+        survivors = [row for row in rows if row.id not in pruned]
+        doomed = [row.id for row in rows if row.id in pruned]
+        renumbered = False
+        for row in survivors:
+            seq += 1
+            renumbered = renumbered or row.seq != seq
+            row.seq = seq
+        if doomed:
+            contents = history.revision_contents(entry_id, [row.id for row in survivors])
+            removed += _delete_rows(doomed)
+            # The span's newest survivor becomes its full row.
+            newer_content = None
+            for row in reversed(survivors):
+                if newer_content is None:
+                    row.is_delta, row.delta, row.content = False, "", contents[row.id]
+                else:
+                    history.encode(row, newer_content, contents[row.id])
+                newer_content = contents[row.id]
+            EntryRevision.objects.bulk_update(survivors, ["seq", "is_delta", "delta", "content"])
+        elif renumbered:
+            EntryRevision.objects.bulk_update(survivors, ["seq"])
+    return after_id, seq, removed
+
+
+def _delete_rows(ids: List[int]) -> int:
+    """Deletes revisions with one plain DELETE. Going through the ORM would
+    send post_delete per row, costing a counter update and a cache delete
+    each, so prune_entry applies both once per transaction instead."""
+    table = connection.ops.quote_name(EntryRevision._meta.db_table)
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", ids)
+        return cursor.rowcount
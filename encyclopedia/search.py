@@ -0,0 +1,419 @@
+"""Ranked full-text search over entries.
+
+The backend is picked from the database vendor: SQLite uses an FTS5 table
+kept in sync by the Entry signals, Postgres uses a generated tsvector column
+with a GIN index, and anything else falls back to an in-process inverted
+index that refreshes itself like the title indexes. WIKI_SEARCH_BACKEND
+forces a specific backend.
+"""
+
+import bisect
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Entry
+from .titleindex import RefreshingIndex
+
+FTS_TABLE = "encyclopedia_entry_fts"
+
+# Control characters never appear in escaped HTML, so backends wrap matches
+# in them and _highlight swaps them for <mark> after escaping.
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+_TOKEN_RE = re.compile(r"\w+")
+
+
+@dataclass
+class SearchHit:
+    title: str
+    snippet: str
+    score: float
+
+
+@dataclass
+class SearchPage:
+    hits: List[SearchHit] = field(default_factory=list)
+    total: int = 0
+    page: int = 1
+    per_page: int = 20
+
+    @property
+    def num_pages(self) -> int:
+        return max(1, math.ceil(self.total / self.per_page))
+
+    @property
+    def has_next(self) -> bool:
+        return self.page < self.num_pages
+
+    @property
+    def has_previous(self) -> bool:
+        return self.page > 1
+
+    @property
+    def next_page(self) -> int:
+        return self.page + 1
+
+    @property
+    def previous_page(self) -> int:
+        return self.page - 1
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits text into casefolded word tokens."""
+    return [token.casefold() for token in _TOKEN_RE.findall(text or "")]
+
+
+def _highlight(raw: str) -> str:
+    html = escape(raw).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+    return mark_safe(html)
+
+
+class SearchBackend:
+    name = "base"
+
+    def index_entry(self, entry: Entry) -> None:
+        raise NotImplementedError
+
+    def index_entries(self, entries: List[Entry]) -> None:
+        """Indexes entries written without signals, e.g. by bulk imports."""
+        for entry in entries:
+            self.index_entry(entry)
+
+    def remove_entry(self, entry_id: int) -> None:
+        raise NotImplementedError
+
+    def rebuild(self) -> int:
+        raise NotImplementedError
+
+    def search(self, query: str, page: int = 1, per_page: int = 20) -> SearchPage:
+        raise NotImplementedError
+
+
+class SqliteFTSBackend(SearchBackend):
+    """FTS5 virtual table keyed by entry id, ranked with bm25()."""
+
+    name = "sqlite_fts"
+    # bm25() column weights: a title hit outranks a body hit.
+    title_weight = 10.0
+    content_weight = 1.0
+
+    def index_entry(self, entry):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [entry.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, content) VALUES (%s, %s, %s)",
+                [entry.pk, entry.title, entry.content],
+            )
+
+    def index_entries(self, entries):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [[entry.pk] for entry in entries]
+            )
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, content) VALUES (%s, %s, %s)",
+                [[entry.pk, entry.title, entry.content] for entry in entries],
+            )
+
+    def remove_entry(self, entry_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [entry_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, content) "
+                "SELECT id, title, content FROM encyclopedia_entry"
+            )
+        return Entry.objects.count()
+
+    def search(self, query, page=1, per_page=20):
+        tokens = tokenize(query)
+        result = SearchPage(page=page, per_page=per_page)
+        if not tokens:
+            return result
+
+        # Prefix match every token so partial words still find pages.
+        match = " ".join(f'"{token}"*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+            result.total = cursor.fetchone()[0]
+            if not result.total:
+                return result
+
+            cursor.execute(
+                f"SELECT e.title, bm25({FTS_TABLE}, %s, %s) AS rank, "
+                f"snippet({FTS_TABLE}, 1, %s, %s, '…', 24) "
+                f"FROM {FTS_TABLE} JOIN encyclopedia_entry e ON e.id = {FTS_TABLE}.rowid "
+                f"WHERE {FTS_TABLE} MATCH %s ORDER BY rank, e.title LIMIT %s OFFSET %s",
+                [
+                    self.title_weight,
+                    self.content_weight,
+                    _MARK_START,
+                    _MARK_END,
+                    match,
+                    per_page,
+                    (page - 1) * per_page,
+                ],
+            )
+            rows = cursor.fetchall()
+
+        result.hits = [SearchHit(title, _highlight(snippet), -rank) for title, rank, snippet in rows]
+        return result
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Generated tsvector column with a GIN index, ranked with ts_rank()."""
+
+    name = "postgres"
+    headline_options = (
+        f'StartSel="{_MARK_START}", StopSel="{_MARK_END}", MaxWords=35, MinWords=15'
+    )
+
+    # search_vector is a generated column, so Postgres maintains it on write.
+    def index_entry(self, entry):
+        return None
+
+    def remove_entry(self, entry_id):
+        return None
+
+    def rebuild(self):
+        return Entry.objects.count()
+
+    def search(self, query, page=1, per_page=20):
+        tokens = tokenize(query)
+        result = SearchPage(page=page, per_page=per_page)
+        if not tokens:
+            return result
+
+        tsquery = " & ".join(f"{token}:*" for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM encyclopedia_entry "
+                "WHERE search_vector @@ to_tsquery('english', %s)",
+                [tsquery],
+            )
+            result.total = cursor.fetchone()[0]
+            if not result.total:
+                return result
+
+            # Rank and page first so ts_headline only runs on the visible rows.
+            cursor.execute(
+                "SELECT e.title, ranked.rank, ts_headline('english', e.content, ranked.q, %s) "
+                "FROM ("
+                "  SELECT id, ts_rank(search_vector, q) AS rank, q "
+                "  FROM encyclopedia_entry, to_tsquery('english', %s) q "
+                "  WHERE search_vector @@ q "
+                "  ORDER BY rank DESC, title LIMIT %s OFFSET %s"
+                ") ranked JOIN encyclopedia_entry e ON e.id = ranked.id "
+                "ORDER BY ranked.rank DESC, e.title",
+                [self.headline_options, tsquery, per_page, (page - 1) * per_page],
+            )
+            rows = cursor.fetchall()
+
+        result.hits = [SearchHit(title, _highlight(snippet), rank) for title, rank, snippet in rows]
+        return result
+
+
+def _load_documents():
+    return Entry.objects.values_list("id", "title", "content").iterator(chunk_size=1000)
+
+
+class InvertedIndexBackend(RefreshingIndex, SearchBackend):
+    """Process-local inverted index with BM25 scoring.
+
+    Only used when the database offers no native full-text search. The index
+    is built on first query, updated by the Entry signals of this process and
+    rebuilt in the background every WIKI_SEARCH_INDEX_TTL seconds, so writes
+    handled by other workers show up too.
+    """
+
+    name = "python"
+    k1 = 1.2
+    b = 0.75
+    title_boost = 3
+    snippet_radius = 90
+    state_fields = (
+        "_postings",
+        "_doc_terms",
+        "_doc_lengths",
+        "_vocabulary",
+        "_vocabulary_dirty",
+    )
+
+    def __init__(
+        self,
+        loader: Callable[[], Iterable[Tuple[int, str, str]]] = _load_documents,
+        ttl: Optional[float] = None,
+    ):
+        if ttl is None:
+            ttl = getattr(settings, "WIKI_SEARCH_INDEX_TTL", 300)
+        super().__init__(loader, ttl=ttl)
+
+    def _reset(self):
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._doc_terms: Dict[int, Dict[str, int]] = {}
+        self._doc_lengths: Dict[int, int] = {}
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+
+    def _fill(self, documents):
+        for document in documents:
+            self._add(document)
+
+    def _term_frequencies(self, title, content):
+        frequencies: Dict[str, int] = {}
+        for token in tokenize(title):
+            frequencies[token] = frequencies.get(token, 0) + self.title_boost
+        for token in tokenize(content):
+            frequencies[token] = frequencies.get(token, 0) + 1
+        return frequencies
+
+    def _add(self, document):
+        entry_id, title, content = document
+        self._remove(entry_id)
+        frequencies = self._term_frequencies(title, content)
+        for term, count in frequencies.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._vocabulary_dirty = True
+            postings[entry_id] = count
+        self._doc_terms[entry_id] = frequencies
+        self._doc_lengths[entry_id] = sum(frequencies.values())
+
+    def _remove(self, entry_id):
+        for term in self._doc_terms.pop(entry_id, {}):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(entry_id, None)
+            if not postings:
+                del self._postings[term]
+                self._vocabulary_dirty = True
+        self._doc_lengths.pop(entry_id, None)
+
+    def _expand(self, token):
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        start = bisect.bisect_left(self._vocabulary, token)
+        terms = []
+        for term in self._vocabulary[start:]:
+            if not term.startswith(token):
+                break
+            terms.append(term)
+        return terms
+
+    def index_entry(self, entry):
+        self.add((entry.pk, entry.title, entry.content))
+
+    def remove_entry(self, entry_id):
+        self.remove(entry_id)
+
+    def rebuild(self):
+        self.clear()
+        with self._lock:
+            self._ensure_built()
+            return len(self._doc_lengths)
+
+    def search(self, query, page=1, per_page=20):
+        tokens = tokenize(query)
+        result = SearchPage(page=page, per_page=per_page)
+        if not tokens:
+            return result
+
+        with self._lock:
+            self._ensure_built()
+            doc_count = len(self._doc_lengths) or 1
+            average_length = sum(self._doc_lengths.values()) / doc_count or 1.0
+            scores: Optional[Dict[int, float]] = None
+            for token in tokens:
+                token_scores: Dict[int, float] = {}
+                for term in self._expand(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for entry_id, frequency in postings.items():
+                        norm = self.k1 * (
+                            1 - self.b + self.b * self._doc_lengths[entry_id] / average_length
+                        )
+                        weight = idf * frequency * (self.k1 + 1) / (frequency + norm)
+                        token_scores[entry_id] = token_scores.get(entry_id, 0.0) + weight
+                # Every query token must match, like the FTS backends.
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        entry_id: score + token_scores[entry_id]
+                        for entry_id, score in scores.items()
+                        if entry_id in token_scores
+                    }
+
+        scores = scores or {}
+        result.total = len(scores)
+        if not scores:
+            return result
+
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        page_ids = ranked[(page - 1) * per_page : page * per_page]
+        rows = Entry.objects.in_bulk([entry_id for entry_id, _ in page_ids])
+        for entry_id, score in page_ids:
+            entry = rows.get(entry_id)
+            if entry is not None:
+                result.hits.append(
+                    SearchHit(entry.title, self._snippet(entry.content, tokens), score)
+                )
+        return result
+
+    def _snippet(self, content, tokens):
+        pattern = re.compile(
+            r"\b(" + "|".join(re.escape(token) for token in tokens) + r")\w*", re.IGNORECASE
+        )
+        found = pattern.search(content)
+        start = max(0, found.start() - self.snippet_radius) if found else 0
+        end = min(len(content), start + 2 * self.snippet_radius)
+        window = content[start:end]
+        marked = pattern.sub(lambda m: f"{_MARK_START}{m.group(0)}{_MARK_END}", window)
+        prefix = "…" if start > 0 else ""
+        suffix = "…" if end < len(content) else ""
+        return _highlight(f"{prefix}{marked}{suffix}")
+
+
+_BACKEND_CLASSES = {
+    SqliteFTSBackend.name: SqliteFTSBackend,
+    PostgresSearchBackend.name: PostgresSearchBackend,
+    InvertedIndexBackend.name: InvertedIndexBackend,
+}
+_backends: Dict[str, SearchBackend] = {}
+
+
+def _sqlite_fts_available() -> bool:
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def _detect_backend_name() -> str:
+    configured = getattr(settings, "WIKI_SEARCH_BACKEND", "auto")
+    if configured in _BACKEND_CLASSES:
+        return configured
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend.name
+    if connection.vendor == "sqlite" and _sqlite_fts_available():
+        return SqliteFTSBackend.name
+    return InvertedIndexBackend.name
+
+
+def get_backend() -> SearchBackend:
+    """Returns the search backend for the default database connection."""
+    key = f"{connection.alias}:{connection.settings_dict['NAME']}"
+    backend = _backends.get(key)
+    if backend is None:
+        backend = _backends[key] = _BACKEND_CLASSES[_detect_backend_name()]()
+    return backend
@@ -0,0 +1,99 @@
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import pagecache, search, stats, util
+from .models import Dispute, Entry, EntryRevision
+
+SEARCHABLE_FIELDS = {"title", "content"}
+
+
+@receiver(post_save, sender=Entry)
+def index_saved_entry(sender, instance, created=False, update_fields=None, **kwargs):
+    pagecache.purge_entry(instance.title)
+    if created:
+        util.title_trigrams.add(instance.title)
+        util.title_prefixes.add(instance.title)
+    if update_fields is not None and not SEARCHABLE_FIELDS.intersection(update_fields):
+        return
+    search.get_backend().index_entry(instance)
+
+
+@receiver(post_delete, sender=Entry)
+def unindex_deleted_entry(sender, instance, **kwargs):
+    search.get_backend().remove_entry(instance.pk)
+    pagecache.purge_entry(instance.title)
+    util.title_trigrams.remove(instance.title)
+    util.title_prefixes.remove(instance.title)
+
+
+@receiver(post_init, sender=Entry)
+def remember_entry_stats_state(sender, instance, **kwargs):
+    instance._stats_state = stats.entry_state(instance)
+
+
+@receiver(post_save, sender=Entry)
+def count_saved_entry(sender, instance, created=False, **kwargs):
+    new_state = stats.entry_state(instance)
+    old_state = None if created else instance._stats_state
+    if created or (old_state is not None and new_state is not None):
+        stats.apply(stats.entry_deltas(old_state, new_state))
+    instance._stats_state = new_state
+
+
+@receiver(post_delete, sender=Entry)
+def count_deleted_entry(sender, instance, **kwargs):
+    stats.apply(stats.entry_deltas(stats.entry_state(instance), None))
+
+
+@receiver(pre_delete, sender=Entry)
+def count_entry_children(sender, instance, **kwargs):
+    # Revisions and disputes cascading from this delete are counted here in
+    # two queries rather than one counter update per row.
+    stats.apply(
+        {
+            stats.REVISIONS: -instance.revisions.count(),
+            stats.OPEN_DISPUTES: -instance.disputes.filter(status="open").count(),
+        }
+    )
+
+
+def _cascaded_from_entry(origin):
+    if isinstance(origin, QuerySet):
+        return origin.model is Entry
+    return isinstance(origin, Entry)
+
+
+@receiver(post_save, sender=EntryRevision)
+def count_saved_revision(sender, instance, created=False, **kwargs):
+    if created:
+        stats.apply({stats.REVISIONS: 1})
+        cache.delete(util.revision_count_key(instance.entry_id))
+
+
+@receiver(post_delete, sender=EntryRevision)
+def count_deleted_revision(sender, instance, origin=None, **kwargs):
+    cache.delete(util.revision_count_key(instance.entry_id))
+    if not _cascaded_from_entry(origin):
+        stats.apply({stats.REVISIONS: -1})
+
+
+@receiver(post_init, sender=Dispute)
+def remember_dispute_status(sender, instance, **kwargs):
+    instance._stats_status = instance.__dict__.get("status")
+
+
+@receiver(post_save, sender=Dispute)
+def count_saved_dispute(sender, instance, created=False, **kwargs):
+    if not created and instance._stats_status is None:
+        return
+    was_open = not created and instance._stats_status == "open"
+    stats.apply({stats.OPEN_DISPUTES: (instance.status == "open") - was_open})
+    instance._stats_status = instance.status
+
+
+@receiver(post_delete, sender=Dispute)
+def count_deleted_dispute(sender, instance, origin=None, **kwargs):
+    if instance.__dict__.get("status") == "open" and not _cascaded_from_entry(origin):
+        stats.apply({stats.OPEN_DISPUTES: -1})
@@ -0,0 +1,80 @@
+(function () {
+    function debounce(fn, delay) {
+        var timer;
+        return function () {
+            var context = this;
+            var args = arguments;
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                fn.apply(context, args);
+            }, delay);
+        };
+    }
+
+    var inputs = document.querySelectorAll("input[data-autocomplete-url]");
+
+    inputs.forEach(function (input, index) {
+        var endpoint = input.getAttribute("data-autocomplete-url");
+        var list = document.createElement("datalist");
+        var inFlight = null;
+
+        list.id = "title-suggestions-" + index;
+        input.setAttribute("list", list.id);
+        input.insertAdjacentElement("afterend", list);
+
+        function renderOptions(titles) {
+            list.innerHTML = "";
+            titles.forEach(function (title) {
+                var option = document.createElement("option");
+                option.value = title;
+                list.appendChild(option);
+            });
+        }
+
+        function fetchSuggestions() {
+            var prefix = (input.value || "").trim();
+
+            // Only the newest keystroke matters; drop any slower request.
+            if (inFlight) {
+                inFlight.abort();
+                inFlight = null;
+            }
+
+            if (!prefix) {
+                renderOptions([]);
+                return;
+            }
+
+            var controller = window.AbortController ? new AbortController() : null;
+            inFlight = controller;
+
+            fetch(endpoint + "?q=" + encodeURIComponent(prefix), {
+                method: "GET",
+                headers: {
+                    "X-Requested-With": "XMLHttpRequest"
+                },
+                signal: controller ? controller.signal : undefined
+            })
+                .then(function (response) {
+                    if (!response.ok) {
+                        throw new Error("Autocomplete request failed");
+                    }
+                    return response.json();
+                })
+                .then(function (payload) {
+                    if (inFlight === controller) {
+                        inFlight = null;
+                    }
+                    renderOptions(payload.results || []);
+                })
+                .catch(function (error) {
+                    if (error && error.name === "AbortError") {
+                        return;
+                    }
+                    renderOptions([]);
+                });
+        }
+
+        input.addEventListener("input", debounce(fetchSuggestions, 120));
+    });
+})();
@@ -0,0 +1,126 @@
+"""Materialized dashboard counters.
+
+Each count lives in one StatCounter row. Signal handlers adjust rows with
+F() increments as entries, revisions and disputes change, so the dashboard
+reads all of its counts in a single query. A missing row is recomputed on
+the next read; the reconcile_stats command recomputes every row, which also
+repairs drift from queryset updates that bypass signals.
+"""
+
+from collections import Counter
+from typing import Dict, Iterable, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Dispute, Entry, EntryRevision, StatCounter
+
+TOTAL_ENTRIES = "entries"
+LOCKED_ENTRIES = "locked_entries"
+VERIFIED_ENTRIES = "verified_entries"
+REVISIONS = "revisions"
+OPEN_DISPUTES = "open_disputes"
+USER_ENTRIES_PREFIX = "user_entries:"
+
+ENTRY_STATE_FIELDS = ("created_by_id", "is_locked", "verification_status")
+
+_GLOBAL_COUNTS = {
+    TOTAL_ENTRIES: lambda: Entry.objects.count(),
+    LOCKED_ENTRIES: lambda: Entry.objects.filter(is_locked=True).count(),
+    VERIFIED_ENTRIES: lambda: Entry.objects.filter(verification_status="verified").count(),
+    REVISIONS: lambda: EntryRevision.objects.count(),
+    OPEN_DISPUTES: lambda: Dispute.objects.filter(status="open").count(),
+}
+
+
+def user_entries_key(user_id) -> str:
+    return f"{USER_ENTRIES_PREFIX}{user_id}"
+
+
+def compute(name: str) -> int:
+    """Counts name from scratch."""
+    if name.startswith(USER_ENTRIES_PREFIX):
+        return Entry.objects.filter(created_by_id=name[len(USER_ENTRIES_PREFIX) :]).count()
+    return _GLOBAL_COUNTS[name]()
+
+
+def get_counts(names: Iterable[str]) -> Dict[str, int]:
+    """Returns the named counts, computing and storing any that are missing."""
+    names = list(names)
+    counts = dict(StatCounter.objects.filter(name__in=names).values_list("name", "value"))
+    for name in names:
+        if name not in counts:
+            counts[name] = compute(name)
+            try:
+                with transaction.atomic():
+                    StatCounter.objects.create(name=name, value=counts[name])
+            except IntegrityError:
+                pass
+    return counts
+
+
+def apply(deltas: Dict[str, int]):
+    """Adds each delta to its counter. Counters not yet materialized are left
+    alone; their first read computes them from scratch."""
+    for name, delta in deltas.items():
+        if delta:
+            StatCounter.objects.filter(name=name).update(value=F("value") + delta)
+
+
+def entry_state(entry: Entry) -> Optional[tuple]:
+    """Snapshots the fields that entry counters depend on, or None if any of
+    them were deferred when the entry was loaded."""
+    values = entry.__dict__
+    if any(field not in values for field in ENTRY_STATE_FIELDS):
+        return None
+    return tuple(values[field] for field in ENTRY_STATE_FIELDS)
+
+
+def _entry_contribution(state) -> Counter:
+    if not state:
+        return Counter()
+    created_by_id, is_locked, verification_status = state
+    contribution = Counter({TOTAL_ENTRIES: 1})
+    if created_by_id is not None:
+        contribution[user_entries_key(created_by_id)] += 1
+    if is_locked:
+        contribution[LOCKED_ENTRIES] += 1
+    if verification_status == "verified":
+        contribution[VERIFIED_ENTRIES] += 1
+    return contribution
+
+
+def entry_deltas(old_state, new_state) -> Dict[str, int]:
+    """Returns counter deltas for an entry moving from old_state to new_state;
+    either may be empty for a create or delete."""
+    deltas = dict(_entry_contribution(new_state))
+    for name, value in _entry_contribution(old_state).items():
+        deltas[name] = deltas.get(name, 0) - value
+    return deltas
+
+
+def reconcile() -> Dict[str, int]:
+    """Recomputes every counter from the source tables and returns them."""
+    counts = {name: count() for name, count in _GLOBAL_COUNTS.items()}
+    per_user = (
+        Entry.objects.filter(created_by__isnull=False)
+        .values_list("created_by_id")
+        .annotate(total=Count("id"))
+    )
+    for user_id, total in per_user:
+        counts[user_entries_key(user_id)] = total
+
+    with transaction.atomic():
+        StatCounter.objects.exclude(name__in=counts).delete()
+        existing = {row.name: row for row in StatCounter.objects.select_for_update()}
+        changed = []
+        for name, value in counts.items():
+            row = existing.get(name)
+            if row is None:
+                existing[name] = StatCounter(name=name, value=value)
+            elif row.value != value:
+                row.value = value
+                changed.append(row)
+        StatCounter.objects.bulk_update(changed, ["value"])
+        StatCounter.objects.bulk_create([row for row in existing.values() if row.pk is None])
+    return counts
@@ -1,8 +1,46 @@
-from django.test import Client, TestCase
+import bz2
+import csv
+import gzip
+import json
+import random
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
-from .models import AuditLog, Dispute, Entry, EntryRevision
+from . import (
+    archive,
+    auditlog,
+    autocomplete,
+    backup,
+    checks,
+    diffs,
+    history,
+    importer,
+    pagecache,
+    retention,
+    search,
+    stats,
+    trigram,
+    util,
+    views,
+)
+from .management.commands import import_entries
+from .models import AuditLog, Dispute, Entry, EntryResource, EntryRevision, StatCounter
 
 
 class EncyclopediaViewsTests(TestCase):
@@ -281,3 +319,1459 @@ class EncyclopediaViewsTests(TestCase):
         dispute.refresh_from_db()
         self.assertEqual(dispute.status, "resolved")
         self.assertTrue(AuditLog.objects.filter(action="dispute_resolved").exists())
+
+
+class RenderedContentTests(TestCase):
+    def test_save_entry_stores_rendered_html(self):
+        entry = util.save_entry("Rust", "# Rust\nA language")
+        self.assertIn("<h1>Rust</h1>", entry.content_html)
+        self.assertEqual(entry.renderer_version, util.RENDERER_VERSION)
+        self.assertEqual(entry.content_hash, util.hash_content(entry.content))
+
+        util.save_entry("rust", "# Rust\nUpdated")
+        entry.refresh_from_db()
+        self.assertIn("Updated", entry.content_html)
+
+    def test_entry_view_serves_stored_html(self):
+        entry = util.save_entry("Go", "# Go")
+        Entry.objects.filter(pk=entry.pk).update(content_html="<p>stored render</p>")
+        response = self.client.get(reverse("entry", kwargs={"title": "Go"}))
+        self.assertContains(response, "stored render")
+
+    def test_render_entries_backfills_stale_rows(self):
+        Entry.objects.create(title="Legacy", content="# Legacy")
+        call_command("render_entries", stdout=StringIO())
+        entry = Entry.objects.get(title="Legacy")
+        self.assertIn("<h1>Legacy</h1>", entry.content_html)
+        self.assertEqual(entry.renderer_version, util.RENDERER_VERSION)
+
+
+class TitleLookupTests(TestCase):
+    def test_title_normalized_kept_in_sync(self):
+        entry = Entry.objects.create(title="Straße", content="x")
+        self.assertEqual(entry.title_normalized, "strasse")
+
+        entry.title = "Graph Theory"
+        entry.save(update_fields=["title"])
+        entry.refresh_from_db()
+        self.assertEqual(entry.title_normalized, "graph theory")
+
+    def test_lookups_use_normalized_title(self):
+        Entry.objects.create(title="Haskell", content="# Haskell")
+        self.assertEqual(util.get_entry_obj("HASKELL").title, "Haskell")
+        self.assertEqual(util.get_entry("haskell"), "# Haskell")
+        self.assertTrue(util.delete_entry("hAsKeLl"))
+        self.assertIsNone(util.get_entry_obj("Haskell"))
+
+
+class SearchBackendTests(TestCase):
+    def setUp(self):
+        Entry.objects.create(title="Compilers", content="Parsing <b>tokens</b> into trees.")
+        Entry.objects.create(title="Parsing", content="Grammar theory.")
+        Entry.objects.create(title="Cooking", content="Nothing relevant here.")
+
+    def test_ranks_title_hits_first_and_highlights(self):
+        results = util.search_entries("parsing")
+        self.assertEqual(results.total, 2)
+        self.assertEqual(results.hits[0].title, "Parsing")
+        snippet = results.hits[1].snippet
+        self.assertIn("<mark>Parsing</mark>", snippet)
+        self.assertIn("&lt;b&gt;", snippet)
+
+    def test_results_are_paginated(self):
+        first = util.search_entries("parsing", page=1, per_page=1)
+        second = util.search_entries("parsing", page=2, per_page=1)
+        self.assertTrue(first.has_next)
+        self.assertFalse(second.has_next)
+        self.assertNotEqual(first.hits[0].title, second.hits[0].title)
+
+    def test_index_follows_saves_and_deletes(self):
+        util.save_entry("Cooking", "Parsing recipes.")
+        self.assertEqual(util.search_entries("recipes").total, 1)
+        util.delete_entry("Cooking")
+        self.assertEqual(util.search_entries("recipes").total, 0)
+
+    def test_python_fallback_backend(self):
+        backend = search.InvertedIndexBackend()
+        results = backend.search("pars")
+        self.assertEqual([hit.title for hit in results.hits], ["Parsing", "Compilers"])
+        self.assertIn("<mark>Parsing</mark>", results.hits[1].snippet)
+
+        entry = Entry.objects.get(title="Cooking")
+        backend.remove_entry(entry.pk)
+        self.assertEqual(backend.search("relevant").total, 0)
+
+    def test_python_fallback_reloads_other_workers_writes(self):
+        documents = [(1, "Parsing", "Grammars.")]
+        backend = search.InvertedIndexBackend(loader=lambda: list(documents), ttl=60)
+        self.assertEqual(backend.search("lexers").total, 0)
+        # Written by another worker, so no signal reaches this index.
+        documents.append((2, "Lexers", "Tokens."))
+        backend._built_at -= 120
+        self.assertEqual(backend.search("lexers").total, 0)
+        backend._refresh_thread.join(5)
+        self.assertEqual(backend.search("lexers").total, 1)
+
+
+class TitleSuggestionTests(TestCase):
+    def test_similar_titles_tolerate_typos(self):
+        index = trigram.TrigramIndex(loader=lambda: ["Python", "Pythagoras", "Django", "Ruby"])
+        self.assertEqual(index.similar("Pyhton", limit=1), ["Python"])
+        self.assertEqual(index.similar("zzzz"), [])
+
+        index.remove("Python")
+        self.assertNotIn("Python", index.similar("Pyhton"))
+        index.add("Python 3")
+        self.assertIn("Python 3", index.similar("pyton 3"))
+
+    def test_expired_index_rebuilds_in_background(self):
+        titles = ["Python", "Ruby"]
+        release = threading.Event()
+
+        def loader():
+            if index._built_at is not None:
+                release.wait(5)
+            return list(titles)
+
+        index = trigram.TrigramIndex(loader=loader, ttl=60)
+        self.assertEqual(index.similar("Pyhton", limit=1), ["Python"])
+        titles.remove("Python")
+        index._built_at -= 120
+        # The stale index keeps answering while the rebuild waits on the loader.
+        self.assertEqual(index.similar("Pyhton", limit=1), ["Python"])
+        rebuild = index._refresh_thread
+        index.add("Rubik")
+        release.set()
+        rebuild.join(5)
+        self.assertEqual(index.similar("Pyhton"), [])
+        self.assertCountEqual(index.similar("Rubyk"), ["Rubik", "Ruby"])
+
+    def test_rarest_trigrams_are_read_first(self):
+        titles = [f"Common Title {i}" for i in range(3000)] + ["Common Tidal Wave"]
+        index = trigram.TrigramIndex(loader=lambda: titles)
+        # Only the rarest trigram's postings are read, which are enough.
+        with mock.patch.object(trigram, "MAX_SCANNED_POSTINGS", 1):
+            self.assertEqual(index.similar("common tidal wav", limit=1), ["Common Tidal Wave"])
+
+    def test_search_page_shows_did_you_mean(self):
+        util.title_trigrams.clear()
+        Entry.objects.create(title="Photosynthesis", content="Plants.")
+        response = self.client.get(reverse("search"), {"q": "photosynthsis"})
+        self.assertContains(response, "Did you mean")
+        self.assertContains(response, "Photosynthesis")
+
+
+class AutocompleteTests(TestCase):
+    def test_prefix_index_completes_and_updates(self):
+        index = autocomplete.PrefixIndex(loader=lambda: ["Python", "pytest", "Pyramid", "Ruby"])
+        self.assertEqual(index.complete("PY"), ["Pyramid", "pytest", "Python"])
+        self.assertEqual(index.complete("py", limit=1), ["Pyramid"])
+
+        index.add("PyPy")
+        self.assertEqual(index.complete("pyp"), ["PyPy"])
+        index.remove("Pyramid")
+        self.assertEqual(index.complete("py"), ["PyPy", "pytest", "Python"])
+
+    def test_expired_index_rebuilds_in_background(self):
+        titles = ["Python"]
+        index = autocomplete.PrefixIndex(loader=lambda: list(titles), ttl=60)
+        self.assertEqual(index.complete("py"), ["Python"])
+        titles.append("Pyramid")
+        index._built_at -= 120
+        self.assertEqual(index.complete("py"), ["Python"])
+        index._refresh_thread.join(5)
+        self.assertEqual(index.complete("py"), ["Pyramid", "Python"])
+
+    def test_autocomplete_endpoint(self):
+        util.title_prefixes.clear()
+        Entry.objects.create(title="Quantum Field", content="x")
+        Entry.objects.create(title="Quartz", content="x")
+        response = self.client.get(reverse("autocomplete_titles"), {"q": "qua", "limit": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"results": ["Quantum Field"]})
+
+
+class LibraryIndexTests(TestCase):
+    def setUp(self):
+        for title in ["Alpha", "Apple", "Avocado", "Banana", "42"]:
+            Entry.objects.create(title=title, content="x")
+
+    def test_keyset_pages_cover_bucket_in_order(self):
+        first, cursor = util.list_entries_page(letter="A", per_page=2)
+        self.assertEqual(first, ["Alpha", "Apple"])
+        second, cursor = util.list_entries_page(letter="A", after=cursor, per_page=2)
+        self.assertEqual(second, ["Avocado"])
+        self.assertIsNone(cursor)
+        self.assertEqual(util.list_entries_page(letter=util.LIBRARY_OTHER)[0], ["42"])
+
+    def test_index_shows_count_and_recent_entries(self):
+        util.save_entry("Banana", "Updated")
+        response = self.client.get(reverse("index_letter", kwargs={"letter": "b"}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["entry_count"], 5)
+        self.assertEqual(response.context["entries"], ["Banana"])
+        self.assertEqual(response.context["recent_entries"][0], "Banana")
+
+    def test_entry_count_reads_shared_counter(self):
+        self.assertEqual(util.count_entries(), 5)
+        # A write from another process only shows up in the counter row.
+        StatCounter.objects.filter(name=stats.TOTAL_ENTRIES).update(value=6)
+        self.assertEqual(util.count_entries(), 6)
+
+    def test_locked_count_follows_locks_without_expiry(self):
+        self.assertEqual(util.count_locked_entries(), 0)
+        entry = Entry.objects.get(title="Alpha")
+        entry.is_locked = True
+        entry.save()
+        self.assertEqual(util.count_locked_entries(), 1)
+
+
+class RandomEntryTests(TestCase):
+    def test_random_entry_is_uniform_over_live_entries(self):
+        created = [Entry.objects.create(title=f"Page {i}", content="x") for i in range(20)]
+        # Leave gaps in the id range, including at both ends.
+        for entry in created[::3]:
+            entry.delete()
+        live = set(Entry.objects.values_list("title", flat=True))
+
+        rng = random.Random(1234)
+        draws = 3000
+        counts = Counter(util.random_entry_title(rng=rng) for _ in range(draws))
+        self.assertEqual(set(counts), live)
+
+        expected = draws / len(live)
+        chi_square = sum((counts[title] - expected) ** 2 / expected for title in live)
+        # Critical value of chi-square with 12 degrees of freedom at p = 0.001.
+        self.assertEqual(len(live), 13)
+        self.assertLess(chi_square, 32.909)
+
+    def test_random_redirects_or_404s(self):
+        self.assertEqual(self.client.get(reverse("rand")).status_code, 404)
+        Entry.objects.create(title="Only", content="x")
+        response = self.client.get(reverse("rand"))
+        self.assertRedirects(response, reverse("entry", kwargs={"title": "Only"}))
+
+
+class EntryPageQueryTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(username="owner", password="pass1234")
+        self.entry = Entry.objects.create(
+            title="Graphs",
+            content="# Graphs",
+            created_by=self.owner,
+            locked_by=self.owner,
+            verified_by=self.owner,
+            is_locked=True,
+            verification_status="verified",
+        )
+        for kind in ["journal", "source", "image", "source"]:
+            EntryResource.objects.create(
+                entry=self.entry, resource_type=kind, label=kind, url="https://example.com/"
+            )
+        Dispute.objects.create(entry=self.entry, message="Open", status="open")
+        Dispute.objects.create(entry=self.entry, message="Closed", status="resolved")
+
+    def test_loader_fetches_everything_in_two_queries(self):
+        with self.assertNumQueries(2):
+            entry = util.get_entry_page("graphs")
+            self.assertEqual(entry.verified_by.username, "owner")
+            self.assertEqual(entry.locked_by.username, "owner")
+            self.assertEqual(entry.created_by.username, "owner")
+            self.assertEqual(entry.open_disputes_count, 1)
+            self.assertEqual(len(entry.resources_by_type["source"]), 2)
+            self.assertEqual(len(entry.resources_by_type["journal"]), 1)
+        self.assertIsNone(util.get_entry_page("missing"))
+
+    def test_entry_view_stays_within_query_budget(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("entry", kwargs={"title": "Graphs"}))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Open disputes: 1")
+        self.assertContains(response, "Locked by owner")
+
+
+@override_settings(WIKI_PAGE_CACHE_TIMEOUT=0)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.entry = util.save_entry("Caching", "# Caching")
+        self.url = reverse("entry", kwargs={"title": "Caching"})
+
+    def test_entry_revalidates_with_etag_and_last_modified(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("no-cache", first["Cache-Control"])
+
+        with self.assertNumQueries(2):
+            cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached["ETag"], first["ETag"])
+        since = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(since.status_code, 304)
+
+        util.save_entry("Caching", "# Caching\nChanged")
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertContains(changed, "Changed")
+
+    def test_etag_depends_on_viewer_and_disputes(self):
+        anonymous = self.client.get(self.url)["ETag"]
+        User = get_user_model()
+        User.objects.create_user(username="reader", password="pass1234")
+        self.client.login(username="reader", password="pass1234")
+        signed_in = self.client.get(self.url)
+        self.assertNotEqual(signed_in["ETag"], anonymous)
+        self.assertIn("private", signed_in["Cache-Control"])
+
+        Dispute.objects.create(entry=self.entry, message="Check this", status="open")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=signed_in["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+    def test_resource_only_edit_changes_etag(self):
+        first = self.client.get(self.url)
+        get_user_model().objects.create_user(username="editor", password="pass1234")
+        editor = Client()
+        editor.login(username="editor", password="pass1234")
+        editor.post(
+            reverse("save_edit", kwargs={"title": "Caching"}),
+            {"content": "# Caching", "source_links": "Docs | https://docs.example"},
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "https://docs.example")
+
+    def test_preview_revalidates_on_text_hash(self):
+        url = reverse("preview_markdown")
+        first = self.client.get(url, {"text": "# Hi"})
+        cached = self.client.get(url, {"text": "# Hi"}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        other = self.client.get(url, {"text": "# Bye"}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(other.status_code, 200)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        # Drop counts earlier tests left pending in this process.
+        pagecache.flush_stats()
+        cache.clear()
+        User = get_user_model()
+        self.moderator = User.objects.create_superuser(
+            username="mod", password="pass1234", email="mod@example.com"
+        )
+        self.entry = util.save_entry("Physics", "# Physics", creator=self.moderator)
+        util.save_entry("Chemistry", "# Chemistry")
+        self.url = reverse("entry", kwargs={"title": "Physics"})
+
+    def test_anonymous_pages_are_cached_until_their_entry_changes(self):
+        self.assertEqual(self.client.get(self.url)["X-Page-Cache"], "miss")
+        other = reverse("entry", kwargs={"title": "Chemistry"})
+        self.client.get(other)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url)["X-Page-Cache"], "hit")
+        self.assertEqual(pagecache.stats(), {"hits": 1, "misses": 2})
+
+        util.save_entry("Physics", "# Physics\nRelativity")
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "Relativity")
+        self.assertEqual(self.client.get(other)["X-Page-Cache"], "hit")
+
+
+    @override_settings(WIKI_PAGE_CACHE_STATS_INTERVAL=60)
+    def test_hit_counts_reach_the_cache_once_per_interval(self):
+        self.client.get(self.url)
+        with mock.patch.object(pagecache.cache, "incr") as incr:
+            for _ in range(3):
+                self.assertEqual(self.client.get(self.url)["X-Page-Cache"], "hit")
+        incr.assert_not_called()
+        self.assertIsNone(cache.get(pagecache.HITS_KEY))
+        self.assertEqual(pagecache.stats(), {"hits": 3, "misses": 1})
+
+        later = time.monotonic() + 61
+        with mock.patch.object(pagecache.time, "monotonic", return_value=later):
+            self.client.get(self.url)
+        shared = cache.get_many([pagecache.HITS_KEY, pagecache.MISSES_KEY])
+        self.assertEqual(shared, {pagecache.HITS_KEY: 4, pagecache.MISSES_KEY: 1})
+        self.assertEqual(pagecache.stats(), {"hits": 4, "misses": 1})
+    def test_moderation_purges_entry_and_listings(self):
+        index = reverse("index")
+        self.client.get(self.url)
+        self.client.get(index)
+        self.client.login(username="mod", password="pass1234")
+        self.client.post(reverse("toggle_lock", kwargs={"title": "Physics"}))
+        self.client.post(
+            reverse("set_verification_status", kwargs={"title": "Physics"}),
+            {"verification_status": "verified"},
+        )
+        self.client.logout()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "Locked")
+        self.assertEqual(self.client.get(index)["X-Page-Cache"], "miss")
+
+    def test_signed_in_pages_are_never_cached_or_served_from_cache(self):
+        self.client.get(self.url)
+        self.client.login(username="mod", password="pass1234")
+        response = self.client.get(self.url)
+        self.assertNotIn("X-Page-Cache", response)
+        self.assertContains(response, "csrfmiddlewaretoken")
+        self.client.logout()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertNotContains(response, "csrfmiddlewaretoken")
+        self.assertNotContains(response, "auth-user")
+
+    def test_deploy_check_flags_per_process_cache(self):
+        with override_settings(WIKI_PAGE_CACHE_TIMEOUT=300):
+            self.assertEqual(
+                [warning.id for warning in checks.check_shared_cache(None)],
+                ["encyclopedia.W001"],
+            )
+        with override_settings(WIKI_PAGE_CACHE_TIMEOUT=0):
+            self.assertEqual(checks.check_shared_cache(None), [])
+
+
+class StaticExportTests(TestCase):
+    def test_export_is_anonymous_and_incremental(self):
+        util.save_entry("Optics", "# Optics", creator=get_user_model().objects.create_user("u"))
+        util.save_entry("Waves", "# Waves")
+        with tempfile.TemporaryDirectory() as output:
+            out = StringIO()
+            call_command("export_static", output=output, workers=1, stdout=out)
+            self.assertIn("Rendered: 2", out.getvalue())
+            page = Path(output, "wiki", "Optics", "index.html").read_text(encoding="utf-8")
+            self.assertIn("<h1>Optics</h1>", page)
+            self.assertNotIn("csrfmiddlewaretoken", page)
+            self.assertIn("Waves", Path(output, "library", "W", "index.html").read_text())
+
+            util.save_entry("Waves", "# Waves\nInterference")
+            util.delete_entry("Optics")
+            out = StringIO()
+            call_command("export_static", output=output, workers=1, stdout=out)
+            self.assertIn("Rendered: 1, Removed: 1", out.getvalue())
+            self.assertFalse(Path(output, "wiki", "Optics").exists())
+            self.assertIn(
+                "Interference",
+                Path(output, "wiki", "Waves", "index.html").read_text(encoding="utf-8"),
+            )
+
+
+class DashboardStatsTests(TestCase):
+    NAMES = [
+        stats.TOTAL_ENTRIES,
+        stats.LOCKED_ENTRIES,
+        stats.VERIFIED_ENTRIES,
+        stats.REVISIONS,
+        stats.OPEN_DISPUTES,
+    ]
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="writer", password="pass1234")
+        self.key = stats.user_entries_key(self.user.id)
+
+    def counts(self):
+        return stats.get_counts([*self.NAMES, self.key])
+
+    def test_counters_follow_writes_and_reconcile(self):
+        self.counts()
+        entry = util.save_entry("Algebra", "x", creator=self.user)
+        entry.is_locked = True
+        entry.verification_status = "verified"
+        entry.save()
+        EntryRevision.objects.create(entry=entry, content="old")
+        dispute = Dispute.objects.create(entry=entry, message="?", status="open")
+        self.assertEqual(self.counts(), {name: 1 for name in [*self.NAMES, self.key]})
+
+        dispute.status = "resolved"
+        dispute.save()
+        self.assertEqual(self.counts()[stats.OPEN_DISPUTES], 0)
+        Dispute.objects.create(entry=entry, message="again", status="open")
+        entry.delete()
+        self.assertEqual(self.counts(), {name: 0 for name in [*self.NAMES, self.key]})
+
+        # Queryset updates bypass signals; reconcile repairs the drift.
+        Entry.objects.create(title="Drift", content="x")
+        StatCounter.objects.filter(name=stats.TOTAL_ENTRIES).update(value=42)
+        call_command("reconcile_stats", stdout=StringIO())
+        self.assertEqual(self.counts()[stats.TOTAL_ENTRIES], 1)
+
+    def test_dashboard_query_count_is_independent_of_data_size(self):
+        self.client.login(username="writer", password="pass1234")
+        self.client.get(reverse("dashboard"))
+        with self.assertNumQueries(5) as small:
+            self.client.get(reverse("dashboard"))
+        for i in range(20):
+            entry = util.save_entry(f"Topic {i}", "x", creator=self.user)
+            EntryRevision.objects.create(entry=entry, content="old")
+        with self.assertNumQueries(len(small.captured_queries)):
+            response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.context["your_entries_count"], 20)
+        self.assertEqual(response.context["revision_count"], 20)
+
+
+@override_settings(WIKI_AUDIT_MODE="batched", WIKI_AUDIT_BATCH_SIZE=3)
+class BatchedAuditLogTests(TestCase):
+    def setUp(self):
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        self.spool = Path(spool_dir.name, "audit_spool.jsonl")
+        spool_setting = self.settings(WIKI_AUDIT_SPOOL_PATH=str(self.spool))
+        spool_setting.enable()
+        self.addCleanup(spool_setting.disable)
+        self.writer = auditlog.AuditWriter(flush_timer=False)
+        self.entry = Entry.objects.create(title="Audit", content="x")
+
+    def test_records_are_queued_until_a_threshold(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.writer.record("edit", self.entry, details="one")
+            self.writer.record("edit", self.entry, details="two")
+        self.assertEqual(AuditLog.objects.count(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.writer.record("edit", self.entry, details="three")
+            # Written once the recording transaction commits.
+            self.assertEqual(AuditLog.objects.count(), 0)
+        self.assertEqual(AuditLog.objects.count(), 3)
+
+    def test_timer_flushes_old_records_in_one_statement(self):
+        user = get_user_model().objects.create_user(username="gone", password="pass1234")
+        self.writer.record("edit", self.entry, user, details="one")
+        self.writer.record("edit", self.entry, details="two")
+        self.writer.tick()
+        self.assertEqual(AuditLog.objects.count(), 0)
+        user.delete()
+        self.writer._oldest -= 10
+        # Missing actors and entries resolve to NULL inside the INSERT itself.
+        with self.assertNumQueries(1):
+            self.writer.tick()
+        self.assertEqual(
+            list(AuditLog.objects.order_by("id").values_list("details", "entry_id", "actor_id")),
+            [("one", self.entry.pk, None), ("two", self.entry.pk, None)],
+        )
+
+    def test_failed_flush_spools_and_is_replayed(self):
+        self.writer.record("edit", self.entry, details="lost?")
+        with mock.patch.object(auditlog, "_insert", side_effect=RuntimeError):
+            with self.assertLogs("encyclopedia.auditlog", "ERROR"):
+                self.assertEqual(self.writer.flush(), 0)
+        self.assertTrue(self.spool.exists())
+        self.entry.delete()
+
+        restarted = auditlog.AuditWriter(flush_timer=False)
+        self.assertEqual(restarted.flush(), 1)
+        log = AuditLog.objects.get()
+        self.assertEqual((log.details, log.entry_id), ("lost?", None))
+        self.assertFalse(self.spool.exists())
+
+    def test_spool_is_retried_after_a_later_successful_flush(self):
+        self.writer.flush()
+        self.writer.record("edit", self.entry, details="spooled")
+        with mock.patch.object(auditlog, "_insert", side_effect=RuntimeError):
+            with self.assertLogs("encyclopedia.auditlog", "ERROR"):
+                self.writer.flush()
+        self.writer.record("edit", self.entry, details="later")
+        self.assertEqual(self.writer.flush(), 2)
+        self.assertCountEqual(
+            AuditLog.objects.values_list("details", flat=True), ["spooled", "later"]
+        )
+        self.assertFalse(self.spool.exists())
+
+    def test_requests_do_not_flush_the_queue(self):
+        User = get_user_model()
+        User.objects.create_superuser(username="boss", password="pass1234", email="b@example.com")
+        self.client.login(username="boss", password="pass1234")
+        with mock.patch.object(auditlog, "writer", self.writer):
+            self.client.post(reverse("toggle_lock", kwargs={"title": "Audit"}))
+        self.assertFalse(AuditLog.objects.exists())
+        self.writer.flush()
+        self.assertTrue(AuditLog.objects.filter(action="lock", entry_title="Audit").exists())
+
+
+class ModerationPaginationTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(
+            username="admin", password="pass1234", email="admin@example.com"
+        )
+        self.alice = User.objects.create_user(username="alice", password="pass1234")
+        self.entry = Entry.objects.create(title="Logs", content="x")
+        other = Entry.objects.create(title="Other", content="x")
+        stamp = timezone.now()
+        # Identical timestamps force the id tie-breaker.
+        for i in range(7):
+            AuditLog.objects.create(
+                action="edit" if i % 2 else "lock",
+                entry=self.entry if i < 5 else other,
+                entry_title="Logs" if i < 5 else "Other",
+                actor=self.alice if i % 3 == 0 else None,
+                details=str(i),
+                created_at=stamp,
+            )
+
+    def test_keyset_pages_are_disjoint_and_complete(self):
+        seen = []
+        logs, cursor = util.audit_log_page(per_page=3)
+        seen += logs
+        while cursor:
+            logs, cursor = util.audit_log_page(after=cursor, per_page=3)
+            seen += logs
+        self.assertEqual([log.details for log in seen], [str(i) for i in reversed(range(7))])
+
+        self.assertEqual(util.audit_log_page(actor="alice")[0][-1].details, "0")
+        self.assertEqual(len(util.audit_log_page(action="edit", entry="logs")[0]), 2)
+        self.assertEqual(util.audit_log_page(actor="nobody")[0], [])
+        self.assertEqual(len(util.audit_log_page(after="garbage")[0]), 7)
+
+    def test_views_filter_and_link_next_page(self):
+        for i in range(3):
+            Dispute.objects.create(entry=self.entry, message=f"d{i}", status="open")
+        Dispute.objects.create(entry=self.entry, message="done", status="resolved")
+        self.client.login(username="admin", password="pass1234")
+
+        response = self.client.get(reverse("disputes_queue"), {"status": "open"})
+        self.assertEqual(len(response.context["disputes"]), 3)
+        self.assertNotContains(response, "done")
+
+        response = self.client.get(reverse("audit_logs"), {"actor": "alice"})
+        self.assertEqual(len(response.context["logs"]), 3)
+        self.assertIsNone(response.context["next_query"])
+
+
+class AuditArchiveTests(TestCase):
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.root = Path(archive_dir.name)
+        archive_setting = self.settings(WIKI_AUDIT_ARCHIVE_DIR=archive_dir.name)
+        archive_setting.enable()
+        self.addCleanup(archive_setting.disable)
+
+        now = timezone.now()
+        for days_ago in [400, 400, 399, 10]:
+            AuditLog.objects.create(
+                action="edit",
+                entry_title=f"Page {days_ago}",
+                details="old" if days_ago > 30 else "new",
+                created_at=now - timedelta(days=days_ago),
+            )
+        self.old_day = (now - timedelta(days=400)).astimezone(dt_timezone.utc).date()
+
+    def test_archive_moves_old_rows_in_chunks(self):
+        out = StringIO()
+        call_command("archive_audit_logs", days=30, chunk_size=2, stdout=out)
+        self.assertIn("Moved: 3", out.getvalue())
+        self.assertEqual(list(AuditLog.objects.values_list("details", flat=True)), ["new"])
+        self.assertEqual(len(list(self.root.glob("*/*/*/audit-*.jsonl.gz"))), 2)
+
+        records = list(archive.iter_archived(self.old_day, self.old_day + timedelta(days=1)))
+        titles = [record["entry_title"] for record in records]
+        self.assertEqual(titles, ["Page 400", "Page 400", "Page 399"])
+        self.assertEqual(
+            len(list(archive.iter_archived(self.old_day, self.old_day, entry_title="page 400"))), 2
+        )
+
+    def test_archive_download_streams_range(self):
+        call_command("archive_audit_logs", days=30, stdout=StringIO())
+        get_user_model().objects.create_superuser(
+            username="root", password="pass1234", email="root@example.com"
+        )
+        self.client.login(username="root", password="pass1234")
+        response = self.client.get(reverse("audit_archive"), {"from": self.old_day.isoformat()})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(self.client.get(reverse("audit_archive")).status_code, 400)
+        for bad in ("2024-02-30", "yesterday"):
+            response = self.client.get(reverse("audit_archive"), {"from": bad})
+            self.assertEqual(response.status_code, 400)
+        too_long = {"from": "2024-01-01", "to": "2024-03-01"}
+        self.assertEqual(self.client.get(reverse("audit_archive"), too_long).status_code, 400)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(
+            username="exporter", password="pass1234", email="exporter@example.com"
+        )
+        entry = Entry.objects.create(
+            title="Export", content="line one\nline, two", created_by=self.admin
+        )
+        EntryResource.objects.create(
+            entry=entry, resource_type="source", label="Doc", url="https://example.com/"
+        )
+        now = timezone.now()
+        AuditLog.objects.create(
+            action="edit", entry_title="Export", created_at=now - timedelta(days=3)
+        )
+        AuditLog.objects.create(
+            action="lock", entry_title="Export", actor=self.admin, created_at=now
+        )
+
+    def read(self, name, params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_exports_are_superuser_only(self):
+        self.assertEqual(self.client.get(reverse("export_entries")).status_code, 302)
+        get_user_model().objects.create_user(username="member", password="pass1234")
+        self.client.login(username="member", password="pass1234")
+        self.assertEqual(self.client.get(reverse("export_audit_logs")).status_code, 403)
+
+    def test_audit_export_filters_by_date_and_action(self):
+        self.client.login(username="exporter", password="pass1234")
+        today = timezone.localdate().isoformat()
+        lines = self.read("export_audit_logs", {"from": today}).splitlines()
+        self.assertEqual([json.loads(line)["action"] for line in lines], ["lock"])
+        self.assertEqual(json.loads(lines[0])["actor"], "exporter")
+
+        export = self.read("export_audit_logs", {"format": "csv", "action": "edit"})
+        rows = list(csv.DictReader(StringIO(export)))
+        self.assertEqual([row["action"] for row in rows], ["edit"])
+
+        for bad in ("2024-02-30", "yesterday"):
+            response = self.client.get(reverse("export_audit_logs"), {"to": bad})
+            self.assertEqual(response.status_code, 400)
+
+    def test_entry_export_includes_resources(self):
+        self.client.login(username="exporter", password="pass1234")
+        record = json.loads(self.read("export_entries", {}))
+        self.assertEqual(
+            record["resources"], [{"type": "source", "label": "Doc", "url": "https://example.com/"}]
+        )
+
+        rows = list(csv.DictReader(StringIO(self.read("export_entries", {"format": "csv"}))))
+        self.assertEqual(rows[0]["content"], "line one\nline, two")
+        self.assertEqual(json.loads(rows[0]["resources"])[0]["label"], "Doc")
+
+    @override_settings(WIKI_EXPORT_MAX_HTTP_ROWS=1)
+    def test_large_exports_are_written_by_command(self):
+        self.client.login(username="exporter", password="pass1234")
+        response = self.client.get(reverse("export_audit_logs"))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("export_records", response.content.decode())
+        self.read("export_entries", {})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "audit.csv.gz"
+            call_command("export_records", "audit-logs", str(path), format="csv", stdout=StringIO())
+            with gzip.open(path, "rt", encoding="utf-8") as export:
+                rows = list(csv.DictReader(export))
+            self.assertEqual([row["action"] for row in rows], ["edit", "lock"])
+            self.assertEqual(list(Path(tmp).iterdir()), [path])
+
+
+@override_settings(WIKI_REVISION_KEYFRAME_INTERVAL=4)
+class RevisionStorageTests(TestCase):
+    def setUp(self):
+        self.entry = Entry.objects.create(title="History", content="Current text")
+        self.versions = []
+        body = [f"Paragraph {i}\n" for i in range(40)]
+        for i in range(10):
+            body[i * 3] = f"Edited paragraph {i}\n"
+            self.versions.append("".join(body))
+            history.record_revision(self.entry, self.versions[-1], edit_summary=str(i))
+
+    def test_old_revisions_are_deltas_with_keyframes(self):
+        rows = list(self.entry.revisions.order_by("id"))
+        self.assertEqual([row.seq for row in rows], list(range(1, 11)))
+        self.assertEqual(
+            [row.is_delta for row in rows],
+            [True, True, True, False, True, True, True, False, True, False],
+        )
+        self.assertTrue(all(row.content == "" for row in rows if row.is_delta))
+        for row, expected in zip(rows, self.versions):
+            self.assertEqual(history.revision_content(row), expected)
+
+    def test_reconstruction_reads_at_most_one_keyframe_span(self):
+        oldest = self.entry.revisions.order_by("id").first()
+        with mock.patch.object(history, "apply_delta", wraps=history.apply_delta) as apply:
+            with self.assertNumQueries(1):
+                self.assertEqual(history.revision_content(oldest), self.versions[0])
+        self.assertEqual(apply.call_count, 3)
+
+    def test_reencode_command_converts_full_rows(self):
+        EntryRevision.objects.filter(entry=self.entry).update(seq=0)
+        for row, text in zip(self.entry.revisions.order_by("id"), self.versions):
+            EntryRevision.objects.filter(pk=row.pk).update(is_delta=False, delta="", content=text)
+
+        out = StringIO()
+        call_command("reencode_revisions", stdout=out)
+        self.assertIn("Revisions: 10", out.getvalue())
+        rows = list(self.entry.revisions.order_by("id"))
+        self.assertEqual(sum(row.is_delta for row in rows), 7)
+        self.assertEqual([history.revision_content(row) for row in rows], self.versions)
+
+    def test_rollback_restores_delta_revision(self):
+        user = get_user_model().objects.create_superuser(
+            username="roller", password="pass1234", email="roller@example.com"
+        )
+        self.client.login(username="roller", password="pass1234")
+        oldest = self.entry.revisions.order_by("id").first()
+        self.client.post(
+            reverse("rollback_revision", kwargs={"title": "History", "revision_id": oldest.id})
+        )
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.content, self.versions[0])
+        snapshot = self.entry.revisions.order_by("-id").first()
+        self.assertEqual(snapshot.edited_by, user)
+        self.assertEqual(history.revision_content(snapshot), "Current text")
+
+
+class RevisionDiffTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.entry = Entry.objects.create(title="Diffed", content="alpha\nbeta gamma\ndelta\n")
+        history.record_revision(self.entry, "alpha\nbeta\ndelta\n")
+        history.record_revision(self.entry, "alpha\nbeta <b>gamma</b>\ndelta\nepsilon\n")
+        self.first, self.second = self.entry.revisions.order_by("id")
+        get_user_model().objects.create_user(username="reader", password="pass1234")
+        self.client.login(username="reader", password="pass1234")
+
+    def test_line_and_word_changes(self):
+        diff = diffs.compute_diff("alpha\nbeta\ndelta\n", "alpha\nbeta gamma\ndelta\nomega\n")
+        rows = [row for hunk in diff["hunks"] for row in hunk]
+        self.assertEqual((diff["added"], diff["removed"]), (2, 1))
+        self.assertIn({"kind": "insert", "old_no": None, "new_no": 4, "html": "omega"}, rows)
+        inserted = next(row for row in rows if row["kind"] == "insert" and row["new_no"] == 2)
+        self.assertEqual(inserted["html"], "beta<ins> gamma</ins>")
+
+    def test_large_documents_only_match_changed_middle(self):
+        old = "".join(f"line {i}\n" for i in range(50000))
+        new = old.replace("line 25000\n", "line 25000 changed\n")
+        matcher_class = diffs.difflib.SequenceMatcher
+        with mock.patch.object(diffs.difflib, "SequenceMatcher", wraps=matcher_class) as matcher:
+            diff = diffs.compute_diff(old, new)
+        self.assertEqual(len(matcher.call_args_list[0].args[1]), 1)
+        self.assertEqual(len(diff["hunks"]), 1)
+        self.assertEqual(len(diff["hunks"][0]), 2 + 2 * diffs.CONTEXT_LINES)
+
+    @override_settings(WIKI_DIFF_MAX_LINES=10)
+    def test_output_is_capped(self):
+        old = "".join(f"old {i}\n" for i in range(100))
+        new = "".join(f"new {i}\n" for i in range(100))
+        diff = diffs.compute_diff(old, new)
+        self.assertTrue(diff["truncated"])
+        self.assertEqual(sum(len(hunk) for hunk in diff["hunks"]), 10)
+
+    @override_settings(WIKI_DIFF_MAX_LINES=10)
+    def test_oversized_regions_skip_word_diffs(self):
+        old = "".join(f"old {i}\n" for i in range(5000))
+        new = "".join(f"new {i}\n" for i in range(5000))
+        with mock.patch.object(diffs, "_word_diff") as word_diff:
+            diff = diffs.compute_diff(old, new)
+        word_diff.assert_not_called()
+        self.assertEqual((diff["added"], diff["removed"]), (5000, 5000))
+
+    def test_each_side_rebuilt_from_its_own_span(self):
+        for i in range(40):
+            history.record_revision(self.entry, f"filler {i}\n")
+        last = self.entry.revisions.order_by("-id").first()
+        with mock.patch.object(
+            history, "revision_contents", wraps=history.revision_contents
+        ) as contents:
+            diffs.revision_diff(self.entry, self.first.id, last.id)
+        self.assertEqual(
+            [call.args for call in contents.call_args_list],
+            [(self.entry.pk, [self.first.id]), (self.entry.pk, [last.id])],
+        )
+
+    def test_view_escapes_and_caches(self):
+        url = reverse("revision_diff", kwargs={"title": "Diffed"})
+        params = {"from": self.first.id, "to": self.second.id}
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "beta<ins> &lt;b&gt;gamma&lt;/b&gt;</ins>", html=False)
+
+        with mock.patch.object(diffs, "compute_diff") as compute:
+            self.client.get(url, params)
+        compute.assert_not_called()
+
+    def test_current_content_diff_follows_edits(self):
+        url = reverse("revision_diff", kwargs={"title": "Diffed"})
+        response = self.client.get(url, {"from": self.first.id, "to": "current"})
+        self.assertContains(response, "beta<ins> gamma</ins>", html=False)
+
+        self.entry.content = "alpha\nbeta\ndelta\nzeta\n"
+        self.entry.save()
+        response = self.client.get(url, {"from": self.first.id, "to": "current"})
+        self.assertContains(response, "zeta")
+
+    def test_rejects_revisions_of_other_entries(self):
+        other = Entry.objects.create(title="Other", content="x")
+        history.record_revision(other, "y")
+        url = reverse("revision_diff", kwargs={"title": "Diffed"})
+        response = self.client.get(url, {"from": other.revisions.get().id})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(url, {"from": "abc"})
+        self.assertEqual(response.status_code, 404)
+
+
+class RevisionListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.entry = Entry.objects.create(title="Busy", content="start")
+        for i in range(55):
+            history.record_revision(self.entry, f"version {i}\n" * 50, edit_summary=f"edit {i}")
+        get_user_model().objects.create_user(username="reader", password="pass1234")
+        self.client.login(username="reader", password="pass1234")
+
+    def test_page_defers_text(self):
+        revisions, next_cursor = util.revision_page(self.entry.pk)
+        self.assertEqual(len(revisions), 50)
+        self.assertIsNotNone(next_cursor)
+        self.assertEqual({"content", "delta"}, revisions[0].get_deferred_fields())
+
+    def test_keyset_pages_cover_every_revision(self):
+        url = reverse("revisions", kwargs={"title": "Busy"})
+        first = self.client.get(url)
+        self.assertContains(first, "has 55 snapshots")
+        self.assertEqual(len(first.context["revisions"]), 50)
+        second = self.client.get(f"{url}?{first.context['next_query']}")
+        self.assertEqual(len(second.context["revisions"]), 5)
+        self.assertIsNone(second.context["next_query"])
+        seen = [r.id for r in [*first.context["revisions"], *second.context["revisions"]]]
+        self.assertEqual(sorted(seen), sorted(self.entry.revisions.values_list("id", flat=True)))
+
+    def test_revision_count_is_cached_and_invalidated(self):
+        self.assertEqual(util.count_revisions(self.entry.pk), 55)
+        with self.assertNumQueries(0):
+            self.assertEqual(util.count_revisions(self.entry.pk), 55)
+        with mock.patch.object(util.cache, "set") as cache_set:
+            cache.delete(util.revision_count_key(self.entry.pk))
+            util.count_revisions(self.entry.pk)
+        self.assertEqual(cache_set.call_args.args[2], util.REVISION_COUNT_TIMEOUT)
+        history.record_revision(self.entry, "newest")
+        self.assertEqual(util.count_revisions(self.entry.pk), 56)
+        self.entry.revisions.order_by("id").first().delete()
+        self.assertEqual(util.count_revisions(self.entry.pk), 55)
+
+    def test_changes_from_previous_link(self):
+        newest, older = self.entry.revisions.order_by("-id")[:2]
+        url = reverse("revision_diff", kwargs={"title": "Busy"})
+        response = self.client.get(url, {"to": newest.id})
+        self.assertEqual(response.context["from_id"], older.id)
+        self.assertContains(response, "version <ins>54</ins>", html=False)
+
+
+@override_settings(WIKI_REVISION_KEEP_LAST=3, WIKI_REVISION_KEEP_DAYS=5)
+class RevisionRetentionTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now().replace(hour=12)
+        self.entry = Entry.objects.create(title="Stormy", content="final")
+        self.texts = {}
+        # Four edits a day for the last 10 days, plus two in each of three
+        # older months.
+        stamps = [
+            self.now - timedelta(days=day, hours=hour) for day in range(10) for hour in range(4)
+        ]
+        stamps += [
+            self.now - timedelta(days=40 + 30 * month, hours=hour)
+            for month in range(3)
+            for hour in range(2)
+        ]
+        for index, stamp in enumerate(sorted(stamps)):
+            text = "".join(f"line {line}\n" for line in range(30)) + f"edit {index}\n"
+            revision = history.record_revision(self.entry, text)
+            EntryRevision.objects.filter(pk=revision.pk).update(created_at=stamp)
+            self.texts[revision.pk] = text
+
+    def expected_keep(self):
+        stamps = list(
+            self.entry.revisions.order_by("-created_at", "-id").values_list("id", "created_at")
+        )
+        return retention.revisions_to_keep(stamps, self.now)
+
+    def test_policy_keeps_last_daily_and_monthly(self):
+        now = datetime(2026, 6, 20, 12, tzinfo=dt_timezone.utc)
+        stamps = [
+            (10, now - timedelta(hours=1)),
+            (9, now - timedelta(hours=2)),
+            (8, now - timedelta(hours=3)),
+            (7, now - timedelta(hours=4)),
+            (6, now - timedelta(days=2)),
+            (5, now - timedelta(days=2, hours=1)),
+            (4, now - timedelta(days=8)),
+            (3, now - timedelta(days=9)),
+            (2, now - timedelta(days=60)),
+            (1, now - timedelta(days=61)),
+        ]
+        # The newest three, the newest of 2026-06-18 (inside the five-day
+        # window) and the newest of April; June's newest is id 10.
+        self.assertEqual(retention.revisions_to_keep(stamps, now), {10, 9, 8, 6, 2})
+
+    def test_prune_keeps_readable_chain(self):
+        keep = self.expected_keep()
+        before = self.entry.revisions.count()
+        prune_spans = retention._prune_spans
+        commits = []
+
+        def checked_prune_spans(*args):
+            # Each batch commits on its own, so the chain must be readable
+            # after every one of them.
+            result = prune_spans(*args)
+            for row in self.entry.revisions.all():
+                self.assertEqual(history.revision_content(row), self.texts[row.id])
+            commits.append(result[2])
+            return result
+
+        with mock.patch.object(stats, "apply", wraps=stats.apply) as apply, mock.patch.object(
+            retention, "_prune_spans", side_effect=checked_prune_spans
+        ):
+            deleted, reclaimed = retention.prune_entry(self.entry.pk, now=self.now, batch_size=7)
+        self.assertEqual(deleted, before - len(keep))
+        self.assertGreater(len(commits), 2)
+        # One counter update per batch that deleted rows, not per row.
+        self.assertEqual(apply.call_count, len([removed for removed in commits if removed]))
+        self.assertGreater(reclaimed, 0)
+        rows = list(self.entry.revisions.order_by("id"))
+        self.assertEqual({row.id for row in rows}, keep)
+        self.assertEqual([row.seq for row in rows], list(range(1, len(rows) + 1)))
+        for row in rows:
+            self.assertEqual(history.revision_content(row), self.texts[row.id])
+        self.assertEqual(util.count_revisions(self.entry.pk), len(keep))
+
+    def test_stored_bytes_counts_encoded_bytes(self):
+        entry = Entry.objects.create(title="Bytes", content="x")
+        EntryRevision.objects.create(entry=entry, content="caf\u00e9\n", delta='["a\\\\n"]')
+        self.assertEqual(retention.stored_bytes(entry.revisions.all()), 6 + 8)
+
+    def test_command_reports_and_dry_run_changes_nothing(self):
+        before = self.entry.revisions.count()
+        self.assertEqual(stats.get_counts([stats.REVISIONS])[stats.REVISIONS], before)
+        out = StringIO()
+        call_command("prune_revisions", "--dry-run", stdout=out)
+        self.assertIn("Dry run. Entries: 1", out.getvalue())
+        self.assertEqual(self.entry.revisions.count(), before)
+
+        out = StringIO()
+        call_command("prune_revisions", stdout=out)
+        self.assertIn("Prune complete. Entries: 1", out.getvalue())
+        self.assertLess(self.entry.revisions.count(), before)
+        counts = stats.get_counts([stats.REVISIONS])
+        self.assertEqual(counts[stats.REVISIONS], self.entry.revisions.count())
+
+
+class EditConcurrencyTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="editor", password="pass1234")
+        self.entry = Entry.objects.create(title="Shared", content="original", created_by=self.user)
+        self.client.login(username="editor", password="pass1234")
+        self.url = reverse("save_edit", kwargs={"title": "Shared"})
+
+    def test_edit_form_carries_version(self):
+        response = self.client.get(reverse("edit", kwargs={"title": "Shared"}))
+        self.assertContains(response, 'name="version" value="1"')
+
+    def test_content_saves_bump_version(self):
+        self.client.post(self.url, {"content": "first", "version": "1"})
+        self.entry.refresh_from_db()
+        self.assertEqual((self.entry.content, self.entry.version), ("first", 2))
+        self.entry.is_locked = False
+        self.entry.save(update_fields=["is_locked"])
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.version, 2)
+
+    def test_stale_save_gets_conflict(self):
+        self.client.post(self.url, {"content": "winner", "version": "1"})
+        response = self.client.post(self.url, {"content": "loser", "version": "1"})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.context["conflict_content"], "winner")
+        self.assertEqual(response.context["content"], "loser")
+        self.assertEqual(response.context["version"], 2)
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.content, "winner")
+        self.assertEqual(self.entry.revisions.count(), 1)
+
+        response = self.client.post(self.url, {"content": "loser", "version": "2"})
+        self.assertEqual(response.status_code, 302)
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.content, "loser")
+
+    def test_edit_query_budget(self):
+        body = "".join(f"line {number}\n" for number in range(40))
+        Entry.objects.filter(pk=self.entry.pk).update(content=body)
+        self.client.get(reverse("edit", kwargs={"title": "Shared"}))
+        # Session and user, then in one transaction: the entry read and locked
+        # with its revision head, revision insert and counter, resource read
+        # and insert, one entry update, two FTS writes, the audit insert and
+        # the transaction's own savepoint pair.
+        with self.assertNumQueries(13):
+            response = self.client.post(
+                self.url,
+                {"content": body + "one", "version": "1", "journal_links": "https://a.example"},
+            )
+        self.assertEqual(response.status_code, 302)
+        # The previous head is re-encoded as a delta: one more update, and no
+        # resource insert this time.
+        with self.assertNumQueries(13):
+            self.client.post(
+                self.url,
+                {"content": body + "two", "version": "2", "journal_links": "https://a.example"},
+            )
+        first, second = self.entry.revisions.order_by("id")
+        self.assertTrue(first.is_delta)
+        self.assertEqual(
+            [history.revision_content(first), history.revision_content(second)],
+            [body, body + "one"],
+        )
+
+    def test_stale_rollback_gets_conflict(self):
+        self.client.post(self.url, {"content": "first", "version": "1"})
+        revision = self.entry.revisions.get()
+        url = reverse("rollback_revision", kwargs={"title": "Shared", "revision_id": revision.id})
+        self.client.post(self.url, {"content": "second", "version": "2"})
+        response = self.client.post(url, {"version": "2"})
+        self.assertEqual(response.status_code, 409)
+        self.entry.refresh_from_db()
+        self.assertEqual((self.entry.content, self.entry.revisions.count()), ("second", 2))
+
+        response = self.client.post(url, {"version": "3"})
+        self.assertEqual(response.status_code, 302)
+        self.entry.refresh_from_db()
+        self.assertEqual((self.entry.content, self.entry.version), ("original", 4))
+
+
+class ResourceUpsertTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="editor", password="pass1234")
+        self.entry = Entry.objects.create(title="Cited", content="text", created_by=self.user)
+        self.client.login(username="editor", password="pass1234")
+        self.save(
+            journals="A | https://a.example\nB | https://b.example", images="https://i.example"
+        )
+
+    def save(self, journals="", sources="", images=""):
+        self.entry.refresh_from_db()
+        return self.client.post(
+            reverse("save_edit", kwargs={"title": "Cited"}),
+            {
+                "content": self.entry.content,
+                "journal_links": journals,
+                "source_links": sources,
+                "image_links": images,
+            },
+        )
+
+    def rows(self):
+        return list(
+            self.entry.resources.order_by("created_at", "id").values_list(
+                "id", "resource_type", "label", "url"
+            )
+        )
+
+    def test_identical_submission_writes_nothing(self):
+        before = self.rows()
+        with mock.patch.object(pagecache, "purge_entry") as purge:
+            views._replace_resources(
+                self.entry,
+                self.user,
+                "A | https://a.example\nB | https://b.example",
+                "",
+                "https://i.example",
+            )
+        purge.assert_not_called()
+        self.assertEqual(self.rows(), before)
+
+    def test_only_changed_rows_are_written(self):
+        (a_id, *_), (b_id, *_), (image_id, *_) = self.rows()
+        self.save(journals="A | https://a.example\nB2 | https://b2.example\nC | https://c.example")
+        rows = self.rows()
+        self.assertEqual(
+            [row[1:] for row in rows],
+            [
+                ("journal", "A", "https://a.example"),
+                ("journal", "B2", "https://b2.example"),
+                ("journal", "C", "https://c.example"),
+            ],
+        )
+        self.assertEqual([row[0] for row in rows[:2]], [a_id, b_id])
+        self.assertFalse(EntryResource.objects.filter(pk=image_id).exists())
+
+
+class ImportEntriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        base_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(base_dir.cleanup)
+        self.base_dir = Path(base_dir.name)
+        self.entries_dir = self.base_dir / "entries"
+        self.entries_dir.mkdir()
+        for index in range(7):
+            (self.entries_dir / f"Topic{index}.md").write_text(f"# Topic {index}\nbody {index}")
+        Entry.objects.create(title="topic0", content="stale")
+
+    def run_import(self, *args):
+        out = StringIO()
+        with override_settings(BASE_DIR=self.base_dir):
+            call_command("import_entries", "--batch-size", "3", *args, stdout=out)
+        return out.getvalue()
+
+    def test_batched_import_creates_and_updates(self):
+        stats.get_counts([stats.TOTAL_ENTRIES])
+        util.title_trigrams.clear()
+        util.title_prefixes.clear()
+        self.assertEqual(util.title_prefixes.complete("topic"), ["topic0"])
+        output = self.run_import()
+        self.assertIn("Created: 6, Updated: 1, Unchanged: 0, Total: 7", output)
+        self.assertIn("Processed 7/7 files", output)
+        updated = Entry.objects.get(title_normalized="topic0")
+        self.assertEqual(
+            (updated.title, updated.content, updated.version), ("Topic0", "# Topic 0\nbody 0", 2)
+        )
+        self.assertEqual(updated.content_html, util.render_markdown(updated.content))
+        self.assertEqual(util.count_entries(), 7)
+        self.assertEqual(stats.get_counts([stats.TOTAL_ENTRIES])[stats.TOTAL_ENTRIES], 7)
+        self.assertEqual(search.get_backend().search("body").total, 7)
+        # The case-only rename of topic0 reaches the in-process title indexes.
+        self.assertIn("Topic0", util.title_prefixes.complete("topic0"))
+        self.assertNotIn("topic0", util.title_prefixes.complete("topic0"))
+        self.assertEqual(util.title_trigrams.similar("Topic0", limit=1), ["Topic0"])
+
+    def test_manifest_skips_unchanged_files(self):
+        self.run_import()
+        (self.entries_dir / "Topic3.md").write_text("# Topic 3\nrewritten")
+        with mock.patch.object(import_entries, "_read", wraps=import_entries._read) as read:
+            output = self.run_import()
+        self.assertEqual(read.call_count, 1)
+        self.assertIn("Created: 0, Updated: 1, Unchanged: 6", output)
+        self.assertEqual(Entry.objects.get(title="Topic3").content, "# Topic 3\nrewritten")
+
+    def test_unchanged_content_is_not_rewritten(self):
+        self.run_import()
+        output = self.run_import("--full")
+        self.assertIn("Created: 0, Updated: 0, Unchanged: 7", output)
+
+    def test_dry_run_writes_nothing(self):
+        output = self.run_import("--dry-run")
+        self.assertIn("Dry run. Created: 6, Updated: 1", output)
+        self.assertEqual(Entry.objects.count(), 1)
+        self.assertFalse((self.entries_dir / ".import-manifest.json").exists())
+
+
+class ImportDumpTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.dir = Path(work_dir.name)
+
+    def run_import(self, path, *args):
+        out = StringIO()
+        call_command("import_dump", str(path), "--batch-size", "2", *args, stdout=out)
+        return out.getvalue()
+
+    def write_jsonl(self, name="dump.jsonl"):
+        path = self.dir / name
+        lines = [json.dumps({"title": f"Item {i}", "content": f"text {i}"}) for i in range(5)]
+        lines.insert(2, "not json")
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return path
+
+    def test_jsonl(self):
+        output = self.run_import(self.write_jsonl())
+        self.assertIn("Created: 5, Updated: 0, Unchanged: 0, Skipped: 1", output)
+        self.assertEqual(Entry.objects.get(title="Item 3").content, "text 3")
+        self.assertFalse((self.dir / "dump.jsonl.checkpoint").exists())
+
+    def test_resumes_from_checkpoint(self):
+        path = self.write_jsonl()
+        real_upsert = importer.upsert_batch
+        calls = []
+
+        def fail_second_batch(records, dry_run=False):
+            calls.append(records)
+            if len(calls) == 2:
+                raise RuntimeError("interrupted")
+            return real_upsert(records, dry_run=dry_run)
+
+        with mock.patch.object(importer, "upsert_batch", side_effect=fail_second_batch):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path)
+        checkpoint = json.loads((self.dir / "dump.jsonl.checkpoint").read_text())
+        self.assertEqual(checkpoint["stats"]["created"], 2)
+
+        with mock.patch.object(importer, "upsert_batch", wraps=real_upsert) as upsert:
+            output = self.run_import(path)
+        self.assertIn(f"position {checkpoint['position']}", output)
+        self.assertEqual(sum(len(call.args[0]) for call in upsert.call_args_list), 3)
+        self.assertIn("Created: 5, Updated: 0, Unchanged: 0, Skipped: 1", output)
+        self.assertEqual(Entry.objects.count(), 5)
+
+    def test_tar_and_zip_archives(self):
+        files = {"pages/Alpha.md": "# Alpha", "pages/Beta.md": "# Beta", "notes.txt": "skip"}
+        tar_path = self.dir / "pages.tar.gz"
+        with tarfile.open(tar_path, "w:gz") as archive:
+            for name, text in files.items():
+                data = text.encode("utf-8")
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, BytesIO(data))
+        output = self.run_import(tar_path)
+        self.assertIn("Created: 2, Updated: 0, Unchanged: 0, Skipped: 1", output)
+
+        zip_path = self.dir / "pages.zip"
+        with zipfile.ZipFile(zip_path, "w") as archive:
+            for name, text in files.items():
+                archive.writestr(name, text + " v2")
+        output = self.run_import(zip_path)
+        self.assertIn("Created: 0, Updated: 2, Unchanged: 0, Skipped: 1", output)
+        self.assertEqual(Entry.objects.get(title="Beta").content, "# Beta v2")
+
+    def test_mediawiki_export(self):
+        path = self.dir / "wiki.xml.bz2"
+        xml = """<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/">
+          <siteinfo><sitename>Test</sitename></siteinfo>
+          <page><title>Rome</title><ns>0</ns>
+            <revision><text>old</text></revision>
+            <revision><text>'''Rome''' is a city.</text></revision>
+          </page>
+          <page><title>Talk:Rome</title><ns>1</ns><revision><text>chat</text></revision></page>
+          <page><title>Roma</title><ns>0</ns><redirect title="Rome"/>
+            <revision><text>#REDIRECT [[Rome]]</text></revision>
+          </page>
+        </mediawiki>"""
+        path.write_bytes(bz2.compress(xml.encode("utf-8")))
+        output = self.run_import(path)
+        self.assertIn("Created: 1, Updated: 0, Unchanged: 0, Skipped: 2", output)
+        self.assertEqual(Entry.objects.get().content, "'''Rome''' is a city.")
+
+
+class BackupRestoreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.backup_dir = Path(work_dir.name) / "backup"
+        self.user = get_user_model().objects.create_user(username="author", password="pass1234")
+        self.alpha = Entry.objects.create(title="Alpha", content="alpha 3", created_by=self.user)
+        self.beta = Entry.objects.create(title="Beta", content="beta", created_by=self.user)
+        for text in ("alpha 1\nshared\n", "alpha 2\nshared\n"):
+            history.record_revision(self.beta, text, edited_by=self.user)
+        EntryResource.objects.create(
+            entry=self.beta, resource_type="journal", label="J", url="https://j.example"
+        )
+        Dispute.objects.create(entry=self.beta, reported_by=self.user, message="Wrong")
+        auditlog.record("edit", self.beta, self.user, "edited")
+        self.beta_created = Entry.objects.get(pk=self.beta.pk).created_at
+
+    def backup(self):
+        out = StringIO()
+        call_command("backup_wiki", str(self.backup_dir), "--chunk-size", "2", stdout=out)
+        return out.getvalue()
+
+    def restore(self):
+        out = StringIO()
+        call_command("restore_wiki", str(self.backup_dir), "--batch-size", "2", stdout=out)
+        return out.getvalue()
+
+    def test_backup_writes_chunks_and_manifest(self):
+        output = self.backup()
+        self.assertIn(
+            "entry: 2, entryrevision: 2, entryresource: 1, dispute: 1, auditlog: 1", output
+        )
+        manifest = json.loads((self.backup_dir / "manifest.json").read_text())
+        self.assertEqual(manifest["models"]["entryrevision"]["rows"], 2)
+        self.assertEqual(len(manifest["models"]["entry"]["files"]), 1)
+        self.assertTrue((self.backup_dir / "entry-00001.jsonl.gz").exists())
+
+    def test_backup_cuts_chunks_by_size(self):
+        call_command("backup_wiki", str(self.backup_dir), "--chunk-bytes", "1", stdout=StringIO())
+        # Every row is over the byte limit, so each one closes its own file.
+        manifest = json.loads((self.backup_dir / "manifest.json").read_text())
+        files = manifest["models"]["entryrevision"]["files"]
+        self.assertEqual([chunk["rows"] for chunk in files], [1, 1])
+        self.assertFalse(list(self.backup_dir.glob("*.tmp")))
+
+    def test_restore_into_emptied_database(self):
+        self.backup()
+        Entry.objects.all().delete()
+        AuditLog.objects.all().delete()
+        output = self.restore()
+        self.assertIn(
+            "entry: 2, entryrevision: 2, entryresource: 1, dispute: 1, auditlog: 1", output
+        )
+
+        beta = Entry.objects.get(title="Beta")
+        self.assertNotEqual(beta.pk, self.beta.pk)
+        self.assertEqual((beta.created_by, beta.created_at), (self.user, self.beta_created))
+        texts = [history.revision_content(rev) for rev in beta.revisions.order_by("id")]
+        self.assertEqual(texts, ["alpha 1\nshared\n", "alpha 2\nshared\n"])
+        self.assertEqual(beta.resources.get().url, "https://j.example")
+        self.assertEqual(beta.disputes.get().reported_by, self.user)
+        self.assertEqual(AuditLog.objects.get().entry, beta)
+        self.assertEqual(search.get_backend().search("beta").total, 1)
+        counts = stats.get_counts([stats.TOTAL_ENTRIES, stats.REVISIONS, stats.OPEN_DISPUTES])
+        self.assertEqual(
+            counts, {stats.TOTAL_ENTRIES: 2, stats.REVISIONS: 2, stats.OPEN_DISPUTES: 1}
+        )
+
+    def test_restore_into_non_empty_database(self):
+        self.backup()
+        self.beta.delete()
+        Entry.objects.create(title="Gamma", content="gamma")
+        output = self.restore()
+        # Alpha already exists and is kept; Beta comes back with its children.
+        self.assertIn(
+            "entry: 1, entryrevision: 2, entryresource: 1, dispute: 1, auditlog: 1", output
+        )
+        self.assertEqual(Entry.objects.get(title="Alpha").pk, self.alpha.pk)
+        self.assertEqual(
+            sorted(Entry.objects.values_list("title", flat=True)), ["Alpha", "Beta", "Gamma"]
+        )
+        self.assertEqual(Entry.objects.get(title="Beta").revisions.count(), 2)
+
+    def test_interrupted_restore_resumes_without_duplicates(self):
+        self.backup()
+        Entry.objects.all().delete()
+        AuditLog.objects.all().delete()
+        insert = backup._insert
+
+        def fail_on_audit_rows(run, model, *args):
+            if model is AuditLog:
+                raise RuntimeError("connection lost")
+            return insert(run, model, *args)
+
+        with mock.patch.object(backup, "_insert", side_effect=fail_on_audit_rows):
+            with self.assertRaises(RuntimeError):
+                self.restore()
+        self.assertEqual(Entry.objects.count(), 2)
+
+        # The rerun reuses the entries it inserted instead of treating them
+        # as pre-existing, and inserts each row once.
+        output = self.restore()
+        self.assertIn(
+            "entry: 2, entryrevision: 2, entryresource: 1, dispute: 1, auditlog: 1", output
+        )
+        beta = Entry.objects.get(title="Beta")
+        self.assertEqual(beta.revisions.count(), 2)
+        self.assertEqual(beta.disputes.count(), 1)
+        self.assertEqual(AuditLog.objects.get().entry, beta)
+
+        with self.assertRaisesMessage(CommandError, "was already restored"):
+            self.restore()
+        self.assertEqual(AuditLog.objects.count(), 1)
+
+    def test_unknown_users_become_null(self):
+        self.backup()
+        Entry.objects.all().delete()
+        self.user.delete()
+        self.restore()
+        self.assertIsNone(Entry.objects.get(title="Beta").created_by)
+
+    def test_dump_reads_one_snapshot_and_restore_reports_orphans(self):
+        with mock.patch.object(backup.transaction, "atomic", wraps=transaction.atomic) as atomic:
+            self.backup()
+        atomic.assert_called_once_with()
+
+        # A dispute whose entry is not in the backup is reported, not dropped silently.
+        chunk = self.backup_dir / "dispute-00001.jsonl.gz"
+        rows = list(backup._read_lines(chunk))
+        rows[0]["entry_id"] = 999999
+        backup._write_lines(chunk, rows)
+        Entry.objects.all().delete()
+        output = self.restore()
+        self.assertIn("Skipped rows whose entry is not in the backup. dispute: 1", output)
+        self.assertFalse(Dispute.objects.exists())
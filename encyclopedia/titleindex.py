@@ -0,0 +1,122 @@
+"""Loading and refresh logic shared by the process-local indexes.
+
+The first query builds an index inline. Once it is older than its TTL, the
+next query starts a rebuild on a background thread and keeps answering from
+the current index; the rebuilt one is swapped in under the lock, and writes
+made while it was being built are replayed onto it. A query therefore never
+waits for a rebuild after the first one.
+"""
+
+import copy
+import logging
+import threading
+import time
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshingIndex:
+    """Base class for an index built from what its loader yields: titles for
+    the suggestion and autocomplete indexes, entry rows for the search
+    fallback.
+
+    Subclasses keep their data in the attributes named by state_fields and
+    implement _reset, _fill, _add and _remove. _fill only touches those
+    attributes, because background rebuilds run it on a copy of the index.
+    Everything else is called with the lock held.
+    """
+
+    state_fields: Tuple[str, ...] = ()
+
+    def __init__(self, loader: Callable[[], Iterable[Any]], ttl: Optional[float] = None):
+        self._loader = loader
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._built_at: Optional[float] = None
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._pending: List[Tuple[Callable[[Any], None], Any]] = []
+        self._reset()
+
+    def _reset(self):
+        raise NotImplementedError
+
+    def _fill(self, items: Iterable[Any]):
+        raise NotImplementedError
+
+    def _add(self, item: Any):
+        raise NotImplementedError
+
+    def _remove(self, item: Any):
+        raise NotImplementedError
+
+    def _ensure_built(self):
+        if self._built_at is None:
+            self._reset()
+            self._fill(self._loader())
+            self._built_at = time.monotonic()
+        elif self._ttl and time.monotonic() - self._built_at > self._ttl:
+            self._start_refresh()
+
+    def _start_refresh(self, items: Optional[List[Any]] = None):
+        """Rebuilds the index in the background from items, or from the
+        loader when items is None."""
+        if self._refresh_thread is not None:
+            return
+        self._pending = []
+        self._refresh_thread = threading.Thread(
+            target=self._refresh, args=(self._generation, items), daemon=True
+        )
+        self._refresh_thread.start()
+
+    def _refresh(self, generation: int, items: Optional[List[Any]]):
+        fresh = copy.copy(self)
+        try:
+            fresh._reset()
+            fresh._fill(self._loader() if items is None else items)
+        except Exception:
+            logger.exception("Rebuilding %s failed", type(self).__name__)
+            fresh = None
+        finally:
+            connections.close_all()
+
+        with self._lock:
+            self._refresh_thread = None
+            if generation != self._generation:
+                return
+            # A failed rebuild is retried after another TTL, not on every query.
+            self._built_at = time.monotonic()
+            if fresh is None:
+                return
+            for name in self.state_fields:
+                setattr(self, name, getattr(fresh, name))
+            pending, self._pending = self._pending, []
+            for apply, item in pending:
+                apply(item)
+
+    def add(self, item: Any) -> None:
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._add(item)
+            if self._refresh_thread is not None:
+                self._pending.append((self._add, item))
+
+    def remove(self, item: Any) -> None:
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._remove(item)
+            if self._refresh_thread is not None:
+                self._pending.append((self._remove, item))
+
+    def clear(self) -> None:
+        with self._lock:
+            # Discards the result of any rebuild already running.
+            self._generation += 1
+            self._pending = []
+            self._reset()
+            self._built_at = None
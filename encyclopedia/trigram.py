@@ -0,0 +1,122 @@
+"""Process-local trigram index for "did you mean" title suggestions.
+
+Titles live in a flat list addressed by slot number, and each trigram maps
+to a sorted array('I') of slots, so memory grows with the number of
+trigram occurrences rather than with per-title containers. Deletes leave a
+tombstone and the index compacts itself in the background once too many
+slots are dead. Rebuilds are handled by titleindex.RefreshingIndex.
+
+Queries read the postings of their rarest trigrams only, up to
+MAX_SCANNED_POSTINGS, and score a small pool of the best candidates exactly,
+so very common trigrams do not dominate query time.
+"""
+
+import heapq
+import math
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+from .titleindex import RefreshingIndex
+
+# Postings counted per query, reading query trigrams rarest first; the
+# rarest one is always read.
+MAX_SCANNED_POSTINGS = 8000
+# Candidates with the most shared trigrams that are re-ranked by size before
+# the best are scored exactly.
+RERANK_POOL = 200
+
+
+def trigrams(text: str) -> Set[str]:
+    """Returns the distinct trigrams of a casefolded, space-padded string."""
+    padded = f"  {' '.join(text.casefold().split())} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex(RefreshingIndex):
+    # Rebuild once this share of slots are tombstones.
+    compact_ratio = 0.25
+    state_fields = ("_titles", "_gram_counts", "_postings", "_dead")
+
+    def _reset(self):
+        self._titles: List[Optional[str]] = []
+        self._gram_counts = array("H")
+        self._postings: Dict[str, array] = {}
+        self._dead = 0
+
+    def _insert(self, title):
+        grams = trigrams(title)
+        slot = len(self._titles)
+        self._titles.append(title)
+        self._gram_counts.append(min(len(grams), 0xFFFF))
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array("I")
+            postings.append(slot)
+
+    def _find_slot(self, title) -> Optional[int]:
+        grams = trigrams(title)
+        rarest = min((self._postings.get(gram, array("I")) for gram in grams), key=len)
+        for slot in rarest:
+            if self._titles[slot] == title:
+                return slot
+        return None
+
+    def _fill(self, titles):
+        for title in titles:
+            self._insert(title)
+
+    def _add(self, title):
+        if self._find_slot(title) is None:
+            self._insert(title)
+
+    def _remove(self, title):
+        slot = self._find_slot(title)
+        if slot is None:
+            return
+        self._titles[slot] = None
+        self._dead += 1
+        if self._dead > len(self._titles) * self.compact_ratio:
+            self._start_refresh([t for t in self._titles if t is not None])
+
+    def similar(self, query: str, limit: int = 5, threshold: float = 0.25) -> List[str]:
+        """Returns up to limit titles whose trigram Jaccard similarity >= threshold."""
+        query_grams = trigrams(query)
+        query_size = len(query_grams)
+        # A title reaching the threshold shares at least `needed` trigrams
+        # with the query, so it has one of any query_size - needed + 1 of
+        # them; trigrams missing from the index are the rarest of all.
+        needed = max(1, math.ceil(threshold * query_size))
+        with self._lock:
+            self._ensure_built()
+            postings = sorted(
+                (found for found in map(self._postings.get, query_grams) if found is not None),
+                key=len,
+            )
+            shared: Counter = Counter()
+            scanned = 0
+            for gram_postings in postings[: max(0, len(postings) - needed + 1)]:
+                if scanned and scanned + len(gram_postings) > MAX_SCANNED_POSTINGS:
+                    break
+                shared.update(gram_postings)
+                scanned += len(gram_postings)
+
+            # Ties on shared trigrams go to titles closest to the query in size.
+            gram_counts = self._gram_counts
+            pool = heapq.nlargest(
+                max(limit * 4, 20),
+                shared.most_common(RERANK_POOL),
+                key=lambda item: (item[1], -abs(gram_counts[item[0]] - query_size)),
+            )
+            candidates = [self._titles[slot] for slot, _ in pool]
+
+        scored = []
+        for title in candidates:
+            if title is None:
+                continue
+            grams = trigrams(title)
+            score = len(grams & query_grams) / len(grams | query_grams)
+            if score >= threshold:
+                scored.append((score, title))
+        return [title for _, title in heapq.nlargest(limit, scored, key=lambda item: item[0])]
@@ -4,14 +4,19 @@ from . import views
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("library/<str:letter>/", views.index, name="index_letter"),
     path("dashboard/", views.dashboard, name="dashboard"),
     path("audit-logs/", views.audit_logs, name="audit_logs"),
+    path("audit-logs/archive/", views.audit_archive, name="audit_archive"),
+    path("export/audit-logs/", views.export_audit_logs, name="export_audit_logs"),
+    path("export/entries/", views.export_entries, name="export_entries"),
     path("disputes/", views.disputes_queue, name="disputes_queue"),
     path("disputes/<int:dispute_id>/resolve/", views.resolve_dispute, name="resolve_dispute"),
     path("auth/register/", views.register, name="register"),
     path("auth/login/", views.login_view, name="login"),
     path("auth/logout/", views.logout_view, name="logout"),
     path("preview/", views.preview_markdown, name="preview_markdown"),
+    path("autocomplete/", views.autocomplete_titles, name="autocomplete_titles"),
     path("search/", views.search, name="search"),
     path("new/", views.new_page, name="new_page"),
     path("random/", views.rand, name="rand"),
@@ -19,6 +24,7 @@ urlpatterns = [
     path("edit/<str:title>/save/", views.save_edit, name="save_edit"),
     path("delete/<str:title>/", views.delete_entry, name="delete_entry"),
     path("wiki/<str:title>/revisions/", views.revisions, name="revisions"),
+    path("wiki/<str:title>/diff/", views.revision_diff, name="revision_diff"),
     path(
         "wiki/<str:title>/rollback/<int:revision_id>/",
         views.rollback_revision,
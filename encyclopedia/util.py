@@ -1,8 +1,81 @@
-from typing import List, Optional
+import hashlib
+import random
+import string
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, List, Optional, Tuple
 
-from django.db.models import Q
+import markdown
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Q
+from django.utils.http import quote_etag
 
-from .models import Entry
+from . import autocomplete, search, stats, trigram
+from .models import AuditLog, Dispute, Entry, EntryResource, EntryRevision, normalize_title
+
+# Bump whenever markdown extensions or rendering options change so stored
+# HTML is treated as stale and re-rendered by the render_entries command.
+RENDERER_VERSION = 1
+
+
+def render_markdown(content: str) -> str:
+    """Renders markdown content to HTML."""
+    return markdown.Markdown().convert(content)
+
+
+def hash_content(content: str) -> str:
+    """Returns a stable hex digest of entry content."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def rendered_fields(content: str) -> Dict[str, object]:
+    """Returns stored-rendering field values for markdown content."""
+    return {
+        "content_html": render_markdown(content),
+        "content_hash": hash_content(content),
+        "renderer_version": RENDERER_VERSION,
+    }
+
+
+def refresh_rendered_content(entry: Entry) -> List[str]:
+    """Re-renders entry.content onto the entry. Returns the changed field names."""
+    fields = rendered_fields(entry.content)
+    for name, value in fields.items():
+        setattr(entry, name, value)
+    return list(fields)
+
+
+def rendered_html(entry: Entry) -> str:
+    """Returns stored HTML for an entry, rendering on the fly if it is stale."""
+    if entry.renderer_version == RENDERER_VERSION and entry.content_hash:
+        return entry.content_html
+    return render_markdown(entry.content)
+
+
+def entry_etag(entry: Entry, viewer: str) -> str:
+    """Returns the ETag of an entry page as rendered for one viewer.
+
+    Expects an entry from get_entry_page. viewer identifies everything about
+    the requester that changes the page (see views._viewer_tier).
+    """
+    state = "|".join(
+        str(part)
+        for part in (
+            entry.pk,
+            entry.updated_at.isoformat(),
+            entry.content_hash,
+            RENDERER_VERSION,
+            entry.open_disputes_count,
+            viewer,
+        )
+    )
+    return quote_etag(hash_content(state)[:32])
+
+
+def preview_etag(text: str) -> str:
+    """Returns the ETag of a markdown preview of text."""
+    return quote_etag(hash_content(f"{RENDERER_VERSION}|{text}")[:32])
 
 
 def list_entries() -> List[str]:
@@ -10,40 +83,273 @@ def list_entries() -> List[str]:
     return list(Entry.objects.values_list("title", flat=True))
 
 
+LIBRARY_LETTERS = list(string.ascii_uppercase)
+LIBRARY_OTHER = "other"
+# Writes drop the cached count, but a worker on a per-process cache never
+# sees another worker's delete, so the count also expires.
+REVISION_COUNT_TIMEOUT = 60
+
+
+def revision_count_key(entry_id: int) -> str:
+    return f"wiki:revision-count:{entry_id}"
+
+
+def list_entries_page(
+    letter: Optional[str] = None, after: Optional[str] = None, per_page: int = 60
+) -> Tuple[List[str], Optional[str]]:
+    """Returns one keyset page of titles and the cursor for the next page.
+
+    Pages are ordered by the normalized title so each one is a range scan on
+    its unique index; letter limits the page to an A-Z bucket or "other".
+    """
+    entries = Entry.objects.order_by("title_normalized")
+    if letter == LIBRARY_OTHER:
+        entries = entries.filter(Q(title_normalized__lt="a") | Q(title_normalized__gte="{"))
+    elif letter:
+        start = letter.lower()
+        entries = entries.filter(
+            title_normalized__gte=start, title_normalized__lt=chr(ord(start) + 1)
+        )
+    if after:
+        entries = entries.filter(title_normalized__gt=after)
+
+    rows = list(entries.values_list("title", "title_normalized")[: per_page + 1])
+    next_cursor = rows[per_page - 1][1] if len(rows) > per_page else None
+    return [title for title, _ in rows[:per_page]], next_cursor
+
+
+def recently_updated_entries(limit: int = 5) -> List[str]:
+    """Returns titles of the most recently updated entries."""
+    return list(Entry.objects.order_by("-updated_at").values_list("title", flat=True)[:limit])
+
+
+def random_entry_title(rng: Optional[random.Random] = None, attempts: int = 16) -> Optional[str]:
+    """Returns the title of a uniformly chosen entry, or None if there are none.
+
+    Draws ids uniformly from [min(id), max(id)] and retries when a draw lands
+    on a gap left by a deleted entry. Every live id is equally likely on each
+    draw, so accepted draws are uniform over live entries. Each attempt is a
+    primary-key lookup; after too many misses it falls back to an OFFSET pick.
+    """
+    rng = rng or random
+    bounds = Entry.objects.aggregate(low=Min("id"), high=Max("id"))
+    if bounds["low"] is None:
+        return None
+
+    for _ in range(attempts):
+        candidate = rng.randint(bounds["low"], bounds["high"])
+        title = Entry.objects.filter(id=candidate).values_list("title", flat=True).first()
+        if title is not None:
+            return title
+
+    total = Entry.objects.count()
+    if not total:
+        return None
+    return Entry.objects.order_by("id").values_list("title", flat=True)[rng.randrange(total)]
+
+
+def encode_cursor(created_at: datetime, pk: int) -> str:
+    """Returns an opaque (created_at, id) keyset cursor."""
+    micros = int(created_at.timestamp()) * 1_000_000 + created_at.microsecond
+    return f"{micros}-{pk}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Parses a cursor from encode_cursor, or returns None if it is malformed."""
+    try:
+        micros, pk = (int(part) for part in (cursor or "").split("-"))
+        created_at = datetime.fromtimestamp(micros // 1_000_000, tz=dt_timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        return None
+    return created_at.replace(microsecond=micros % 1_000_000), pk
+
+
+def keyset_page(queryset, after: Optional[str] = None, per_page: int = 50):
+    """Returns one page of queryset newest first and the cursor for the next.
+
+    Rows are ordered by (created_at, id) descending and a page starts strictly
+    after the cursor's row, so every page is a range scan on an index ending
+    in (created_at, id).
+    """
+    queryset = queryset.order_by("-created_at", "-id")
+    position = decode_cursor(after)
+    if position is not None:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+    rows = list(queryset[: per_page + 1])
+    if len(rows) <= per_page:
+        return rows, None
+    last = rows[per_page - 1]
+    return rows[:per_page], encode_cursor(last.created_at, last.pk)
+
+
+def _entry_id(title: str) -> Optional[int]:
+    return (
+        Entry.objects.filter(title_normalized=normalize_title(title))
+        .values_list("id", flat=True)
+        .first()
+    )
+
+
+def audit_log_page(
+    action: Optional[str] = None,
+    actor: Optional[str] = None,
+    entry: Optional[str] = None,
+    after: Optional[str] = None,
+    per_page: int = 50,
+):
+    """Returns a keyset page of audit logs filtered by action, actor username
+    and entry title, plus the next cursor."""
+    logs = AuditLog.objects.select_related("actor")
+    if action:
+        logs = logs.filter(action=action)
+    if actor:
+        actor_id = (
+            get_user_model().objects.filter(username=actor).values_list("id", flat=True).first()
+        )
+        logs = logs.filter(actor_id=actor_id) if actor_id else logs.none()
+    if entry:
+        entry_id = _entry_id(entry)
+        logs = logs.filter(entry_id=entry_id) if entry_id else logs.none()
+    return keyset_page(logs, after=after, per_page=per_page)
+
+
+def dispute_page(
+    status: Optional[str] = None,
+    entry: Optional[str] = None,
+    after: Optional[str] = None,
+    per_page: int = 50,
+):
+    """Returns a keyset page of disputes filtered by status and entry title,
+    plus the next cursor."""
+    disputes = Dispute.objects.select_related("entry", "reported_by", "resolved_by")
+    if status:
+        disputes = disputes.filter(status=status)
+    if entry:
+        entry_id = _entry_id(entry)
+        disputes = disputes.filter(entry_id=entry_id) if entry_id else disputes.none()
+    return keyset_page(disputes, after=after, per_page=per_page)
+
+
+def revision_page(entry_id: int, after: Optional[str] = None, per_page: int = 50):
+    """Returns a keyset page of an entry's revisions without their text,
+    plus the next cursor."""
+    revisions = (
+        EntryRevision.objects.filter(entry_id=entry_id)
+        .select_related("edited_by")
+        .defer("content", "delta")
+    )
+    return keyset_page(revisions, after=after, per_page=per_page)
+
+
+def count_entries() -> int:
+    """Returns the number of entries from its materialized counter, which
+    every process keeps current."""
+    return stats.get_counts([stats.TOTAL_ENTRIES])[stats.TOTAL_ENTRIES]
+
+
+def count_revisions(entry_id: int) -> int:
+    """Returns how many revisions an entry has, cached for a minute or until
+    one is added or deleted."""
+    key = revision_count_key(entry_id)
+    count = cache.get(key)
+    if count is None:
+        count = EntryRevision.objects.filter(entry_id=entry_id).count()
+        cache.set(key, count, REVISION_COUNT_TIMEOUT)
+    return count
+
+
+def count_locked_entries() -> int:
+    """Returns the number of locked entries from the counter the entry
+    signals maintain."""
+    return stats.get_counts([stats.LOCKED_ENTRIES])[stats.LOCKED_ENTRIES]
+
+
+# Rebuilt in the background every WIKI_TITLE_INDEX_TTL seconds so titles
+# created by other worker processes eventually show up; local writes apply
+# immediately.
+title_trigrams = trigram.TrigramIndex(
+    loader=list_entries, ttl=getattr(settings, "WIKI_TITLE_INDEX_TTL", 300)
+)
+
+
+title_prefixes = autocomplete.PrefixIndex(
+    loader=list_entries, ttl=getattr(settings, "WIKI_TITLE_INDEX_TTL", 300)
+)
+
+
+def complete_titles(prefix: str, limit: int = 8) -> List[str]:
+    """Returns titles starting with prefix (case-insensitive) for autocomplete."""
+    return title_prefixes.complete(prefix, limit=limit)
+
+
+def suggest_titles(query: str, limit: int = 5) -> List[str]:
+    """Returns existing titles that look like a misspelling of query."""
+    return title_trigrams.similar(query, limit=limit)
+
+
 def save_entry(title: str, content: str, creator=None) -> Entry:
     """Creates or updates an entry by title (case-insensitive)."""
-    existing = Entry.objects.filter(title__iexact=title).first()
+    existing = get_entry_obj(title)
     if existing:
         existing.content = content
-        existing.save(update_fields=["content", "updated_at"])
+        rendered = refresh_rendered_content(existing)
+        existing.save(update_fields=["content", *rendered, "updated_at"])
         return existing
 
-    return Entry.objects.create(title=title, content=content, created_by=creator)
+    return Entry.objects.create(
+        title=title, content=content, created_by=creator, **rendered_fields(content)
+    )
 
 
 def get_entry(title: str) -> Optional[str]:
     """Returns markdown content for an entry title, or None."""
-    entry = Entry.objects.filter(title__iexact=title).first()
-    return None if entry is None else entry.content
+    return (
+        Entry.objects.filter(title_normalized=normalize_title(title))
+        .values_list("content", flat=True)
+        .first()
+    )
 
 
 def get_entry_obj(title: str) -> Optional[Entry]:
     """Returns the entry object for an entry title, or None."""
-    return Entry.objects.filter(title__iexact=title).first()
+    return Entry.objects.filter(title_normalized=normalize_title(title)).first()
+
 
+def get_entry_page(title: str) -> Optional[Entry]:
+    """Returns an entry with everything the entry page renders, or None.
 
-def search_entries(query: str) -> List[Entry]:
-    """Returns entries with title or content containing query (case-insensitive)."""
-    return list(
-        Entry.objects.filter(Q(title__icontains=query) | Q(content__icontains=query))
-        .distinct()
-        .order_by("title")
+    The three user FKs are joined and open disputes are counted in the same
+    query; resources are prefetched in one more query and grouped by type
+    onto entry.resources_by_type, so the page costs two queries in total.
+    """
+    entry = (
+        Entry.objects.filter(title_normalized=normalize_title(title))
+        .select_related("created_by", "locked_by", "verified_by")
+        .annotate(open_disputes_count=Count("disputes", filter=Q(disputes__status="open")))
+        .prefetch_related("resources")
+        .first()
     )
+    if entry is None:
+        return None
+
+    entry.resources_by_type = {kind: [] for kind, _ in EntryResource.RESOURCE_CHOICES}
+    for resource in entry.resources.all():
+        entry.resources_by_type.setdefault(resource.resource_type, []).append(resource)
+    return entry
+
+
+def search_entries(query: str, page: int = 1, per_page: Optional[int] = None) -> search.SearchPage:
+    """Returns one ranked page of entries matching query in title or content."""
+    per_page = per_page or getattr(settings, "WIKI_SEARCH_PAGE_SIZE", 20)
+    return search.get_backend().search(query, page=max(1, page), per_page=per_page)
 
 
 def delete_entry(title: str) -> bool:
     """Deletes an entry by title (case-insensitive). Returns True if deleted."""
-    entry = Entry.objects.filter(title__iexact=title).first()
+    entry = get_entry_obj(title)
     if entry is None:
         return False
     entry.delete()
@@ -1,19 +1,22 @@
-import random
-from urllib.parse import quote_plus, urlparse
+from collections import defaultdict
+from urllib.parse import quote_plus, urlencode, urlparse
 
-import markdown
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils import timezone
-from django.http import JsonResponse
+from django.utils.dateparse import parse_date
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 
-from . import util
-from .models import AuditLog, Dispute, Entry, EntryResource, EntryRevision
+from . import archive, auditlog, diffs, exports, history, pagecache, stats, util
+from .models import AuditLog, Dispute, Entry, EntryResource, EntryRevision, normalize_title
 
 
 def _can_delete_entry(request, entry_obj):
@@ -31,14 +34,34 @@ def _can_rollback(request, entry_obj):
     )
 
 
+def _viewer_tier(request, entry_obj):
+    user = request.user
+    if not user.is_authenticated:
+        return "anonymous"
+    if user.is_superuser:
+        role = "moderator"
+    elif entry_obj.created_by_id == user.id:
+        role = "owner"
+    else:
+        role = "member"
+    # Signed-in pages also embed the username and a CSRF token.
+    return f"{role}:{user.pk}:{request.META.get('CSRF_COOKIE', '')}"
+
+
+def _with_validators(request, response, etag, last_modified=None):
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+    # Always revalidate; a Last-Modified alone would let browsers guess a freshness lifetime.
+    if request.user.is_authenticated:
+        patch_cache_control(response, no_cache=True, private=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
 def _log_action(action, entry, actor, details=""):
-    AuditLog.objects.create(
-        action=action,
-        entry=entry,
-        entry_title=entry.title,
-        actor=actor if actor and actor.is_authenticated else None,
-        details=details,
-    )
+    auditlog.record(action, entry, actor=actor, details=details)
 
 
 def _build_research_links(topic):
@@ -77,7 +100,9 @@ def _resource_lines_for_entry(entry_obj, resource_type):
     return "\n".join(
         [
             f"{item.label} | {item.url}"
-            for item in entry_obj.resources.filter(resource_type=resource_type).order_by("created_at")
+            for item in entry_obj.resources.filter(resource_type=resource_type).order_by(
+                "created_at", "id"
+            )
         ]
     )
 
@@ -112,42 +137,55 @@ def _parse_resource_lines(raw_text, default_label):
 
 
 def _replace_resources(entry_obj, actor, journals_raw, sources_raw, images_raw):
-    entry_obj.resources.filter(resource_type__in=["journal", "source", "image"]).delete()
-
-    bulk_items = []
-    for label, url in _parse_resource_lines(journals_raw, "Journal"):
-        bulk_items.append(
-            EntryResource(
-                entry=entry_obj,
-                resource_type="journal",
-                label=label,
-                url=url,
-                added_by=actor,
-            )
-        )
-    for label, url in _parse_resource_lines(sources_raw, "Source"):
-        bulk_items.append(
-            EntryResource(
-                entry=entry_obj,
-                resource_type="source",
-                label=label,
-                url=url,
-                added_by=actor,
-            )
-        )
-    for label, url in _parse_resource_lines(images_raw, "Image"):
-        bulk_items.append(
+    """Brings the entry's journal, source and image rows in line with the
+    submitted lines.
+
+    Rows are paired with lines by position within each type, so unchanged
+    rows keep their ids and created_at, and only the differences are written.
+    Returns whether any row was written.
+    """
+    wanted = {
+        "journal": _parse_resource_lines(journals_raw, "Journal"),
+        "source": _parse_resource_lines(sources_raw, "Source"),
+        "image": _parse_resource_lines(images_raw, "Image"),
+    }
+    existing = defaultdict(list)
+    for resource in entry_obj.resources.filter(resource_type__in=wanted).order_by(
+        "created_at", "id"
+    ):
+        existing[resource.resource_type].append(resource)
+
+    to_create, to_update, to_delete = [], [], []
+    for resource_type, items in wanted.items():
+        rows = existing[resource_type]
+        for row, (label, url) in zip(rows, items):
+            if (row.label, row.url) != (label, url):
+                row.label, row.url, row.added_by = label, url, actor
+                to_update.append(row)
+        to_delete.extend(row.pk for row in rows[len(items) :])
+        to_create.extend(
             EntryResource(
                 entry=entry_obj,
-                resource_type="image",
+                resource_type=resource_type,
                 label=label,
                 url=url,
                 added_by=actor,
             )
+            for label, url in items[len(rows) :]
         )
+    if not (to_create or to_update or to_delete):
+        return False
 
-    if bulk_items:
-        EntryResource.objects.bulk_create(bulk_items)
+    with transaction.atomic(savepoint=False):
+        if to_delete:
+            EntryResource.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            EntryResource.objects.bulk_update(to_update, ["label", "url", "added_by"])
+        if to_create:
+            EntryResource.objects.bulk_create(to_create)
+    # Bulk writes send no signals, so the entry's cached page is purged here.
+    pagecache.purge_entry(entry_obj.title)
+    return True
 
 
 @login_required
@@ -155,14 +193,26 @@ def dashboard(request):
     user = request.user
     your_entries = Entry.objects.filter(created_by=user).order_by("-updated_at")
 
+    your_entries_key = stats.user_entries_key(user.id)
+    counts = stats.get_counts(
+        [
+            stats.TOTAL_ENTRIES,
+            stats.LOCKED_ENTRIES,
+            stats.VERIFIED_ENTRIES,
+            stats.REVISIONS,
+            stats.OPEN_DISPUTES,
+            your_entries_key,
+        ]
+    )
+
     context = {
         "is_admin_dashboard": user.is_superuser,
-        "total_entries": Entry.objects.count(),
-        "locked_entries_count": Entry.objects.filter(is_locked=True).count(),
-        "verified_entries_count": Entry.objects.filter(verification_status="verified").count(),
-        "revision_count": EntryRevision.objects.count(),
-        "pending_disputes_count": Dispute.objects.filter(status="open").count(),
-        "your_entries_count": your_entries.count(),
+        "total_entries": counts[stats.TOTAL_ENTRIES],
+        "locked_entries_count": counts[stats.LOCKED_ENTRIES],
+        "verified_entries_count": counts[stats.VERIFIED_ENTRIES],
+        "revision_count": counts[stats.REVISIONS],
+        "pending_disputes_count": counts[stats.OPEN_DISPUTES],
+        "your_entries_count": counts[your_entries_key],
         "your_recent_entries": your_entries[:8],
         "your_recent_activity": AuditLog.objects.filter(actor=user)[:10],
     }
@@ -175,10 +225,21 @@ def dashboard(request):
         context["pending_disputes"] = Dispute.objects.select_related(
             "entry", "reported_by"
         ).filter(status="open")[:15]
+        context["page_cache_stats"] = pagecache.stats()
 
     return render(request, "encyclopedia/dashboard.html", context)
 
 
+def _pager_context(request, filters, next_cursor):
+    active = {name: value for name, value in filters.items() if value}
+    return {
+        "filters": filters,
+        "first_query": urlencode(active),
+        "next_query": urlencode({**active, "after": next_cursor}) if next_cursor else None,
+        "is_continuation": bool(request.GET.get("after")),
+    }
+
+
 @login_required
 def audit_logs(request):
     if not request.user.is_superuser:
@@ -189,8 +250,153 @@ def audit_logs(request):
             status=403,
         )
 
-    logs = AuditLog.objects.select_related("actor")[:100]
-    return render(request, "encyclopedia/audit_logs.html", {"logs": logs})
+    filters = {name: request.GET.get(name, "").strip() for name in ("action", "actor", "entry")}
+    logs, next_cursor = util.audit_log_page(after=request.GET.get("after"), **filters)
+    return render(
+        request,
+        "encyclopedia/audit_logs.html",
+        {
+            "logs": logs,
+            "action_choices": AuditLog.ACTION_CHOICES,
+            **_pager_context(request, filters, next_cursor),
+        },
+    )
+
+
+@login_required
+def audit_archive(request):
+    if not request.user.is_superuser:
+        return render(
+            request,
+            "encyclopedia/error.html",
+            {"message": "Only superusers can access audit logs."},
+            status=403,
+        )
+
+    try:
+        start = _date_param(request, "from")
+        end = _date_param(request, "to") or start
+    except ValueError:
+        start = end = None
+    if start is None or end < start:
+        return render(
+            request,
+            "encyclopedia/error.html",
+            {"message": "Choose an archive date range."},
+            status=400,
+        )
+    if (end - start).days >= archive.DOWNLOAD_MAX_DAYS:
+        return render(
+            request,
+            "encyclopedia/error.html",
+            {
+                "message": (
+                    f"Archive downloads cover at most {archive.DOWNLOAD_MAX_DAYS} days. "
+                    "Run `manage.py export_records audit-archive <file>` on the server "
+                    "for longer ranges."
+                )
+            },
+            status=400,
+        )
+
+    records = archive.iter_archived(
+        start,
+        end,
+        action=request.GET.get("action", "").strip() or None,
+        actor=request.GET.get("actor", "").strip() or None,
+        entry_title=request.GET.get("entry", "").strip() or None,
+    )
+    return _export_response(records, None, "jsonl", f"audit-archive-{start}-{end}")
+
+
+def _date_param(request, name):
+    """Returns the date in a query parameter, or None when it is missing.
+
+    Raises ValueError for text that is not a date, including well-formed
+    dates that do not exist such as 2024-02-30.
+    """
+    raw = request.GET.get(name, "").strip()
+    if not raw:
+        return None
+    value = parse_date(raw)
+    if value is None:
+        raise ValueError(f"Invalid date: {raw}")
+    return value
+
+
+def _export_too_large(request, kind):
+    # A streamed export that outlives the worker timeout is cut off with a
+    # 200 status, so large ones are written to a file by a command instead.
+    return render(
+        request,
+        "encyclopedia/error.html",
+        {
+            "message": (
+                f"This export has more than {exports.max_http_rows()} rows. "
+                f"Run `manage.py export_records {kind} <file>` on the server instead."
+            )
+        },
+        status=400,
+    )
+
+
+def _export_response(rows, columns, export_format, filename):
+    if export_format == "csv":
+        lines, content_type = exports.csv_lines(rows, columns), "text/csv"
+    else:
+        export_format = "jsonl"
+        lines, content_type = exports.jsonl_lines(rows), "application/x-ndjson"
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{export_format}"'
+    return response
+
+
+@login_required
+def export_audit_logs(request):
+    if not request.user.is_superuser:
+        return render(
+            request,
+            "encyclopedia/error.html",
+            {"message": "Only superusers can export audit logs."},
+            status=403,
+        )
+
+    try:
+        start, end = _date_param(request, "from"), _date_param(request, "to")
+    except ValueError:
+        return render(
+            request,
+            "encyclopedia/error.html",
+            {"message": "Choose a valid export date range."},
+            status=400,
+        )
+
+    action = request.GET.get("action", "").strip() or None
+    if exports.has_more_than(exports.audit_logs(start, end, action), exports.max_http_rows()):
+        return _export_too_large(request, "audit-logs")
+    return _export_response(
+        exports.audit_log_rows(start, end, action),
+        exports.AUDIT_LOG_COLUMNS,
+        request.GET.get("format"),
+        "audit-logs",
+    )
+
+
+@login_required
+def export_entries(request):
+    if not request.user.is_superuser:
+        return render(
+            request,
+            "encyclopedia/error.html",
+            {"message": "Only superusers can export entries."},
+            status=403,
+        )
+
+    if exports.has_more_than(Entry.objects.all(), exports.max_http_rows()):
+        return _export_too_large(request, "entries")
+    return _export_response(
+        exports.entry_rows(), exports.ENTRY_COLUMNS, request.GET.get("format"), "entries"
+    )
 
 
 @login_required
@@ -203,8 +409,17 @@ def disputes_queue(request):
             status=403,
         )
 
-    disputes = Dispute.objects.select_related("entry", "reported_by", "resolved_by")[:200]
-    return render(request, "encyclopedia/disputes_queue.html", {"disputes": disputes})
+    filters = {name: request.GET.get(name, "").strip() for name in ("status", "entry")}
+    disputes, next_cursor = util.dispute_page(after=request.GET.get("after"), **filters)
+    return render(
+        request,
+        "encyclopedia/disputes_queue.html",
+        {
+            "disputes": disputes,
+            "status_choices": Dispute.STATUS_CHOICES,
+            **_pager_context(request, filters, next_cursor),
+        },
+    )
 
 
 def register(request):
@@ -245,29 +460,69 @@ def logout_view(request):
     return redirect(reverse("dashboard"))
 
 
-def convert_md_to_html(title):
-    content = util.get_entry(title)
-    markdowner = markdown.Markdown()
-    if content is None:
-        return None
-    return markdowner.convert(content)
+def _library_context(letter=None, after=None, per_page=60):
+    entries, next_cursor = util.list_entries_page(letter=letter, after=after, per_page=per_page)
+    return {
+        "entries": entries,
+        "next_cursor": next_cursor,
+        "letter": letter,
+        "is_continuation": bool(after),
+        "letters": util.LIBRARY_LETTERS,
+        "other_letter": util.LIBRARY_OTHER,
+        "entry_count": util.count_entries(),
+        "recent_entries": util.recently_updated_entries(),
+        "locked_entries": util.count_locked_entries(),
+    }
+
 
+@pagecache.cache_anonymous(lambda **kwargs: pagecache.CATALOG_SCOPE)
+def index(request, letter=None):
+    if letter is not None:
+        letter = letter.upper() if len(letter) == 1 else letter.lower()
+        if letter not in util.LIBRARY_LETTERS and letter != util.LIBRARY_OTHER:
+            return render(
+                request,
+                "encyclopedia/error.html",
+                {"message": "Unknown library section."},
+                status=404,
+            )
 
-def index(request):
-    entries = util.list_entries()
+    after = request.GET.get("after", "").strip() or None
     return render(
         request,
         "encyclopedia/index.html",
-        {
-            "entries": entries,
-            "recent_entries": entries[:5],
-            "locked_entries": Entry.objects.filter(is_locked=True).count(),
-        },
+        _library_context(letter=letter, after=after),
     )
 
 
+def _entry_context(request, entry_obj):
+    resources = entry_obj.resources_by_type
+    return {
+        "title": entry_obj.title,
+        "content": util.rendered_html(entry_obj),
+        "lead_image_url": entry_obj.lead_image_url,
+        "can_delete": _can_delete_entry(request, entry_obj),
+        "can_moderate": _can_moderate(request),
+        "can_rollback": _can_rollback(request, entry_obj),
+        "entry_owner": entry_obj.created_by.username if entry_obj.created_by else "Unknown",
+        "is_locked": entry_obj.is_locked,
+        "lock_reason": entry_obj.lock_reason,
+        "locked_by": entry_obj.locked_by.username if entry_obj.locked_by else "Unknown",
+        "verification_status": entry_obj.verification_status,
+        "verification_status_label": entry_obj.get_verification_status_display(),
+        "verification_note": entry_obj.verification_note,
+        "verified_by": entry_obj.verified_by.username if entry_obj.verified_by else "Unknown",
+        "open_disputes_count": entry_obj.open_disputes_count,
+        "journal_resources": resources["journal"],
+        "source_resources": resources["source"],
+        "image_resources": resources["image"],
+        "research_links": _build_research_links(entry_obj.title),
+    }
+
+
+@pagecache.cache_anonymous(pagecache.entry_scope)
 def entry(request, title):
-    entry_obj = util.get_entry_obj(title)
+    entry_obj = util.get_entry_page(title)
     if entry_obj is None:
         return render(
             request,
@@ -278,37 +533,17 @@ def entry(request, title):
             status=404,
         )
 
-    html_content = convert_md_to_html(entry_obj.title)
-    journal_resources = entry_obj.resources.filter(resource_type="journal")
-    source_resources = entry_obj.resources.filter(resource_type="source")
-    image_resources = entry_obj.resources.filter(resource_type="image")
-    return render(
-        request,
-        "encyclopedia/entry.html",
-        {
-            "title": entry_obj.title,
-            "content": html_content,
-            "lead_image_url": entry_obj.lead_image_url,
-            "can_delete": _can_delete_entry(request, entry_obj),
-            "can_moderate": _can_moderate(request),
-            "can_rollback": _can_rollback(request, entry_obj),
-            "entry_owner": entry_obj.created_by.username if entry_obj.created_by else "Unknown",
-            "is_locked": entry_obj.is_locked,
-            "lock_reason": entry_obj.lock_reason,
-            "locked_by": entry_obj.locked_by.username if entry_obj.locked_by else "Unknown",
-            "verification_status": entry_obj.verification_status,
-            "verification_status_label": entry_obj.get_verification_status_display(),
-            "verification_note": entry_obj.verification_note,
-            "verified_by": entry_obj.verified_by.username if entry_obj.verified_by else "Unknown",
-            "open_disputes_count": entry_obj.disputes.filter(status="open").count(),
-            "journal_resources": journal_resources,
-            "source_resources": source_resources,
-            "image_resources": image_resources,
-            "research_links": _build_research_links(entry_obj.title),
-        },
-    )
+    etag = util.entry_etag(entry_obj, _viewer_tier(request, entry_obj))
+    last_modified = int(entry_obj.updated_at.timestamp())
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        return _with_validators(request, conditional, etag, last_modified)
+
+    response = render(request, "encyclopedia/entry.html", _entry_context(request, entry_obj))
+    return _with_validators(request, response, etag, last_modified)
 
 
+@pagecache.cache_anonymous(lambda **kwargs: pagecache.CATALOG_SCOPE)
 def search(request):
     query = request.GET.get("q", "").strip()
     if not query:
@@ -325,13 +560,21 @@ def search(request):
     if exact_match is not None:
         return redirect(reverse("entry", kwargs={"title": exact_match.title}))
 
-    recommendations = util.search_entries(query)
+    try:
+        page = int(request.GET.get("page", 1))
+    except ValueError:
+        page = 1
+
+    results = util.search_entries(query, page=page)
+    shown = {hit.title for hit in results.hits}
     return render(
         request,
         "encyclopedia/search.html",
         {
             "query": query,
-            "recommendation": recommendations,
+            "recommendation": results.hits,
+            "results": results,
+            "suggestions": [title for title in util.suggest_titles(query) if title not in shown],
         },
     )
 
@@ -417,6 +660,7 @@ def edit(request, title):
         {
             "title": entry_obj.title,
             "content": entry_obj.content,
+            "version": entry_obj.version,
             "lead_image_url": entry_obj.lead_image_url,
             "journal_links": _resource_lines_for_entry(entry_obj, "journal"),
             "source_links": _resource_lines_for_entry(entry_obj, "source"),
@@ -426,110 +670,216 @@ def edit(request, title):
     )
 
 
+def _locked_entry(title):
+    """Reads and locks an entry together with its newest revision, for
+    writes that record a revision."""
+    return (
+        history.with_head(Entry.objects.select_for_update())
+        .filter(title_normalized=normalize_title(title))
+        .first()
+    )
+
+
 @login_required
 def save_edit(request, title):
     if request.method != "POST":
         return redirect(reverse("edit", kwargs={"title": title}))
 
-    entry_obj = util.get_entry_obj(title)
-    if entry_obj is None:
-        return render(
-            request,
-            "encyclopedia/error.html",
-            {
-                "message": "Cannot save changes for a page that does not exist.",
-            },
-            status=404,
-        )
-
-    if entry_obj.is_locked and not request.user.is_superuser:
-        return render(
-            request,
-            "encyclopedia/error.html",
-            {"message": "This page is locked by moderation and cannot be edited right now."},
-            status=423,
-        )
-
     content = request.POST.get("content", "").strip()
     summary = request.POST.get("edit_summary", "").strip()
     lead_image_url = request.POST.get("lead_image_url", "").strip()
     journal_links = request.POST.get("journal_links", "").strip()
     source_links = request.POST.get("source_links", "").strip()
     image_links = request.POST.get("image_links", "").strip()
-    if not content:
-        return render(
-            request,
-            "encyclopedia/edit.html",
-            {
-                "title": entry_obj.title,
-                "content": entry_obj.content,
-                "message": "Content cannot be empty.",
-                "lead_image_url": lead_image_url,
-                "journal_links": journal_links,
-                "source_links": source_links,
-                "image_links": image_links,
-                "research_links": _build_research_links(entry_obj.title),
-            },
-            status=400,
-        )
+    base_version = request.POST.get("version", "").strip()
+
+    # The entry row stays locked until the edit, its revision, resources and
+    # audit record are committed together.
+    with transaction.atomic():
+        entry_obj = _locked_entry(title)
+        if entry_obj is None:
+            return render(
+                request,
+                "encyclopedia/error.html",
+                {
+                    "message": "Cannot save changes for a page that does not exist.",
+                },
+                status=404,
+            )
 
-    if content != entry_obj.content:
-        EntryRevision.objects.create(
-            entry=entry_obj,
-            content=entry_obj.content,
-            edited_by=request.user,
-            edit_summary=summary or "Edit snapshot",
-        )
+        if entry_obj.is_locked and not request.user.is_superuser:
+            return render(
+                request,
+                "encyclopedia/error.html",
+                {"message": "This page is locked by moderation and cannot be edited right now."},
+                status=423,
+            )
+
+        form_context = {
+            "title": entry_obj.title,
+            "version": entry_obj.version,
+            "lead_image_url": lead_image_url,
+            "journal_links": journal_links,
+            "source_links": source_links,
+            "image_links": image_links,
+            "research_links": _build_research_links(entry_obj.title),
+        }
+        if not content:
+            return render(
+                request,
+                "encyclopedia/edit.html",
+                {
+                    **form_context,
+                    "content": entry_obj.content,
+                    "message": "Content cannot be empty.",
+                },
+                status=400,
+            )
 
-    util.save_entry(entry_obj.title, content)
-    if entry_obj.lead_image_url != lead_image_url:
-        entry_obj.lead_image_url = lead_image_url
-        entry_obj.save(update_fields=["lead_image_url", "updated_at"])
-    _replace_resources(entry_obj, request.user, journal_links, source_links, image_links)
-    _log_action("edit", entry_obj, request.user, summary or "Updated entry content")
+        # Forms posted without a version (older clients) are not checked.
+        if base_version and base_version != str(entry_obj.version):
+            return render(
+                request,
+                "encyclopedia/edit.html",
+                {
+                    **form_context,
+                    "content": content,
+                    "conflict_content": entry_obj.content,
+                    "message": (
+                        "Someone else saved this page while you were editing. Their version "
+                        "is shown below; saving again will replace it with your text."
+                    ),
+                },
+                status=409,
+            )
+
+        changed = []
+        if content != entry_obj.content:
+            history.record_revision(
+                entry_obj,
+                entry_obj.content,
+                edited_by=request.user,
+                edit_summary=summary or "Edit snapshot",
+            )
+            entry_obj.content = content
+            changed += ["content", *util.refresh_rendered_content(entry_obj)]
+        if entry_obj.lead_image_url != lead_image_url:
+            entry_obj.lead_image_url = lead_image_url
+            changed.append("lead_image_url")
+        resources_changed = _replace_resources(
+            entry_obj, request.user, journal_links, source_links, image_links
+        )
+        # updated_at feeds the entry ETag and the static export manifest, so
+        # resource-only edits bump it too.
+        if changed or resources_changed:
+            entry_obj.save(update_fields=[*changed, "updated_at"])
+        _log_action("edit", entry_obj, request.user, summary or "Updated entry content")
     return redirect(reverse("entry", kwargs={"title": entry_obj.title}))
 
 
 @login_required
 def revisions(request, title):
-    entry_obj = get_object_or_404(Entry, title__iexact=title)
+    entry_obj = get_object_or_404(Entry, title_normalized=normalize_title(title))
+    revision_list, next_cursor = util.revision_page(entry_obj.pk, after=request.GET.get("after"))
     return render(
         request,
         "encyclopedia/revisions.html",
         {
             "entry": entry_obj,
-            "revisions": entry_obj.revisions.select_related("edited_by"),
+            "revisions": revision_list,
+            "revision_count": util.count_revisions(entry_obj.pk),
             "can_rollback": _can_rollback(request, entry_obj),
+            **_pager_context(request, {}, next_cursor),
         },
     )
 
 
 @login_required
-def rollback_revision(request, title, revision_id):
-    if request.method != "POST":
-        return redirect(reverse("revisions", kwargs={"title": title}))
-
-    entry_obj = get_object_or_404(Entry, title__iexact=title)
-    if not _can_rollback(request, entry_obj):
+def revision_diff(request, title):
+    entry_obj = get_object_or_404(Entry, title_normalized=normalize_title(title))
+    revision_ids = entry_obj.revisions.values_list("id", flat=True)
+    try:
+        to_param = request.GET.get("to", "current")
+        to_id = None if to_param == "current" else int(to_param)
+        if "from" in request.GET or to_id is None:
+            from_id = int(request.GET.get("from", ""))
+        else:
+            # Without "from", show what changed since the revision before "to".
+            from_id = revision_ids.filter(id__lt=to_id).order_by("-id").first()
+    except ValueError:
+        from_id = to_id = None
+    if from_id is None or not revision_ids.filter(id=from_id).exists() or (
+        to_id is not None and not revision_ids.filter(id=to_id).exists()
+    ):
         return render(
             request,
             "encyclopedia/error.html",
-            {"message": "Only the page creator or a superuser can rollback revisions."},
-            status=403,
+            {"message": "Choose two revisions of this page to compare."},
+            status=404,
         )
 
-    revision = get_object_or_404(EntryRevision, id=revision_id, entry=entry_obj)
-
-    EntryRevision.objects.create(
-        entry=entry_obj,
-        content=entry_obj.content,
-        edited_by=request.user,
-        edit_summary="Pre-rollback snapshot",
+    return render(
+        request,
+        "encyclopedia/revision_diff.html",
+        {
+            "entry": entry_obj,
+            "from_id": from_id,
+            "to_id": to_id,
+            "diff": diffs.revision_diff(entry_obj, from_id, to_id),
+        },
     )
 
-    entry_obj.content = revision.content
-    entry_obj.save(update_fields=["content", "updated_at"])
-    _log_action("rollback", entry_obj, request.user, f"Rolled back to revision {revision.id}")
+
+@login_required
+def rollback_revision(request, title, revision_id):
+    if request.method != "POST":
+        return redirect(reverse("revisions", kwargs={"title": title}))
+
+    base_version = request.POST.get("version", "").strip()
+    # Locked like save_edit, so a concurrent edit or rollback cannot
+    # interleave with the snapshot and the content update.
+    with transaction.atomic():
+        entry_obj = _locked_entry(title)
+        if entry_obj is None:
+            raise Http404("No entry matches the given query.")
+        if not _can_rollback(request, entry_obj):
+            return render(
+                request,
+                "encyclopedia/error.html",
+                {"message": "Only the page creator or a superuser can rollback revisions."},
+                status=403,
+            )
+
+        # Forms posted without a version (older clients) are not checked.
+        if base_version and base_version != str(entry_obj.version):
+            return render(
+                request,
+                "encyclopedia/error.html",
+                {
+                    "message": (
+                        "Someone else saved this page after you opened its history. "
+                        "Review the latest revisions before rolling back."
+                    )
+                },
+                status=409,
+            )
+
+        revision = get_object_or_404(
+            EntryRevision.objects.only("id", "entry_id"), id=revision_id, entry=entry_obj
+        )
+
+        content = history.revision_content(revision)
+        history.record_revision(
+            entry_obj,
+            entry_obj.content,
+            edited_by=request.user,
+            edit_summary="Pre-rollback snapshot",
+        )
+
+        entry_obj.content = content
+        rendered = util.refresh_rendered_content(entry_obj)
+        entry_obj.save(update_fields=["content", *rendered, "updated_at"])
+        _log_action("rollback", entry_obj, request.user, f"Rolled back to revision {revision.id}")
     return redirect(reverse("entry", kwargs={"title": entry_obj.title}))
 
 
@@ -538,7 +888,7 @@ def toggle_lock(request, title):
     if request.method != "POST":
         return redirect(reverse("entry", kwargs={"title": title}))
 
-    entry_obj = get_object_or_404(Entry, title__iexact=title)
+    entry_obj = get_object_or_404(Entry, title_normalized=normalize_title(title))
     if not request.user.is_superuser:
         return render(
             request,
@@ -552,7 +902,9 @@ def toggle_lock(request, title):
         entry_obj.lock_reason = ""
         entry_obj.locked_by = None
         entry_obj.locked_at = None
-        entry_obj.save(update_fields=["is_locked", "lock_reason", "locked_by", "locked_at"])
+        entry_obj.save(
+            update_fields=["is_locked", "lock_reason", "locked_by", "locked_at", "updated_at"]
+        )
         _log_action("unlock", entry_obj, request.user, "Unlocked entry")
     else:
         reason = request.POST.get("lock_reason", "").strip()
@@ -560,7 +912,9 @@ def toggle_lock(request, title):
         entry_obj.lock_reason = reason
         entry_obj.locked_by = request.user
         entry_obj.locked_at = timezone.now()
-        entry_obj.save(update_fields=["is_locked", "lock_reason", "locked_by", "locked_at"])
+        entry_obj.save(
+            update_fields=["is_locked", "lock_reason", "locked_by", "locked_at", "updated_at"]
+        )
         _log_action("lock", entry_obj, request.user, reason or "Locked entry")
 
     return redirect(reverse("entry", kwargs={"title": entry_obj.title}))
@@ -571,7 +925,7 @@ def set_verification_status(request, title):
     if request.method != "POST":
         return redirect(reverse("entry", kwargs={"title": title}))
 
-    entry_obj = get_object_or_404(Entry, title__iexact=title)
+    entry_obj = get_object_or_404(Entry, title_normalized=normalize_title(title))
     if not request.user.is_superuser:
         return render(
             request,
@@ -600,6 +954,7 @@ def set_verification_status(request, title):
             "verification_note",
             "verified_by",
             "verified_at",
+            "updated_at",
         ]
     )
     _log_action("verify", entry_obj, request.user, f"Status set to {requested_status}")
@@ -611,7 +966,7 @@ def report_dispute(request, title):
     if request.method != "POST":
         return redirect(reverse("entry", kwargs={"title": title}))
 
-    entry_obj = get_object_or_404(Entry, title__iexact=title)
+    entry_obj = get_object_or_404(Entry, title_normalized=normalize_title(title))
     message = request.POST.get("message", "").strip()
     if not message:
         return render(
@@ -622,9 +977,9 @@ def report_dispute(request, title):
         )
 
     Dispute.objects.create(entry=entry_obj, reported_by=request.user, message=message, status="open")
-    if entry_obj.verification_status != "disputed":
-        entry_obj.verification_status = "disputed"
-        entry_obj.save(update_fields=["verification_status"])
+    # The open-dispute count is on the page, so bump updated_at either way.
+    entry_obj.verification_status = "disputed"
+    entry_obj.save(update_fields=["verification_status", "updated_at"])
     _log_action("dispute_reported", entry_obj, request.user, "Dispute reported")
     return redirect(reverse("entry", kwargs={"title": entry_obj.title}))
 
@@ -657,7 +1012,7 @@ def resolve_dispute(request, dispute_id):
     if not dispute.entry.disputes.filter(status="open").exists():
         if dispute.entry.verification_status == "disputed":
             dispute.entry.verification_status = "under_review"
-            dispute.entry.save(update_fields=["verification_status"])
+    dispute.entry.save(update_fields=["verification_status", "updated_at"])
 
     _log_action(
         "dispute_resolved",
@@ -669,8 +1024,8 @@ def resolve_dispute(request, dispute_id):
 
 
 def rand(request):
-    all_entries = util.list_entries()
-    if not all_entries:
+    random_entry = util.random_entry_title()
+    if random_entry is None:
         return render(
             request,
             "encyclopedia/error.html",
@@ -680,7 +1035,6 @@ def rand(request):
             status=404,
         )
 
-    random_entry = random.choice(all_entries)
     return redirect(reverse("entry", kwargs={"title": random_entry}))
 
 
@@ -689,9 +1043,25 @@ def preview_markdown(request):
         return JsonResponse({"error": "Only GET is allowed."}, status=405)
 
     text = request.GET.get("text", "")
-    markdowner = markdown.Markdown()
-    html = markdowner.convert(text)
-    return JsonResponse({"html": html})
+    etag = util.preview_etag(text)
+    conditional = get_conditional_response(request, etag=etag)
+    if conditional is not None:
+        return _with_validators(request, conditional, etag)
+
+    html = util.render_markdown(text)
+    return _with_validators(request, JsonResponse({"html": html}), etag)
+
+
+def autocomplete_titles(request):
+    if request.method != "GET":
+        return JsonResponse({"error": "Only GET is allowed."}, status=405)
+
+    try:
+        limit = int(request.GET.get("limit", 8))
+    except ValueError:
+        limit = 8
+    prefix = request.GET.get("q", "").strip()
+    return JsonResponse({"results": util.complete_titles(prefix, limit=limit)})
 
 
 @login_required
@@ -107,6 +107,43 @@ else:
     }
 
 
+# Page, count and diff caches are invalidated by deleting keys, so every
+# gunicorn worker and replica must share one cache; a local-memory cache is
+# per process and only suits single-process development. "redis" (the
+# default when REDIS_URL is set, as in k8s/base) is the production cache.
+# "database" (the default with only DATABASE_URL) needs `manage.py
+# createcachetable` and costs a COUNT(*) on every set, so it suits small
+# sites; CACHE_MAX_ENTRIES must hold every cached page plus its version
+# token, or culling evicts live pages, and each cull drops 1/CULL_FREQUENCY
+# of the table.
+REDIS_URL = os.environ.get("REDIS_URL", "")
+CACHE_BACKEND = os.environ.get(
+    "CACHE_BACKEND", "redis" if REDIS_URL else "database" if DATABASE_URL else "locmem"
+)
+if CACHE_BACKEND == "database":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "wiki_cache",
+            "OPTIONS": {
+                "MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", "1000000")),
+                "CULL_FREQUENCY": int(os.environ.get("CACHE_CULL_FREQUENCY", "10")),
+            },
+        }
+    }
+elif CACHE_BACKEND == "redis":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL or "redis://localhost:6379/0",
+        }
+    }
+elif CACHE_BACKEND == "locmem":
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+else:
+    raise ValueError(f"Unsupported CACHE_BACKEND: {CACHE_BACKEND}")
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -147,6 +184,55 @@ else:
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Full-text search: "auto" picks SQLite FTS5 or Postgres tsvector from the
+# database vendor; "sqlite_fts", "postgres" or "python" force a backend.
+WIKI_SEARCH_BACKEND = os.environ.get("WIKI_SEARCH_BACKEND", "auto")
+WIKI_SEARCH_PAGE_SIZE = int(os.environ.get("WIKI_SEARCH_PAGE_SIZE", "20"))
+# Seconds before the "python" backend's process-local index reloads entries
+# written by other workers.
+WIKI_SEARCH_INDEX_TTL = int(os.environ.get("WIKI_SEARCH_INDEX_TTL", "300"))
+# Seconds before process-local title indexes reload titles written by
+# other workers.
+WIKI_TITLE_INDEX_TTL = int(os.environ.get("WIKI_TITLE_INDEX_TTL", "300"))
+# Seconds anonymous entry, index and search pages stay in the page cache;
+# 0 disables it. Edits purge affected pages immediately, which needs the
+# shared cache configured above.
+WIKI_PAGE_CACHE_TIMEOUT = int(os.environ.get("WIKI_PAGE_CACHE_TIMEOUT", "300"))
+# Seconds each worker keeps page cache hit/miss counts to itself before
+# adding them to the shared counters shown on the dashboard.
+WIKI_PAGE_CACHE_STATS_INTERVAL = float(os.environ.get("WIKI_PAGE_CACHE_STATS_INTERVAL", "60"))
+# Audit logging: "sync" inserts each record in the request; "batched" queues
+# records and inserts them together once WIKI_AUDIT_BATCH_SIZE are queued or
+# a background timer finds the oldest WIKI_AUDIT_FLUSH_INTERVAL seconds old,
+# spooling to WIKI_AUDIT_SPOOL_PATH if a flush fails.
+WIKI_AUDIT_MODE = os.environ.get("WIKI_AUDIT_MODE", "sync")
+WIKI_AUDIT_BATCH_SIZE = int(os.environ.get("WIKI_AUDIT_BATCH_SIZE", "50"))
+WIKI_AUDIT_FLUSH_INTERVAL = float(os.environ.get("WIKI_AUDIT_FLUSH_INTERVAL", "2"))
+WIKI_AUDIT_SPOOL_PATH = os.environ.get(
+    "WIKI_AUDIT_SPOOL_PATH", os.path.join(BASE_DIR, "audit_spool.jsonl")
+)
+# Older revisions are stored as deltas; every Nth one stays a full keyframe,
+# which bounds how many deltas rebuilding a revision replays.
+WIKI_REVISION_KEYFRAME_INTERVAL = int(os.environ.get("WIKI_REVISION_KEYFRAME_INTERVAL", "16"))
+# Revision retention enforced by prune_revisions: the newest N revisions of
+# each entry, the newest per day for the last M days and the newest per
+# month forever.
+WIKI_REVISION_KEEP_LAST = int(os.environ.get("WIKI_REVISION_KEEP_LAST", "50"))
+WIKI_REVISION_KEEP_DAYS = int(os.environ.get("WIKI_REVISION_KEEP_DAYS", "30"))
+# Revision diffs: changed regions over WIKI_DIFF_MAX_LINES lines are shown
+# without line matching and output stops at that many rows. Computed diffs
+# are cached for WIKI_DIFF_CACHE_TIMEOUT seconds.
+WIKI_DIFF_MAX_LINES = int(os.environ.get("WIKI_DIFF_MAX_LINES", "2000"))
+WIKI_DIFF_CACHE_TIMEOUT = int(os.environ.get("WIKI_DIFF_CACHE_TIMEOUT", "86400"))
+# Exports are streamed by sync gunicorn workers that are killed after the
+# --timeout in ci/entrypoint.sh, so the download views refuse exports over
+# this many rows; the export_records command writes those to a file.
+WIKI_EXPORT_MAX_HTTP_ROWS = int(os.environ.get("WIKI_EXPORT_MAX_HTTP_ROWS", "50000"))
+# Where archive_audit_logs writes gzip JSON-lines files of old audit rows.
+WIKI_AUDIT_ARCHIVE_DIR = os.environ.get(
+    "WIKI_AUDIT_ARCHIVE_DIR", os.path.join(BASE_DIR, "audit_archive")
+)
+
 LOGIN_URL = "login"
 LOGIN_REDIRECT_URL = "dashboard"
 LOGOUT_REDIRECT_URL = "index"